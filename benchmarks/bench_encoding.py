@@ -0,0 +1,60 @@
+"""
+Benchmark of the netCDF encoding settings of qvp.write.
+
+Reports the file size and the write and read throughput of a day of
+synthetic QVPs for each encoding setting in config.py.
+
+    python benchmarks/bench_encoding.py --nfiles 288
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import xarray
+
+import qvp
+from qvp.default_config import _DEFAULT_ENCODING
+from synthetic import write_radar_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nfiles', type=int, default=96,
+                        help='Number of radar files in the day')
+    parser.add_argument('--ngates', type=int, default=500)
+    parser.add_argument('--directory', default=None,
+                        help='Directory for the radar and QVP files')
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp()
+    files = write_radar_files(directory, args.nfiles, ngates=args.ngates)
+    radar_qvp = qvp.qvp(files)
+    nbytes = sum(radar_qvp._profiles.data(field).nbytes
+                 for field in radar_qvp.fields
+                 if radar_qvp._profiles.has_data(field))
+
+    print('%-10s %12s %14s %14s' % ('encoding', 'size (MB)',
+                                      'write (MB/s)', 'read (MB/s)'))
+    for name in _DEFAULT_ENCODING:
+        output = os.path.join(directory, name)
+        os.makedirs(output, exist_ok=True)
+        start = time.perf_counter()
+        radar_qvp.write('xsaprqvpI5', file_directory=output, encoding=name)
+        write_time = time.perf_counter() - start
+
+        filename = os.path.join(output, os.listdir(output)[0])
+        start = time.perf_counter()
+        with xarray.open_dataset(filename) as ds:
+            ds.load()
+        read_time = time.perf_counter() - start
+
+        print('%-10s %12.2f %14.1f %14.1f' % (
+            name, os.path.getsize(filename) / 1e6,
+            nbytes / 1e6 / write_time, nbytes / 1e6 / read_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of the melting layer retrieval on a synthetic month of QVPs.
+
+Reports the time to find the melting layer of a month of 5 minute profiles
+in one call and one profile at a time, and the mean error of the bottom
+and top against the synthetic melting layer.
+
+    python benchmarks/bench_melting_layer.py --days 31
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from qvp.retrievals import find_melting_layer
+
+
+def synthetic_profiles(nprofiles, nheights, seed=0):
+    """
+    Returns noisy rain, melting layer and snow profiles and the bottom and
+    top of their melting layers. The melting layer rises and falls through
+    the day and is missing in a tenth of the profiles.
+
+    """
+    rng = np.random.RandomState(seed)
+    height = np.arange(nheights) * 25.0
+    step = np.arange(nprofiles)
+    bottom = 2500.0 + 800.0 * np.sin(2 * np.pi * step / 288.0)
+    bottom = np.round(bottom / 25.0) * 25.0
+    top = bottom + rng.randint(8, 20, nprofiles) * 25.0
+    inside = ((height >= bottom[:, None]) & (height <= top[:, None]))
+    inside[rng.uniform(size=nprofiles) < 0.1] = False
+    shape = (nprofiles, nheights)
+    rhohv = np.where(inside, 0.9, 0.99) + rng.normal(0, 0.005, shape)
+    zdr = np.where(inside, 2.0, 0.3) + rng.normal(0, 0.2, shape)
+    zh = np.where(inside, 38.0, 22.0) + rng.normal(0, 1.5, shape)
+    found = inside.any(axis=1)
+    bottom[~found] = np.nan
+    top[~found] = np.nan
+    return (rhohv.astype(np.float32), zdr.astype(np.float32),
+            zh.astype(np.float32), height, bottom, top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--nheights', type=int, default=500)
+    args = parser.parse_args()
+
+    rhohv, zdr, zh, height, bottom, top = synthetic_profiles(
+        args.days * 288, args.nheights)
+
+    start = time.perf_counter()
+    found = find_melting_layer(rhohv, zdr, zh, height)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(len(rhohv)):
+        find_melting_layer(rhohv[i:i + 1], zdr[i:i + 1], zh[i:i + 1], height)
+    looped = time.perf_counter() - start
+
+    print('%d profiles of %d heights' % rhohv.shape)
+    print('%-24s %10.3f s' % ('all profiles at once', vectorized))
+    print('%-24s %10.3f s' % ('one profile at a time', looped))
+    for name, result, truth in [('bottom', found[0], bottom),
+                                ('top', found[1], top)]:
+        both = np.isfinite(result) & np.isfinite(truth)
+        print('%-6s mean error %6.1f m, %d missed, %d false' % (
+            name, np.abs(result[both] - truth[both]).mean(),
+            (np.isnan(result) & np.isfinite(truth)).sum(),
+            (np.isfinite(result) & np.isnan(truth)).sum()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark of each stage of the QVP pipeline on synthetic radar volumes.
+
+Times the sweep and volume reads of the radar files, quasi_vertical_profile,
+the accumulation of the profiles, qvp.write and both quicklook functions on
+a day of synthetic CF/Radial files. Each run is appended to a JSON history
+and compared to the last run with the same settings, so regressions show up
+across versions.
+
+    python benchmarks/bench_pipeline.py --nfiles 96 --history history.json
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import pyart
+
+import qvp
+from qvp.qvp_profile import _FIELD_NAMES, _ProfileStore, _profile_file
+from qvp.qvp_reader import _read_qvp_sweep
+from synthetic import make_radar, write_radar_files
+
+QVP_FIELDS = ['reflectivity', 'velocity', 'differential_reflectivity',
+              'cross_correlation_ratio']
+RADAR_FIELDS = [radar_field for name, radar_field in _FIELD_NAMES
+                if name in QVP_FIELDS]
+
+
+def best_time(function, repeat):
+    """ Returns the shortest of repeat wall times of function. """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def version():
+    """ Returns the qvp version, or the git revision of the tree. """
+    try:
+        from qvp.version import full_version
+        return full_version
+    except ImportError:
+        pass
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).strip().decode('ascii')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_stages(files, radars, directory, repeat):
+    """ Returns the best time in seconds of each stage. """
+    # Only the fields of the QVP are read and profiled, as qvp.qvp does.
+    stages = {}
+    stages['read_sweep'] = best_time(
+        lambda: [_read_qvp_sweep(file, None, RADAR_FIELDS) for file in files],
+        repeat)
+    stages['read_volume'] = best_time(
+        lambda: [pyart.io.read(file, include_fields=RADAR_FIELDS)
+                 for file in files], repeat)
+    stages['quasi_vertical_profile'] = best_time(
+        lambda: [qvp.quasi_vertical_profile(radar, fields=RADAR_FIELDS)
+                 for radar in radars], repeat)
+
+    results = [_profile_file(file, None, None, QVP_FIELDS, True)
+               for file in files]
+
+    # The profiles of each file are appended to the profile buffer, which
+    # replaced the lists the fields were accumulated in.
+    def accumulate():
+        store = _ProfileStore(QVP_FIELDS)
+        store.reserve(len(results))
+        for result in results:
+            store.append(result['profiles'], len(result['height']))
+    stages['accumulate'] = best_time(accumulate, repeat)
+    stages['qvp'] = best_time(lambda: qvp.qvp(files, fields=QVP_FIELDS),
+                              repeat)
+
+    radar_qvp = qvp.qvp(files, fields=QVP_FIELDS)
+    stages['write'] = best_time(
+        lambda: radar_qvp.write('xsaprqvpI5', file_directory=directory),
+        repeat)
+    filename = os.path.join(directory, 'sgpxsaprqvpI5.c1.%s.000000.nc'
+                            % radar_qvp.base_time[0].strftime('%Y%m%d'))
+    stages['quicklooks_1panel'] = best_time(
+        lambda: qvp.quicklooks_1panel(filename, 'reflectivity', 'xsaprqvpI5',
+                                      image_directory=directory), repeat)
+    stages['quicklooks_4panel'] = best_time(
+        lambda: qvp.quicklooks_4panel(filename, QVP_FIELDS, 'xsaprqvpI5',
+                                      image_directory=directory), repeat)
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nfiles', type=int, default=24,
+                        help='Number of radar files in the day')
+    parser.add_argument('--ngates', type=int, default=500)
+    parser.add_argument('--rays', type=int, default=360,
+                        help='Number of rays in each sweep')
+    parser.add_argument('--sweeps', type=int, default=9,
+                        help='Number of sweeps in each volume')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times each stage is timed')
+    parser.add_argument('--directory', default=None,
+                        help='Directory for the radar, QVP and image files')
+    parser.add_argument('--history', default=None,
+                        help='JSON file the results are appended to')
+    args = parser.parse_args()
+
+    angles = (0.5, 1.5, 2.5, 4.0, 6.0, 8.0, 10.0, 15.0, 20.0)[-args.sweeps:]
+    settings = {'nfiles': args.nfiles, 'ngates': args.ngates,
+                'rays': args.rays, 'sweeps': len(angles)}
+    directory = args.directory or tempfile.mkdtemp()
+    os.makedirs(directory, exist_ok=True)
+    files = write_radar_files(directory, args.nfiles, ngates=args.ngates,
+                              rays_per_sweep=args.rays, angles=angles)
+    start = datetime.datetime(2017, 10, 5)
+    radars = [make_radar(start, seed=i, ngates=args.ngates,
+                         rays_per_sweep=args.rays, angles=angles)
+              for i in range(args.nfiles)]
+    output = os.path.join(directory, 'output')
+    os.makedirs(output, exist_ok=True)
+    stages = run_stages(files, radars, output, args.repeat)
+
+    history = []
+    if args.history and os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    previous = [run for run in history if run['settings'] == settings]
+    previous = previous[-1]['stages'] if previous else {}
+
+    print('%d files, %d gates, %d rays, %d sweeps' % (
+        args.nfiles, args.ngates, args.rays, len(angles)))
+    print('%-24s %10s %10s' % ('stage', 'time (s)', 'change'))
+    for stage, seconds in stages.items():
+        change = ''
+        if stage in previous:
+            change = '%+9.1f%%' % (100 * (seconds / previous[stage] - 1))
+        print('%-24s %10.3f %10s' % (stage, seconds, change))
+
+    if args.history:
+        history.append({'version': version(),
+                        'date': datetime.datetime.utcnow().strftime(
+                            '%Y-%m-%dT%H:%M:%S'),
+                        'settings': settings, 'stages': stages})
+        with open(args.history, 'w') as f:
+            json.dump(history, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
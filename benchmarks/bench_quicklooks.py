@@ -0,0 +1,75 @@
+"""
+Benchmark of the pcolormesh and regular time grid quicklooks.
+
+Reports the render time of a four panel quicklook of a day of synthetic
+QVPs drawn with pcolormesh and with imshow on regular time grids, and the
+RMS difference of each image from the pcolormesh image.
+
+    python benchmarks/bench_quicklooks.py --nfiles 288
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib.image
+import numpy as np
+
+import qvp
+from synthetic import write_radar_files
+
+FIELDS = ['reflectivity', 'velocity', 'differential_reflectivity',
+          'cross_correlation_ratio']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nfiles', type=int, default=288,
+                        help='Number of radar files in the day')
+    parser.add_argument('--ngates', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of renders timed for each setting')
+    parser.add_argument('--directory', default=None,
+                        help='Directory for the radar, QVP and image files')
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp()
+    os.makedirs(directory, exist_ok=True)
+    files = write_radar_files(directory, args.nfiles, ngates=args.ngates)
+    radar_qvp = qvp.qvp(files, fields=FIELDS)
+    radar_qvp.write('xsaprqvpI5', file_directory=directory)
+    filename = os.path.join(directory,
+                            'sgpxsaprqvpI5.c1.20171005.000000.nc')
+
+    print('%-12s %12s %14s' % ('time step', 'render (s)', 'RMS difference'))
+    reference = None
+    for time_step in [None, '1min', '5min', '15min']:
+        output = os.path.join(directory, str(time_step))
+        os.makedirs(output, exist_ok=True)
+        renderer = qvp.QuicklookRenderer('xsaprqvpI5', panels=4,
+                                         image_directory=output,
+                                         time_step=time_step)
+        # The first render creates the meshes, later renders reuse them.
+        image = renderer.render(filename, FIELDS)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            renderer.render(filename, FIELDS)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        renderer.close()
+
+        pixels = matplotlib.image.imread(image)
+        if reference is None:
+            reference = pixels
+        if pixels.shape == reference.shape:
+            difference = '%14.4f' % np.sqrt(np.mean(
+                (pixels - reference)**2))
+        else:
+            difference = '%14s' % 'size differs'
+        print('%-12s %12.2f %s' % (time_step or 'pcolormesh', elapsed,
+                                   difference))
+
+
+if __name__ == '__main__':
+    main()
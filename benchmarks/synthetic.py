@@ -0,0 +1,60 @@
+"""
+Synthetic CMAC2.0 style radar volumes for the QVP benchmarks.
+"""
+
+import datetime
+import os
+import shutil
+
+import netCDF4
+import numpy as np
+import pyart
+
+from qvp.testing import FIELDS, make_radar, random_field
+
+ANGLES = (0.5, 1.5, 2.5, 4.0, 6.0, 8.0, 10.0, 15.0, 20.0)
+
+
+def write_radar_files(directory, nfiles, day=datetime.date(2017, 10, 5),
+                      ngates=500, rays_per_sweep=360, angles=ANGLES):
+    """
+    Writes nfiles CF/Radial files evenly spread over a day and returns
+    their paths. Files that already exist are reused.
+
+    Writing a CF/Radial file is slow, so the first file is written with
+    Py-ART and the others are copies with their time units changed and
+    new random data in the last sweep.
+
+    """
+    start = datetime.datetime.combine(day, datetime.time())
+    step = datetime.timedelta(days=1) / nfiles
+    files = []
+    template = None
+    for i in range(nfiles):
+        time = start + i * step
+        units = time.strftime('seconds since %Y-%m-%dT%H:%M:%SZ')
+        filename = os.path.join(directory, time.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        if not os.path.exists(filename):
+            if template is None:
+                pyart.io.write_cfradial(filename, make_radar(
+                    time, ngates=ngates, rays_per_sweep=rays_per_sweep,
+                    angles=angles))
+                template = filename
+            else:
+                shutil.copy(template, filename)
+                with netCDF4.Dataset(filename, 'a') as dataset:
+                    dataset.variables['time'].units = units
+                    _randomize_last_sweep(dataset, seed=i)
+        files.append(filename)
+    return files
+
+
+def _randomize_last_sweep(dataset, seed):
+    """ Replaces the fields of the last sweep with new random data. """
+    rng = np.random.RandomState(seed)
+    start = dataset.variables['sweep_start_ray_index'][-1]
+    for field in FIELDS:
+        var = dataset.variables[field]
+        shape = (var.shape[0] - start, var.shape[1])
+        var[start:] = random_field(rng, shape)
@@ -6,15 +6,43 @@ QVP
 QVP functions for creating a vad profile and for plotting.
 
     qvp
+    quasi_vertical_profile
+    read_sweep
+    ProfileCache
+    QVPStats
+    run_batch
+    run_quicklooks
+    DirectoryWatcher
     quicklooks_1panel
     quicklooks_4panel
+    QuicklookRenderer
+    open_qvp
+    TilePyramid
+    build_pyramid
+    aggregate
+    Climatology
+    climatology
+    retrievals
     get_metadata
     get_plot_values
     get_field_parameters
+    get_field_schema
+    get_encoding
  
  """
 
-from .qvp_profile import qvp
-from .qvp_quicklooks import quicklooks_1panel, quicklooks_4panel
+from .qvp_profile import qvp, quasi_vertical_profile
+from .qvp_reader import read_sweep
+from .qvp_cache import ProfileCache
+from .qvp_stats import QVPStats
+from .qvp_batch import run_batch, run_quicklooks
+from .qvp_watch import DirectoryWatcher
+from .qvp_quicklooks import quicklooks_1panel, quicklooks_4panel, open_qvp
+from .qvp_quicklooks import QuicklookRenderer
+from .qvp_tiles import TilePyramid, build_pyramid
+from .qvp_aggregate import aggregate
+from .qvp_climatology import Climatology, climatology
+from . import retrievals
 from .config import get_metadata, get_plot_values, get_field_parameters
+from .config import get_field_schema, get_encoding
 __all__ = [s for s in dir() if not s.startswith('_')]
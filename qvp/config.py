@@ -7,10 +7,13 @@ QVP Configuration
     get_plot_values
     get_colorbar_titles
     get_field_titles
+    get_field_schema
+    get_encoding
 
 """
 
 from .default_config import _DEFAULT_METADATA, _DEFAULT_PLOT_VALUES, _DEFAULT_FIELD_PARAMETERS
+from .default_config import _DEFAULT_FIELD_SCHEMA, _DEFAULT_ENCODING
 
 
 def get_metadata(radar):
@@ -33,4 +36,20 @@ def get_field_parameters():
     """
     Return the field titles for a specific radar field.
     """
-    return _DEFAULT_FIELD_PARAMETERS.copy()
\ No newline at end of file
+    return _DEFAULT_FIELD_PARAMETERS.copy()
+
+def get_field_schema():
+    """
+    Return the output name, radar field, dtype, fill value and attributes
+    of each QVP field.
+    """
+    return dict((name, dict(field, attrs=field['attrs'].copy()))
+                for name, field in _DEFAULT_FIELD_SCHEMA.items())
+
+def get_encoding(name='default'):
+    """
+    Return the named netCDF encoding settings for the QVP fields.
+    """
+    encoding = _DEFAULT_ENCODING[name].copy()
+    encoding['packing'] = encoding['packing'].copy()
+    return encoding
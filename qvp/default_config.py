@@ -224,4 +224,301 @@ _DEFAULT_FIELD_PARAMETERS = {
                    'clb_title': 'Mean Rain \nFall Rate (mm/hr)',
                    'vmin': None,
                    'vmax': None}
-}
\ No newline at end of file
+}
+
+###########################################################################
+# Default field schema
+#
+# The DEFAULT_FIELD_SCHEMA dictionary describes each (time, height) field of
+# the QVP files, in the order they are written. Each field has the CMAC2.0
+# radar field it is profiled from, its dtype, fill value and attributes.
+# A dtype of None writes the field with the dtype of the radar field, a
+# dtype such as 'float32' converts it.
+# Fields marked optional are only present in some of the radar files, and
+# fields marked data_valid_range get valid_min and valid_max from the
+# profiles written. These values are all used within qvp_profile.py.
+###########################################################################
+
+_DEFAULT_FIELD_SCHEMA = {
+    'total_power':{
+        'radar_field': 'total_power',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dBZ',
+                  'long_name': 'Total power',
+                  'standard_name': 'equivalent_reflectivity_factor'}},
+
+    'reflectivity':{
+        'radar_field': 'reflectivity',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dBZ',
+                  'long_name': 'Reflectivity',
+                  'standard_name': 'equivalent_reflectivity_factor'}},
+
+    'velocity':{
+        'radar_field': 'mean_doppler_velocity',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'm/s',
+                  'long_name': 'Mean doppler velocity',
+                  'standard_name': 'radial_velocity_of_scatterers_away_from_instrument'}},
+
+    'spectrum_width':{
+        'radar_field': 'spectral_width',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'm/s',
+                  'long_name': 'Doppler spectrum width'}},
+
+    'differential_reflectivity':{
+        'radar_field': 'differential_reflectivity',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB',
+                  'long_name': 'Differential reflectivity'}},
+
+    'specific_differential_phase':{
+        'radar_field': 'specific_differential_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degree/km',
+                  'long_name': 'Specific differential phase (KDP)'}},
+
+    'cross_correlation_ratio':{
+        'radar_field': 'cross_correlation_ratio_hv',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': '1',
+                  'long_name': 'Cross correlation ratio (RHOHV)',
+                  'valid_max': 1.0,
+                  'valid_min': 0.0}},
+
+    'normalized_coherent_power':{
+        'radar_field': 'normalized_coherent_power',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': '1',
+                  'long_name': 'Normalized coherent power',
+                  'valid_max': 1.0,
+                  'valid_min': 0.0,
+                  'comment': 'Also known as signal quality index (SQI)'}},
+
+    'differential_phase':{
+        'radar_field': 'differential_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degree',
+                  'long_name': 'Differential phase (PhiDP)',
+                  'valid_max': 180.0,
+                  'valid_min': -180.0}},
+
+    'xsapr_clutter':{
+        'radar_field': 'ground_clutter',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': '1',
+                  'long_name': 'X-SAPR clutter',
+                  'flag_values': '0,1',
+                  'flag_meanings': 'no_clutter, clutter'}},
+
+    'signal_to_noise_ratio':{
+        'radar_field': 'SNR',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB',
+                  'long_name': 'Signal to noise ratio'}},
+
+    'velocity_texture':{
+        'radar_field': 'velocity_texture',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'm/s',
+                  'long_name': 'Mean doppler velocity texture',
+                  'standard_name': 'radial_velocity_of_scatters_away_from_instrument'}},
+
+    'gate_id':{
+        'radar_field': 'gate_id',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': '1',
+                  'long_name': 'Classification of dominant scatter',
+                  'flag_values': '0,,1,,2, 3, 4, 5',
+                  'flag_meanings': 'multi_trip, rain, snow, no_scatter, melting, clutter',
+                  'valid_min': 0,
+                  'valid_max': 5}},
+
+    'radar_echo_classification':{
+        'radar_field': 'radar_echo_classification',
+        'dtype': None,
+        '_FillValue': -9999,
+        'optional': True,
+        'attrs': {'units': '1',
+                  'long_name': 'Radar echo classification',
+                  'flag_values': '0, 1, 2, 3, 4, 5, 6, 255, 65535',
+                  'flag_meanings': ('no_data_available, non_meteorological_target, '
+                                    'rain, wet_snow, snow, graupel, hail, '
+                                    'area_not_scanned, area_not_scanned')}},
+
+    'corrected_velocity':{
+        'radar_field': 'corrected_velocity',
+        'dtype': None,
+        '_FillValue': -9999,
+        'data_valid_range': True,
+        'attrs': {'units': 'm/s',
+                  'long_name': 'Corrected mean doppler velocity',
+                  'standard_name': 'radial_velocity_of_scatterers_away_from_instrument'}},
+
+    'unfolded_differential_phase':{
+        'radar_field': 'unfolded_differential_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degree',
+                  'long_name': 'Unfolded differential phase (PhiDP)',
+                  'valid_max': 180.0,
+                  'valid_min': -180.0}},
+
+    'corrected_differential_phase':{
+        'radar_field': 'corrected_differential_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degree',
+                  'long_name': 'Corrected differential phase (PhiDP)',
+                  'valid_max': 400.0,
+                  'valid_min': 0.0}},
+
+    'filtered_corrected_differential_phase':{
+        'radar_field': 'filtered_corrected_differential_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degree',
+                  'long_name': 'Filtered differential phase (PhiDP)',
+                  'valid_max': 400.0,
+                  'valid_min': 0.0}},
+
+    'corrected_specific_diff_phase':{
+        'radar_field': 'corrected_specific_diff_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degrees/km',
+                  'long_name': 'Corrected specific differential phase (KDP)'}},
+
+    'filtered_corrected_specific_diff_phase':{
+        'radar_field': 'filtered_corrected_specific_diff_phase',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'degree/km',
+                  'long_name': 'Filtered specific differential phase (KDP)'}},
+
+    'corrected_differential_reflectivity':{
+        'radar_field': 'corrected_differential_reflectivity',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB',
+                  'long_name': 'Corrected differential reflectivity'}},
+
+    'corrected_reflectivity':{
+        'radar_field': 'corrected_reflectivity',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dBZ',
+                  'long_name': 'Corrected reflectivity',
+                  'standard_name': 'equivalent_reflectivity_factor'}},
+
+    'specific_attenuation':{
+        'radar_field': 'specific_attenuation',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB/km',
+                  'long_name': 'Specific attenuation',
+                  'valid_min': 0.0,
+                  'valid_max': 1.0}},
+
+    'path_integrated_attenuation':{
+        'radar_field': 'path_integrated_attenuation',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB',
+                  'long_name': 'Path integrated attenuation'}},
+
+    'specific_differential_attenuation':{
+        'radar_field': 'specific_differential_attenuation',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB/km',
+                  'long_name': 'Specific differential attenuation'}},
+
+    'path_integrated_differential_attenuation':{
+        'radar_field': 'path_integrated_differential_attenuation',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'dB',
+                  'long_name': 'Path integrated differential attenuation'}},
+
+    'rain_rate_A':{
+        'radar_field': 'rain_rate_A',
+        'dtype': None,
+        '_FillValue': -9999,
+        'attrs': {'units': 'mm/hr',
+                  'long_name': 'Rainfall rate',
+                  'standard_name': 'rainfall_rate',
+                  'valid_min': 0.0,
+                  'valid_max': 400.0,
+                  'comment': ('Rain rate calculated from specific_attenuation'
+                              ' R=51.3*specific_attenuation**0.81, note R=0.0'
+                              ' where norm coherent power < 0.4 or rhohv < 0.8')}},
+}
+
+###########################################################################
+# Default netCDF encoding
+#
+# The DEFAULT_ENCODING dictionary contains named settings for encoding the
+# (time, height) fields of the QVP netCDF files. Fields found in packing
+# are stored as int16 with a scale_factor and add_offset covering the
+# given (min, max) range, values outside the range are clipped. These
+# values are all used within qvp_profile.py.
+###########################################################################
+
+_DEFAULT_PACKING = {
+    'total_power': (-50.0, 90.0),
+    'reflectivity': (-50.0, 90.0),
+    'corrected_reflectivity': (-50.0, 90.0),
+    'velocity': (-100.0, 100.0),
+    'corrected_velocity': (-100.0, 100.0),
+    'spectrum_width': (0.0, 50.0),
+    'differential_reflectivity': (-20.0, 20.0),
+    'corrected_differential_reflectivity': (-20.0, 20.0),
+    'cross_correlation_ratio': (0.0, 1.1),
+    'normalized_coherent_power': (0.0, 1.1),
+    'signal_to_noise_ratio': (-50.0, 100.0),
+    'differential_phase': (-180.0, 180.0),
+    'unfolded_differential_phase': (-180.0, 720.0),
+    'corrected_differential_phase': (-180.0, 720.0),
+    'filtered_corrected_differential_phase': (-180.0, 720.0)}
+
+_DEFAULT_ENCODING = {
+    # Uncompressed with the netCDF library chunking.
+    'none':{
+        'zlib': False,
+        'complevel': 0,
+        'shuffle': False,
+        'time_chunk': None,
+        'packing': {}},
+
+    # Compressed, with chunks of 64 profiles along time so that appended
+    # profiles fill a chunk before the next one is started.
+    'default':{
+        'zlib': True,
+        'complevel': 4,
+        'shuffle': True,
+        'time_chunk': 64,
+        'packing': {}},
+
+    # As default with the common radar moments packed to int16.
+    'packed':{
+        'zlib': True,
+        'complevel': 4,
+        'shuffle': True,
+        'time_chunk': 64,
+        'packing': _DEFAULT_PACKING}
+}
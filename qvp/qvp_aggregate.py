@@ -0,0 +1,239 @@
+"""
+qvp.qvp_aggregate
+=================
+Time resampling and height regridding of QVPs.
+
+    aggregate
+
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import xarray
+
+from .config import get_field_schema
+from .qvp_quicklooks import _open
+
+_METHODS = ('mean', 'median', 'percentile', 'count')
+
+
+def aggregate(source, time_step=None, how='mean', heights=None, fields=None,
+              percentile=50, chunk_size=1024):
+    """
+    Resamples QVP profiles to a fixed time step and regrids them to fixed
+    heights.
+
+    The profiles are read, regridded and reduced chunk_size profiles at a
+    time, so memory use is bounded by the size of a chunk, of a time step
+    and of the result however many files are aggregated. Time steps are
+    aligned to midnight and the profiles of a step may come from
+    consecutive chunks or files. Sources with different heights must be
+    regridded to heights.
+
+    Parameters
+    ----------
+    source : qvp, Dataset, str or list
+        A qvp object, a QVP Dataset, or file paths to QVP NetCDF files or
+        Zarr stores, in time order.
+
+    Optional Parameters
+    -------------------
+    time_step : str or timedelta
+        Time step of the result, e.g. '15min'. None will keep the time of
+        every profile.
+    how : str
+        Reduction of the profiles in a time step, 'mean', 'median',
+        'percentile' or 'count'. Missing values are ignored.
+    heights : array
+        Heights in meters the profiles are linearly interpolated to. None
+        will keep the heights of the source.
+    fields : list
+        Fields to aggregate. None will aggregate all (time, height) fields.
+    percentile : float
+        Percentile used when how is 'percentile'.
+    chunk_size : int
+        Number of profiles read at a time.
+
+    Returns
+    -------
+    ds : Dataset
+        Aggregated fields with time and height coordinates.
+
+    """
+    if how not in _METHODS:
+        raise ValueError('Unknown aggregation: ' + str(how))
+    step = None if time_step is None else pd.Timedelta(
+        time_step).to_timedelta64()
+
+    results = []
+    # Pieces of the time step that may continue in the next chunk, they
+    # are joined once when the step ends.
+    pending = []
+    pending_start = None
+    grid = None if heights is None else np.asarray(heights, dtype=np.float64)
+    attrs = None
+    for time, height, data, attrs in _chunks(source, fields, chunk_size):
+        if heights is not None:
+            data = dict((name, _regrid(values, height, grid))
+                        for name, values in data.items())
+        elif grid is None:
+            grid = np.asarray(height, dtype=np.float64)
+        elif not np.array_equal(height, grid):
+            raise ValueError('The sources have different heights, give '
+                             'heights to regrid them to')
+        if step is None:
+            results.append((time, data))
+            continue
+
+        bins = _step_starts(time, step)
+        first = 0
+        if pending_start is not None:
+            first = np.searchsorted(bins, pending_start, side='right')
+            pending.append(_rows(time, data, slice(0, first)))
+            if first == len(time):
+                continue
+            results.append(_resample_pieces(pending, step, how, percentile))
+        last = np.searchsorted(bins, bins[-1])
+        if last > first:
+            results.append(_resample(*_rows(time, data, slice(first, last)),
+                                     step=step, how=how,
+                                     percentile=percentile))
+        pending = [_rows(time, data, slice(last, None))]
+        pending_start = bins[-1]
+    if pending:
+        results.append(_resample_pieces(pending, step, how, percentile))
+    if attrs is None:
+        raise ValueError('No profiles to aggregate')
+
+    time = np.concatenate([result[0] for result in results])
+    ds = xarray.Dataset(coords={'time': time, 'height': grid})
+    ds['height'].attrs = {'standard_name': 'height', 'units': 'meters'}
+    for name in attrs:
+        values = np.concatenate([result[1][name] for result in results])
+        ds[name] = xarray.Variable(('time', 'height'), values,
+                                   attrs=attrs[name])
+        if step is not None:
+            ds[name].attrs['cell_methods'] = 'time: %s (interval: %s)' % (
+                how if how != 'percentile' else 'percentile %g' % percentile,
+                pd.Timedelta(step))
+        if how == 'count':
+            ds[name].attrs['units'] = '1'
+    return ds
+
+
+def _chunks(source, fields, chunk_size):
+    """
+    Yields the time, height, float32 fields and field attributes of
+    chunk_size profiles at a time.
+
+    """
+    if isinstance(source, str):
+        source = [source]
+    if isinstance(source, (list, tuple)):
+        for file in source:
+            with _open(file) as ds:
+                for chunk in _chunks(ds, fields, chunk_size):
+                    yield chunk
+        return
+
+    if isinstance(source, xarray.Dataset):
+        names = fields or [name for name, var in source.data_vars.items()
+                           if var.dims == ('time', 'height')]
+        attrs = dict((name, _field_attrs(source[name].attrs))
+                     for name in names)
+        height = source['height'].values
+        time = source['time'].values
+        for start in range(0, len(time), chunk_size):
+            rows = slice(start, start + chunk_size)
+            yield (time[rows], height,
+                   dict((name, source[name][rows].values.astype(np.float32))
+                        for name in names), attrs)
+        return
+
+    # A qvp object, whose profiles are already in memory.
+    names = fields or [name for name in source.fields
+                       if source._profiles.has_data(name)]
+    schema = get_field_schema()
+    time = np.array(source.time, dtype='datetime64[ns]')
+    for start in range(0, len(time), chunk_size):
+        rows = slice(start, start + chunk_size)
+        yield (time[rows], np.asarray(source.height),
+               dict((name, source._profiles.data(name)[rows])
+                    for name in names),
+               dict((name, _field_attrs(schema[name]['attrs']))
+                    for name in names))
+
+
+def _field_attrs(attrs):
+    """ Returns the attributes of a field that still hold once aggregated. """
+    return dict((key, value) for key, value in attrs.items()
+                if key in ('units', 'long_name', 'standard_name'))
+
+
+def _step_starts(time, step):
+    """ Returns the start of the time step of each time. """
+    days = time.astype('datetime64[D]').astype('datetime64[ns]')
+    return days + (time - days) // step * step
+
+
+def _resample(time, data, step, how, percentile):
+    """ Reduces the profiles of each time step of a chunk. """
+    times, starts = np.unique(_step_starts(time, step), return_index=True)
+
+    reduced = {}
+    for name, values in data.items():
+        valid = np.isfinite(values)
+        if how in ('mean', 'count'):
+            counts = np.add.reduceat(valid, starts, axis=0)
+            if how == 'count':
+                reduced[name] = counts.astype(np.float32)
+                continue
+            sums = np.add.reduceat(np.where(valid, values, 0), starts, axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                reduced[name] = (sums / counts).astype(np.float32)
+            continue
+
+        # Pad the profiles of each step to the longest step so the median
+        # or percentile of all steps is a single call.
+        count = len(time)
+        sizes = np.diff(np.append(starts, count))
+        padded = np.full((len(times), sizes.max(), values.shape[1]), np.nan,
+                         dtype=np.float32)
+        index = np.arange(count) - np.repeat(starts, sizes)
+        padded[np.repeat(np.arange(len(times)), sizes), index] = values
+        q = 50 if how == 'median' else percentile
+        with warnings.catch_warnings():
+            # All-NaN steps are expected and left as NaN.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            reduced[name] = np.nanpercentile(padded, q, axis=1).astype(
+                np.float32)
+    return times, reduced
+
+
+def _rows(time, data, rows):
+    """ Returns the time and fields of rows of a chunk. """
+    return time[rows], dict((name, values[rows])
+                            for name, values in data.items())
+
+
+def _resample_pieces(pieces, step, how, percentile):
+    """ Reduces the time step held in pieces of consecutive chunks. """
+    time = np.concatenate([piece[0] for piece in pieces])
+    data = dict((name, np.concatenate([piece[1][name] for piece in pieces]))
+                for name in pieces[0][1])
+    return _resample(time, data, step, how, percentile)
+
+
+def _regrid(values, height, levels):
+    """ Linearly interpolates (time, height) profiles to levels. """
+    height = np.asarray(height, dtype=np.float64)
+    levels = np.asarray(levels, dtype=np.float64)
+    above = np.clip(np.searchsorted(height, levels), 1, len(height) - 1)
+    below = above - 1
+    weight = (levels - height[below]) / (height[above] - height[below])
+    regridded = (values[:, below] * (1 - weight)
+                 + values[:, above] * weight).astype(np.float32)
+    regridded[:, (levels < height[0]) | (levels > height[-1])] = np.nan
+    return regridded
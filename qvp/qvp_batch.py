@@ -0,0 +1,459 @@
+"""
+qvp.qvp_batch
+=============
+Creates daily QVP files and quicklooks for many days and radars.
+
+    find_files
+    run_batch
+    run_quicklooks
+    main
+    quicklooks_main
+
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .config import get_metadata, get_plot_values
+from .qvp_profile import qvp
+from .qvp_quicklooks import (QuicklookRenderer, _image_name, _panel_groups,
+                             _qvp_days)
+
+# Renderers of a worker process keyed by (config, panels, image_directory,
+# time_step), reused between the quicklooks it renders.
+_RENDERERS = {}
+
+# ARM file names carry the date and time after the datastream name,
+# e.g. sgpadicmac2I5.c1.20171005.000012.nc
+_DATE_PATTERN = re.compile(r'\.(\d{8})\.(\d{6})\.')
+
+
+def find_files(config, input_directory, start, end):
+    """
+    Finds the radar files of a radar between two dates.
+
+    Parameters
+    ----------
+    config : str
+        A string of the radar name found from config.py. The
+        input_datastream of the radar is used to match the file names.
+    input_directory : str
+        Directory searched for the radar files, including subdirectories.
+    start, end : datetime.date
+        First and last day of files to find.
+
+    Returns
+    -------
+    days : dict
+        Sorted lists of file paths keyed by the date of the files.
+
+    """
+    datastream = get_metadata(config)['input_datastream']
+    pattern = os.path.join(input_directory, '**', datastream + '.*')
+    days = {}
+    for filename in glob.glob(pattern, recursive=True):
+        match = _DATE_PATTERN.search(os.path.basename(filename))
+        if match is None:
+            continue
+        day = datetime.datetime.strptime(match.group(1), '%Y%m%d').date()
+        if start <= day <= end:
+            days.setdefault(day, []).append(filename)
+    for files in days.values():
+        files.sort(key=os.path.basename)
+    return days
+
+
+def run_batch(start, end, configs, input_directory, output_directory,
+              workers=None, retries=1, fields=None, desired_angle=None,
+              cache=None, manifest=None, rerun=False):
+    """
+    Creates a daily QVP file for each radar and day between start and end.
+
+    Each radar day is one task. Tasks are run on a pool of worker
+    processes that are reused between tasks, with at most twice as many
+    tasks queued as there are workers. A task that raises an exception is
+    run again up to retries times. Radar files that can not be read or
+    profiled are left out of their day and, with a manifest, recorded in
+    it with the reason.
+
+    Parameters
+    ----------
+    start, end : datetime.date
+        First and last day to process.
+    configs : list
+        List of radar names found from config.py.
+    input_directory : str
+        Directory containing the radar files.
+    output_directory : str
+        Directory the daily QVP files are written to.
+
+    Optional Parameters
+    -------------------
+    workers : int
+        Number of worker processes. None or 1 will run the tasks in this
+        process.
+    retries : int
+        Number of times a failed task is run again.
+    fields : list
+        List of QVP field names to profile and write. None for all fields.
+    desired_angle : float
+        Radar tilt angle used for the QVP. None will default to 20.0
+    cache : str
+        Directory of a ProfileCache shared by the tasks.
+    manifest : str
+        JSON file recording, for each radar day, the files that failed
+        with the reason, the files missing fields and the error of a day
+        that failed. Days without failures are removed from it.
+    rerun : bool
+        True to only run the days with failures in the manifest. With the
+        cache of the first run only the failed files are read again, the
+        other profiles come from the cache.
+
+    Returns
+    -------
+    results : dict
+        Output file path, or the last exception raised, keyed by
+        (config, day).
+
+    """
+    if rerun and manifest is None:
+        raise ValueError('A rerun needs the manifest of the failed files')
+    entries = _read_manifest(manifest) if manifest is not None else {}
+    tasks = []
+    for config in configs:
+        days = find_files(config, input_directory, start, end)
+        for day in sorted(days):
+            entry = entries.get(_manifest_key(config, day), {})
+            if rerun and 'failures' not in entry and 'error' not in entry:
+                continue
+            tasks.append((config, day, days[day]))
+
+    options = {'fields': fields, 'desired_angle': desired_angle,
+               'cache': cache}
+    results = {}
+    reports = {}
+    if workers is None or workers <= 1:
+        for config, day, files in tasks:
+            for attempt in range(retries + 1):
+                try:
+                    results[config, day], reports[config, day] = _run_task(
+                        config, files, output_directory, options)
+                    break
+                except Exception as error:
+                    results[config, day] = error
+        return _finish(results, reports, entries, manifest)
+
+    pending = {}
+    queue = iter(tasks)
+    attempts = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Keep the queue of submitted tasks bounded.
+            while len(pending) < 2 * workers:
+                task = next(queue, None)
+                if task is None:
+                    break
+                pending[pool.submit(_run_task, task[0], task[2],
+                                    output_directory, options)] = task
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                config, day, files = task = pending.pop(future)
+                try:
+                    results[config, day], reports[config, day] = (
+                        future.result())
+                except Exception as error:
+                    results[config, day] = error
+                    attempts[config, day] = attempts.get((config, day), 0) + 1
+                    if attempts[config, day] <= retries:
+                        pending[pool.submit(_run_task, config, files,
+                                            output_directory, options)] = task
+    return _finish(results, reports, entries, manifest)
+
+
+def _run_task(config, files, output_directory, options):
+    """
+    Creates and writes the QVP of one radar day. Returns the file path,
+    None when no file could be read, and the files that failed or miss
+    fields.
+
+    """
+    radar_qvp = qvp(files, desired_angle=options['desired_angle'],
+                    fields=options['fields'], cache=options['cache'])
+    report = {'failures': radar_qvp.failures,
+              'missing_fields': radar_qvp.missing_fields}
+    if not radar_qvp.time:
+        return None, report
+    radar_qvp.write(config, file_directory=output_directory)
+    datastream = get_metadata(config)['datastream']
+    return os.path.join(output_directory, datastream + '.'
+                        + radar_qvp.base_time[0].strftime('%Y%m%d')
+                        + '.000000.nc'), report
+
+
+def _finish(results, reports, entries, manifest):
+    """
+    Reports days without readable files as failed and updates the
+    manifest with the failures of each day that was run.
+
+    """
+    for (config, day), result in results.items():
+        if result is None:
+            result = results[config, day] = ValueError(
+                'No readable radar files')
+        entry = dict((name, values) for name, values in
+                     reports.get((config, day), {}).items() if values)
+        if isinstance(result, Exception):
+            entry['error'] = '%s: %s' % (type(result).__name__, result)
+        key = _manifest_key(config, day)
+        if entry:
+            entry.update({'config': config, 'day': day.strftime('%Y%m%d')})
+            entries[key] = entry
+        else:
+            entries.pop(key, None)
+    if manifest is not None:
+        _write_manifest(manifest, entries)
+    return results
+
+
+def _manifest_key(config, day):
+    """ Returns the manifest key of a radar day. """
+    return config + '.' + day.strftime('%Y%m%d')
+
+
+def _read_manifest(manifest):
+    """ Returns the entries of a manifest, none if it does not exist. """
+    if not os.path.exists(manifest):
+        return {}
+    with open(manifest) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest, entries):
+    """ Replaces the manifest, so a reader never sees it half written. """
+    tmp_path = manifest + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest)
+
+
+def run_quicklooks(files, config, fields, image_directory, panels=None,
+                   workers=None, overwrite=False, time_step=None):
+    """
+    Renders the quicklooks of every day of many QVP files.
+
+    Images are rendered on a pool of worker processes using the Agg
+    backend, each worker reusing one QuicklookRenderer. An image that is
+    newer than its QVP file is not rendered again.
+
+    Parameters
+    ----------
+    files : list
+        File paths to the QVP NetCDF files or Zarr stores.
+    config : str
+        A string of the radar name found from config.py.
+    fields : list
+        Radar fields to plot.
+    image_directory : str
+        Directory the images are saved to.
+
+    Optional Parameters
+    -------------------
+    panels : int
+        Number of fields in each image. One panel images get a field each.
+        None will plot all fields in one image.
+    workers : int
+        Number of worker processes. None or 1 will render the images in
+        this process.
+    overwrite : bool
+        True to render images that are newer than their QVP file.
+    time_step : str or timedelta
+        Draws the profiles on a regular time grid of this step with imshow.
+        None will draw every profile with pcolormesh.
+
+    Returns
+    -------
+    results : dict
+        Image path, None if the image was up to date, or the exception
+        raised, keyed by (file, day, tag).
+
+    """
+    if panels is None:
+        panels = len(fields)
+    save_name = get_plot_values(config)['save_name']
+    tasks = []
+    results = {}
+    for file in files:
+        match = _DATE_PATTERN.search(os.path.basename(file))
+        days = [match.group(1)] if match else _qvp_days(file)
+        for day in days:
+            for group, tag in _panel_groups(panels, fields):
+                image = os.path.join(image_directory,
+                                     _image_name(save_name, day, tag))
+                if not overwrite and os.path.exists(image) and (
+                        os.path.getmtime(image) > os.path.getmtime(file)):
+                    results[file, day, tag] = None
+                    continue
+                tasks.append((file, day, tag, group))
+
+    args = (config, panels, image_directory, time_step)
+    if workers is None or workers <= 1:
+        for file, day, tag, group in tasks:
+            try:
+                results[file, day, tag] = _render_task(args, file, group,
+                                                       day, tag)
+            except Exception as error:
+                results[file, day, tag] = error
+        return results
+
+    pending = {}
+    queue = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Keep the queue of submitted tasks bounded.
+            while len(pending) < 2 * workers:
+                task = next(queue, None)
+                if task is None:
+                    break
+                file, day, tag, group = task
+                pending[pool.submit(_render_agg_task, args, file, group,
+                                    day, tag)] = (file, day, tag)
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    results[key] = future.result()
+                except Exception as error:
+                    results[key] = error
+    return results
+
+
+def _render_agg_task(args, file, fields, day, tag):
+    """ Renders a quicklook in a worker process with the Agg backend. """
+    import matplotlib
+    matplotlib.use('Agg')
+    return _render_task(args, file, fields, day, tag)
+
+
+def _render_task(args, file, fields, day, tag):
+    """ Renders a quicklook with the renderer of this process. """
+    renderer = _RENDERERS.get(args)
+    if renderer is None:
+        config, panels, image_directory, time_step = args
+        renderer = _RENDERERS[args] = QuicklookRenderer(
+            config, panels=panels, image_directory=image_directory,
+            time_step=time_step)
+    return renderer.render(file, fields, date=day, tag=tag)
+
+
+def main(argv=None):
+    """ Command line entry point of qvp-batch. """
+    parser = argparse.ArgumentParser(
+        prog='qvp-batch',
+        description='Create daily QVP files for a range of days and radars.')
+    parser.add_argument('start', help='First day, YYYYMMDD')
+    parser.add_argument('end', help='Last day, YYYYMMDD')
+    parser.add_argument('input_directory', help='Directory of radar files')
+    parser.add_argument('output_directory',
+                        help='Directory for the daily QVP files')
+    parser.add_argument('-c', '--config', action='append', dest='configs',
+                        required=True,
+                        help='Radar name from config.py, may be repeated')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of worker processes')
+    parser.add_argument('-r', '--retries', type=int, default=1,
+                        help='Number of retries of a failed day')
+    parser.add_argument('-f', '--field', action='append', dest='fields',
+                        help='QVP field to write, may be repeated')
+    parser.add_argument('-a', '--desired-angle', type=float, default=None,
+                        help='Radar tilt angle, defaults to 20.0')
+    parser.add_argument('--cache', default=None,
+                        help='Directory of the profile cache')
+    parser.add_argument('-m', '--manifest', default=None,
+                        help='JSON file recording the failed radar files')
+    parser.add_argument('--rerun', action='store_true',
+                        help='Only run the days with failures in the '
+                             'manifest')
+    args = parser.parse_args(argv)
+    if args.rerun and args.manifest is None:
+        parser.error('--rerun needs --manifest')
+
+    start = datetime.datetime.strptime(args.start, '%Y%m%d').date()
+    end = datetime.datetime.strptime(args.end, '%Y%m%d').date()
+    results = run_batch(start, end, args.configs, args.input_directory,
+                        args.output_directory, workers=args.workers,
+                        retries=args.retries, fields=args.fields,
+                        desired_angle=args.desired_angle, cache=args.cache,
+                        manifest=args.manifest, rerun=args.rerun)
+
+    failed = 0
+    for (config, day), result in sorted(results.items()):
+        if isinstance(result, Exception):
+            failed += 1
+            print('%s %s failed: %s' % (config, day, result), file=sys.stderr)
+        else:
+            print('%s %s wrote %s' % (config, day, result))
+    return 1 if failed else 0
+
+
+def quicklooks_main(argv=None):
+    """ Command line entry point of qvp-quicklooks. """
+    parser = argparse.ArgumentParser(
+        prog='qvp-quicklooks',
+        description='Render the quicklooks of QVP files.')
+    parser.add_argument('files', nargs='+',
+                        help='QVP netCDF files or Zarr stores')
+    parser.add_argument('-c', '--config', required=True,
+                        help='Radar name from config.py')
+    parser.add_argument('-f', '--field', action='append', dest='fields',
+                        required=True, help='Field to plot, may be repeated')
+    parser.add_argument('-o', '--image-directory', default='.',
+                        help='Directory for the images')
+    parser.add_argument('-p', '--panels', type=int, default=None,
+                        help='Fields in each image, defaults to all fields')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of worker processes')
+    parser.add_argument('-t', '--time-step', default=None,
+                        help='Regular time step of a fast imshow rendering, '
+                             'e.g. 5min')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Render images newer than their QVP file')
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    results = run_quicklooks(args.files, args.config, args.fields,
+                             args.image_directory, panels=args.panels,
+                             workers=args.workers, overwrite=args.overwrite,
+                             time_step=args.time_step)
+    elapsed = time.time() - start
+
+    rendered = skipped = failed = 0
+    for (file, day, tag), result in sorted(
+            results.items(), key=lambda item: str(item[0])):
+        if isinstance(result, Exception):
+            failed += 1
+            print('%s %s failed: %s' % (file, day, result), file=sys.stderr)
+        elif result is None:
+            skipped += 1
+        else:
+            rendered += 1
+    print('%d images rendered, %d up to date, %d failed in %.1f s '
+          '(%.2f images/sec)' % (rendered, skipped, failed, elapsed,
+                                 rendered / elapsed if elapsed else 0.0))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+qvp.qvp_cache
+=============
+On-disk cache of the profiles of each radar file.
+
+    ProfileCache
+
+"""
+
+import datetime
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import numpy.ma as ma
+
+# Bumped when the layout of a cache entry or the profile calculation
+# changes so that old entries are no longer used.
+_CACHE_VERSION = 1
+
+
+class ProfileCache(object):
+    """
+    On-disk cache of the profiles computed from each radar file.
+
+    Each entry is a .npz file keyed by the path, size and modification
+    time of the radar file along with the desired angle, gatefilter,
+    fields and read path, a single sweep or the whole volume, used to
+    create the profiles. When the total size of the cache
+    goes over max_size the least recently used entries are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which the cache entries are stored. It is created
+        if it does not exist.
+
+    Optional Parameters
+    -------------------
+    max_size : int
+        Maximum total size of the cache entries in bytes.
+        None will default to 1 GB.
+
+    """
+
+    def __init__(self, directory, max_size=None):
+        if max_size is None:
+            max_size = 2**30
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entry_stats())
+
+    def key(self, filename, desired_angle, fields, gatefilter=None,
+            sweep_only=True):
+        """
+        Returns the cache key of a radar file, None if the file does not
+        exist. The whole volume is read when a gatefilter is given, so the
+        read path is part of the key along with sweep_only.
+
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        if desired_angle is None:
+            desired_angle = 20.0
+        reader = 'sweep' if sweep_only and gatefilter is None else 'volume'
+        digest = hashlib.sha1(repr((
+            _CACHE_VERSION, os.path.abspath(filename), stat.st_size,
+            stat.st_mtime_ns, float(desired_angle), sorted(fields),
+            bool(sweep_only), reader)).encode('utf-8'))
+        if gatefilter is not None:
+            digest.update(np.packbits(gatefilter.gate_excluded).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the profiles stored under key, None if there is no entry.
+
+        """
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                result = _entry_to_result(entry)
+        except (OSError, KeyError, ValueError):
+            return None
+        # Mark the entry as recently used, unless another process has
+        # evicted it since.
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """ Stores the profiles of a radar file under key. """
+        if key is None or result is None:
+            return
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as tmp_file:
+                np.savez(tmp_file, **_result_to_entry(result))
+        except BaseException:
+            # Not an entry, so it would never be evicted.
+            _remove(tmp_path)
+            raise
+        path = self._path(key)
+        try:
+            self._size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        try:
+            self._size += os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        if self._size > self.max_size:
+            self._evict()
+
+    def clear(self):
+        """ Removes every entry from the cache. """
+        for entry in self._entries():
+            _remove(entry.path)
+        self._size = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory)
+                if entry.name.endswith('.npz')]
+
+    def _entry_stats(self):
+        """
+        Returns the path, modification time and size of each entry. The
+        cache may be shared by several processes, so entries removed by
+        another process while listing are left out.
+
+        """
+        stats = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            stats.append((entry.path, stat.st_mtime, stat.st_size))
+        return stats
+
+    def _evict(self):
+        """ Removes least recently used entries until under max_size. """
+        entries = sorted(self._entry_stats(), key=lambda entry: entry[1])
+        self._size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._size <= self.max_size:
+                break
+            self._size -= size
+            _remove(path)
+
+
+def _remove(path):
+    """ Removes a file, unless another process already removed it. """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _result_to_entry(result):
+    """ Flattens the result of a profiled file into arrays. """
+    entry = {'time': np.array(result['time']),
+             'base_time': np.array(result['base_time'],
+                                   dtype='datetime64[us]'),
+             'range': result['range'],
+             'height': result['height'],
+             'alt': result['alt'],
+             'lon': result['lon'],
+             'lat': result['lat'],
+             'fields': np.array(list(result['profiles']))}
+    for name, profile in result['profiles'].items():
+        entry['data_' + name] = ma.getdata(profile)
+        entry['mask_' + name] = ma.getmaskarray(profile)
+    return entry
+
+
+def _entry_to_result(entry):
+    """ Rebuilds the result of a profiled file from a cache entry. """
+    profiles = {}
+    for name in entry['fields']:
+        name = str(name)
+        profiles[name] = ma.array(entry['data_' + name],
+                                  mask=entry['mask_' + name])
+    return {'time': str(entry['time']),
+            'base_time': entry['base_time'][()].astype(datetime.datetime),
+            'range': entry['range'],
+            'height': entry['height'],
+            'alt': entry['alt'],
+            'lon': entry['lon'],
+            'lat': entry['lat'],
+            'profiles': profiles}
@@ -0,0 +1,270 @@
+"""
+qvp.qvp_climatology
+===================
+Statistics of QVP fields by hour of day and height over many days.
+
+    Climatology
+    climatology
+
+"""
+
+import numpy as np
+import xarray
+
+from .config import get_field_parameters, get_field_schema
+from .default_config import _DEFAULT_PACKING
+from .qvp_aggregate import _chunks, _regrid
+
+_HOURS = 24
+
+
+class Climatology(object):
+    """
+    Streaming statistics of QVP fields by hour of day and height.
+
+    Profiles are added a chunk at a time and only running statistics are
+    kept: the count, mean and variance (combined with Chan's parallel
+    algorithm), minimum, maximum and a fixed bin histogram of each field,
+    hour and height. Quantiles are interpolated from the histogram, so
+    their accuracy is the bin width. Memory use does not depend on the
+    number of profiles added.
+
+    Parameters
+    ----------
+    fields : list
+        QVP fields to accumulate.
+
+    Optional Parameters
+    -------------------
+    heights : array
+        Heights in meters profiles are interpolated to. None will use the
+        heights of the first profiles added.
+    bins : dict
+        Histogram bin edges keyed by field. Fields without edges get nbins
+        bins over the packing range, the valid range in the field schema
+        or the vmin and vmax of the field parameters in config.py.
+    nbins : int
+        Number of histogram bins of fields without bin edges.
+    quantiles : list
+        Quantiles written by to_dataset.
+
+    """
+
+    def __init__(self, fields, heights=None, bins=None, nbins=100,
+                 quantiles=(0.1, 0.25, 0.5, 0.75, 0.9)):
+        if bins is None:
+            bins = {}
+        self.fields = list(fields)
+        self.heights = None if heights is None else np.asarray(
+            heights, dtype=np.float64)
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.edges = dict((field, np.asarray(bins[field], dtype=np.float64)
+                           if field in bins else _default_edges(field, nbins))
+                          for field in self.fields)
+        self.attrs = {}
+        self._stats = None
+
+    def update(self, source, chunk_size=1024):
+        """
+        Adds the profiles of a qvp object, a QVP Dataset or QVP files.
+
+        """
+        for time, height, data, attrs in _chunks(source, self.fields,
+                                                 chunk_size):
+            if self.heights is None:
+                self.heights = np.asarray(height, dtype=np.float64)
+            if self._stats is None:
+                self._stats = dict((field, _Moments(
+                    len(self.heights), len(self.edges[field]) + 1))
+                    for field in self.fields)
+                self.attrs = attrs
+            regrid = (len(height) != len(self.heights)
+                      or not np.allclose(height, self.heights))
+            days = time.astype('datetime64[D]')
+            hours = ((time - days) // np.timedelta64(1, 'h')).astype(int)
+            order = np.argsort(hours, kind='stable')
+            hours = hours[order]
+            for field in self.fields:
+                values = data[field][order]
+                if regrid:
+                    values = _regrid(values, height, self.heights)
+                self._stats[field].add(hours, values, self.edges[field])
+
+    def to_dataset(self):
+        """
+        Returns the statistics as a Dataset with hour and height
+        dimensions. Each field has count, mean, std, min, max, quantile
+        and histogram variables.
+
+        """
+        if self._stats is None:
+            raise ValueError('No profiles have been added')
+        ds = xarray.Dataset(coords={
+            'hour': np.arange(_HOURS),
+            'height': self.heights,
+            'quantile': self.quantiles})
+        ds['hour'].attrs = {'long_name': 'Hour of day', 'units': 'hour'}
+        ds['height'].attrs = {'standard_name': 'height', 'units': 'meters'}
+        dims = ('hour', 'height')
+        for field in self.fields:
+            stats = self._stats[field]
+            edges = self.edges[field]
+            attrs = self.attrs.get(field, {})
+            long_name = attrs.get('long_name', field)
+            units = attrs.get('units', '1')
+            with np.errstate(invalid='ignore', divide='ignore'):
+                std = np.sqrt(stats.m2 / (stats.count - 1))
+                mean = np.where(stats.count > 0, stats.mean, np.nan)
+            ds[field + '_count'] = xarray.Variable(
+                dims, stats.count, {'long_name': 'Number of ' + long_name,
+                                    'units': '1'})
+            for name, values in [('mean', mean), ('std', std),
+                                 ('min', stats.min), ('max', stats.max)]:
+                ds[field + '_' + name] = xarray.Variable(
+                    dims, values.astype(np.float32),
+                    {'long_name': long_name + ' ' + name, 'units': units})
+            ds[field + '_quantile'] = xarray.Variable(
+                dims + ('quantile',),
+                _histogram_quantiles(stats.histogram, edges,
+                                     self.quantiles).astype(np.float32),
+                {'long_name': long_name + ' quantile', 'units': units,
+                 'comment': 'Interpolated from the histogram'})
+            bin_dim = field + '_bin'
+            ds.coords[bin_dim + '_edge'] = xarray.Variable(
+                bin_dim + '_edge', edges, {'units': units})
+            ds[field + '_histogram'] = xarray.Variable(
+                dims + (bin_dim,), stats.histogram[..., 1:-1],
+                {'long_name': long_name + ' histogram', 'units': '1',
+                 'below_range': stats.histogram[..., 0].sum(),
+                 'above_range': stats.histogram[..., -1].sum()})
+        return ds
+
+    def write(self, filename):
+        """ Writes the statistics to a netCDF file. """
+        self.to_dataset().to_netcdf(filename)
+
+
+def climatology(files, fields, chunk_size=1024, **kwargs):
+    """
+    Computes the climatology of QVP files, reading one file at a time.
+
+    Parameters
+    ----------
+    files : list
+        File paths to the daily QVP NetCDF files or Zarr stores.
+    fields : list
+        QVP fields to accumulate.
+
+    Optional Parameters
+    -------------------
+    chunk_size : int
+        Number of profiles read at a time.
+    kwargs
+        Settings passed to Climatology.
+
+    Returns
+    -------
+    clim : Climatology
+        Statistics of the profiles of every file.
+
+    """
+    clim = Climatology(fields, **kwargs)
+    for file in files:
+        clim.update(file, chunk_size=chunk_size)
+    return clim
+
+
+class _Moments(object):
+    """ Running statistics of a field by hour and height. """
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'histogram')
+
+    def __init__(self, nheight, nbins):
+        shape = (_HOURS, nheight)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64)
+        self.min = np.full(shape, np.nan)
+        self.max = np.full(shape, np.nan)
+        # nbins includes the counts below the first and above the last edge
+        # kept at either end.
+        self.histogram = np.zeros(shape + (nbins,), dtype=np.int64)
+
+    def add(self, hours, values, edges):
+        """ Adds values of hour sorted profiles. """
+        values = values.astype(np.float64)
+        present, starts = np.unique(hours, return_index=True)
+        valid = np.isfinite(values)
+        filled = np.where(valid, values, 0)
+
+        count = np.add.reduceat(valid, starts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.add.reduceat(filled, starts, axis=0) / count
+        deviation = np.where(valid, values - mean[np.searchsorted(
+            present, hours)], 0)
+        m2 = np.add.reduceat(deviation**2, starts, axis=0)
+
+        # Combine with the running statistics of the same hours.
+        total = self.count[present] + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = np.where(count > 0, mean - self.mean[present], 0)
+            weight = np.where(total > 0, count / total, 0)
+            self.m2[present] += m2 + delta**2 * self.count[present] * weight
+            self.mean[present] += delta * weight
+        self.count[present] = total
+        self.min[present] = np.fmin(self.min[present], np.fmin.reduceat(
+            np.where(valid, values, np.nan), starts, axis=0))
+        self.max[present] = np.fmax(self.max[present], np.fmax.reduceat(
+            np.where(valid, values, np.nan), starts, axis=0))
+
+        nbins = self.histogram.shape[-1]
+        index = np.searchsorted(edges, values, side='right')
+        # The last edge closes the last bin.
+        index[values == edges[-1]] = len(edges) - 1
+        nheight = values.shape[1]
+        flat = ((hours[:, None] * nheight + np.arange(nheight)) * nbins
+                + index)[valid]
+        self.histogram += np.bincount(
+            flat, minlength=self.histogram.size).reshape(
+                self.histogram.shape)
+
+
+def _default_edges(field, nbins):
+    """ Returns nbins histogram bin edges over the range of a field. """
+    attrs = get_field_schema().get(field, {}).get('attrs', {})
+    params = get_field_parameters().get(field, {})
+    if field in _DEFAULT_PACKING:
+        vmin, vmax = _DEFAULT_PACKING[field]
+    elif 'valid_min' in attrs and 'valid_max' in attrs:
+        vmin, vmax = attrs['valid_min'], attrs['valid_max']
+    elif params.get('vmin') is not None and params.get('vmax') is not None:
+        vmin, vmax = params['vmin'], params['vmax']
+    else:
+        raise ValueError('No histogram range for ' + field
+                         + ', pass its bin edges in bins')
+    return np.linspace(vmin, vmax, nbins + 1)
+
+
+def _histogram_quantiles(histogram, edges, quantiles):
+    """
+    Interpolates quantiles from histograms whose first and last counts are
+    below and above the edges.
+
+    """
+    # Values outside of the edges are placed on the nearest edge.
+    counts = np.concatenate([histogram[..., :1] + histogram[..., 1:2],
+                             histogram[..., 2:-2],
+                             histogram[..., -2:-1] + histogram[..., -1:]],
+                            axis=-1).astype(np.float64)
+    cdf = np.cumsum(counts, axis=-1)
+    total = cdf[..., -1:]
+    targets = quantiles * total
+    index = (cdf[..., None, :] < targets[..., :, None]).sum(axis=-1)
+    index = np.minimum(index, counts.shape[-1] - 1)
+    below = np.take_along_axis(cdf - counts, index, axis=-1)
+    inside = np.take_along_axis(counts, index, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.clip((targets - below) / inside, 0, 1)
+    result = edges[index] + fraction * (edges[index + 1] - edges[index])
+    result[np.broadcast_to(total == 0, result.shape)] = np.nan
+    return result
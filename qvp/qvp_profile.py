@@ -8,12 +8,33 @@ import datetime
 import sys
 import socket
 import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-from .config import get_metadata
+from .config import get_metadata, get_encoding
+from .default_config import _DEFAULT_FIELD_SCHEMA
+from .qvp_cache import ProfileCache
+from .qvp_reader import _read_qvp_sweep
+from .qvp_stats import QVPStats, _stage
+from .retrievals.melting_layer import (find_melting_layer,
+                                       _MELTING_LAYER_ATTRS,
+                                       _MELTING_LAYER_FIELDS)
+
+# QVP attribute names paired with the CMAC2.0 radar field they are
+# profiled from.
+_FIELD_NAMES = tuple((name, field['radar_field'])
+                     for name, field in _DEFAULT_FIELD_SCHEMA.items())
+
+# Radar fields that are only present in some of the input files.
+_OPTIONAL_FIELDS = tuple(field['radar_field']
+                         for field in _DEFAULT_FIELD_SCHEMA.values()
+                         if field.get('optional'))
 
 class qvp():
 
-    def __init__(self, files, desired_angle=None, gatefilter=None):
+    def __init__(self, files, desired_angle=None, gatefilter=None,
+                 fields=None, sweep_only=True, workers=None, executor=None,
+                 cache=None, stats=None):
         """
         Quasi Vertical Profile
         
@@ -30,110 +51,151 @@ class qvp():
         gatefilter : GateFilter
             A GateFilter indicating radar gates that should be excluded
             from the import qvp calculation.
-       
+        fields : list
+            List of QVP field names to read and profile. Only these fields
+            are loaded from the radar files. None will profile all fields.
+            Fields that are not selected are not attributes of the qvp.
+        sweep_only : bool
+            True to read only the sweep closest to desired_angle from
+            CF/Radial files instead of the whole volume. The whole volume
+            is always read when a gatefilter is given.
+        workers : int
+            Number of processes used to read and profile the radar files.
+            None or 1 will profile the files serially.
+        executor : Executor
+            A concurrent.futures Executor used to read and profile the radar
+            files instead of creating a process pool. Overrides workers.
+        cache : ProfileCache or str
+            Cache, or directory of a cache, of the profiles of each file.
+            Unchanged files found in the cache are not read again.
+        stats : QVPStats
+            Records the wall time, bytes read and peak memory of each
+            stage of each file, and of write. None records nothing.
+
+        Files that can not be read or profiled are skipped and listed in
+        failures with the reason, fields missing from a file are left
+        masked and listed in missing_fields, so one bad file does not lose
+        the profiles of the others.
+
         """
+        if fields is None:
+            fields = [name for name, _ in _FIELD_NAMES]
+        unknown = set(fields) - set(name for name, _ in _FIELD_NAMES)
+        if unknown:
+            raise ValueError('Unknown QVP fields: ' + ', '.join(sorted(unknown)))
+        self.fields = list(fields)
+        self.stats = stats
+        self.failures = {}
+        self.missing_fields = {}
+        self.skipped = []
+
         self.time = []
         self.base_time = []
         self.range = []
-        self.total_power = []
-        self.reflectivity = []
-        self.velocity = []
-        self.spectrum_width = []
-        self.differential_reflectivity = []
-        self.specific_differential_phase = []
-        self.cross_correlation_ratio = []
-        self.normalized_coherent_power = []
-        self.differential_phase = []
-        self.xsapr_clutter = []
-        self.velocity_texture = []
-        self.gate_id = []
-        self.corrected_velocity = []
-        self.unfolded_differential_phase = []
-        self.corrected_differential_phase = []
-        self.filtered_corrected_differential_phase = []
-        self.corrected_specific_diff_phase = []
-        self.filtered_corrected_specific_diff_phase = []
-        self.corrected_differential_reflectivity = []
-        self.specific_attenuation = []
-        self.signal_to_noise_ratio = []
-        self.corrected_reflectivity = []
-        self.radar_echo_classification = []
-        self.path_integrated_attenuation = []
-        self.specific_differential_attenuation = []
-        self.path_integrated_differential_attenuation = []
-        self.rain_rate_A = []
+        self._profiles = _ProfileStore(self.fields)
         
-        self.create_qvp(files, desired_angle, gatefilter)
+        self.create_qvp(files, desired_angle, gatefilter, fields=self.fields,
+                        sweep_only=sweep_only, workers=workers,
+                        executor=executor, cache=cache)
+
+    def __getattr__(self, name):
+        """
+        Returns the profiles of a selected field as a masked (time, height)
+        array. Only the fields selected with fields are attributes, any
+        other QVP field raises an AttributeError instead of being an empty
+        list as before fields could be selected.
+
+        """
+        # Profiles are held in one buffer, fields are returned as masked
+        # (time, height) views of it.
+        if not name.startswith('_') and name in self.__dict__.get('fields', ()):
+            return self._profiles.field(name)
+        raise AttributeError(name)
 
-    def create_qvp(self, files, desired_angle, gatefilter):
+    def create_qvp(self, files, desired_angle, gatefilter, fields=None,
+                   sweep_only=True, workers=None, executor=None, cache=None):
         """
         Creates a QVP object containig fields from a radar object that can
         be used to plot and produce the quasi vertical profile.
-            
+
+        Files are profiled in parallel when workers or executor are given,
+        the profiles are then appended in the order of files so the result
+        is the same as the serial path. Files found in the cache are not
+        read. Files that fail are added to failures with the reason and
+        the files missing fields to missing_fields.
+
         """
-        for file in files:
-            try:
-                radar = pyart.io.read(file)
-            except TypeError:
+        if fields is None:
+            fields = self.fields
+        missing = set(fields) - set(self.fields)
+        if missing:
+            raise ValueError('Fields are not stored by this QVP: '
+                             + ', '.join(sorted(missing)))
+        if isinstance(cache, str):
+            cache = ProfileCache(cache)
+        files = list(files)
+        self._profiles.reserve(len(self._profiles) + len(files))
+
+        # Files with cached profiles are not read again.
+        results = [None] * len(files)
+        keys = [None] * len(files)
+        if cache is not None:
+            for i, file in enumerate(files):
+                keys[i] = cache.key(file, desired_angle, fields, gatefilter,
+                                    sweep_only)
+                results[i] = cache.get(keys[i])
+        todo = [i for i, result in enumerate(results) if result is None]
+
+        args = ([files[i] for i in todo], repeat(desired_angle),
+                repeat(gatefilter), repeat(fields), repeat(sweep_only),
+                repeat(self.stats is not None))
+        if executor is not None:
+            computed = executor.map(_profile_file, *args)
+        elif workers is not None and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                computed = list(pool.map(_profile_file, *args))
+        else:
+            computed = map(_profile_file, *args)
+        for i, result in zip(todo, computed):
+            for record in result.pop('stats', ()):
+                self.stats.add(record)
+            if 'error' in result:
+                self.failures[files[i]] = result['error']
                 continue
-            
-
-            time = netCDF4.num2date(radar.time['data'][0],
-                                    radar.time['units'])
-            rtime = datetime.datetime.strftime(
-                time, '%Y-%m-%dT%H:%M:%S')
-            qvp = pyart.retrieve.quasi_vertical_profile(
-                radar, desired_angle=desired_angle, gatefilter=gatefilter)
-
-            self.time.append(rtime)
-            self.base_time.append(time)
-            self.range.append(qvp['range'])
-            self.total_power.append(qvp['total_power'])
-            self.reflectivity.append(qvp['reflectivity'])
-            self.velocity.append(qvp['mean_doppler_velocity'])
-            self.spectrum_width.append(qvp['spectral_width'])
-            self.differential_reflectivity.append(qvp['differential_reflectivity'])
-            self.specific_differential_phase.append(qvp['specific_differential_phase'])
-            self.cross_correlation_ratio.append(qvp['cross_correlation_ratio_hv'])
-            self.normalized_coherent_power.append(qvp['normalized_coherent_power'])
-            self.differential_phase.append(qvp['differential_phase'])
-            self.xsapr_clutter.append(qvp['ground_clutter'])
-            self.velocity_texture.append(qvp['velocity_texture'])
-            self.gate_id.append(qvp['gate_id'])
-            self.corrected_velocity.append(qvp['corrected_velocity'])
-            self.unfolded_differential_phase.append(qvp['unfolded_differential_phase'])
-            self.corrected_differential_phase.append(
-                qvp['corrected_differential_phase'])
-            self.filtered_corrected_differential_phase.append(
-                qvp['filtered_corrected_differential_phase'])
-            self.corrected_specific_diff_phase.append(
-                qvp['corrected_specific_diff_phase'])
-            self.filtered_corrected_specific_diff_phase.append(
-                qvp['filtered_corrected_specific_diff_phase'])
-            self.corrected_differential_reflectivity.append(
-                qvp['corrected_differential_reflectivity'])
-            self.specific_attenuation.append(qvp['specific_attenuation'])
-            self.signal_to_noise_ratio.append(qvp['SNR'])
-            self.corrected_reflectivity.append(qvp['corrected_reflectivity'])
-
-            if 'radar_echo_classification' in list(radar.fields.keys()):
-                self.radar_echo_classification.append(qvp['radar_echo_classification'])
-
-            self.path_integrated_attenuation.append(qvp['path_integrated_attenuation'])
-            self.specific_differential_attenuation.append(
-                qvp['specific_differential_attenuation'])
-            self.path_integrated_differential_attenuation.append(
-                qvp['path_integrated_differential_attenuation'])
-            self.rain_rate_A.append(qvp['rain_rate_A'])
-            self.height = qvp['height']
-            self.alt = radar.altitude['data']
-            self.lon = radar.longitude['data']
-            self.lat = radar.latitude['data']
-            
-            del qvp
-            del radar
-        
-    def write(self, config, file_directory=None):
+            results[i] = result
+            if cache is not None:
+                cache.put(keys[i], result)
+
+        optional = [name for name, radar_field in _FIELD_NAMES
+                    if radar_field in _OPTIONAL_FIELDS]
+        with _stage(self.stats, 'accumulate'):
+            for file, result in zip(files, results):
+                if result is None:
+                    continue
+                try:
+                    self._profiles.append(result['profiles'],
+                                          len(result['height']))
+                except ValueError as error:
+                    # A scan whose gates differ from the other scans.
+                    self.failures[file] = 'ValueError: ' + str(error)
+                    continue
+                missing = [name for name in fields
+                           if name not in result['profiles']
+                           and name not in optional]
+                if missing:
+                    self.missing_fields[file] = missing
+
+                self.time.append(result['time'])
+                self.base_time.append(result['base_time'])
+                self.range.append(result['range'])
+                self.height = result['height']
+                self.alt = result['alt']
+                self.lon = result['lon']
+                self.lat = result['lat']
+
+    def write(self, config, file_directory=None, fields=None, append=False,
+              encoding='default', format='netcdf', region=None,
+              melting_layer=False, time_step=None):
         """
         Writes QVP file to a netCDF output
         
@@ -148,28 +210,321 @@ class qvp():
         file_directory : str
             File path to the file output folder of which to save the QVP netCDF files.
             If no file path is given, file path defaults to users home directory.
+        fields : list
+            List of QVP field names to write. None will write every field
+            that was profiled.
+        append : bool
+            True to append the profiles to the daily files instead of
+            rewriting them. A daily file is created if it does not exist
+            yet, profiles that are not newer than the last time in the file
+            are skipped so a restarted run can be appended again, and their
+            times listed in skipped.
+        encoding : str or dict
+            Name of the netCDF encoding settings found from config.py, or
+            a dictionary of settings that override the default ones.
+        format : str
+            'netcdf' to write daily netCDF files or 'zarr' to write to a
+            single Zarr store, named after the datastream, that holds
+            every day. With append the profiles are added along time to
+            the Zarr store, otherwise the store is rewritten.
+        region : slice
+            Zarr only. Time indices of an existing store that the profiles
+            are written to, so that workers can fill separate regions of
+            one store in parallel. Regions should start and end on a
+            multiple of the time_chunk of the encoding.
+        melting_layer : bool
+            True to add the melting_layer_bottom and melting_layer_top
+            heights found by qvp.retrievals.find_melting_layer. Needs the
+            cross_correlation_ratio, corrected_differential_reflectivity
+            and corrected_reflectivity fields.
+        time_step : str or timedelta
+            Writes the profiles on a fixed time grid of whole days with this
+            step, e.g. '5min' for the scan schedule, so every daily file has
+            the same shape. Each profile goes to the nearest grid time, grid
+            times without a scan are masked and scan_time holds the start
+            of the scan of each grid time. The profiles of each day are
+            written to their own daily file. Appending fills the grid times of
+            the new scans, keeping the scan nearest to each grid time, in a
+            Zarr store existing days are merged into a region and new days
+            appended. None will write the time of every
+            profile.
         
         """
         if file_directory is None:
             file_directory = os.path.expanduser('~')
+        fields = self._check_fields(fields, melting_layer)
+        
+        if isinstance(encoding, dict):
+            settings = get_encoding()
+            settings.update(encoding)
+        else:
+            settings = get_encoding(encoding)
+
+        if format == 'zarr':
+            with _stage(self.stats, 'to_zarr'):
+                self._write_zarr(config, file_directory, fields, settings,
+                                 append, region, melting_layer, time_step)
+            return
+        if append:
+            with _stage(self.stats, 'append'):
+                self._append(config, file_directory, fields, settings,
+                             melting_layer, time_step)
+            return
+
+        # A time grid covers whole days, so each day gets its own file.
+        days = [slice(None)] if time_step is None else _day_rows(self.time)
+        for rows in days:
+            with _stage(self.stats, 'dataset'):
+                ds, encoding = self._dataset(config, fields, rows, settings,
+                                             melting_layer=melting_layer,
+                                             time_step=time_step)
+            attributes = ds.attrs
+            date = pd.to_datetime(
+                ma.array(self.time[rows][0], dtype='datetime64[ns]')
+            ).strftime('%Y%m%d')
+            filename = (file_directory + '/' + attributes['datastream']
+                        + '.' + str(date) + '.000000.nc')
+            with _stage(self.stats, 'to_netcdf', filename):
+                ds.to_netcdf(path=filename, encoding=encoding,
+                             unlimited_dims='time')
+
+    def to_dataset(self, config=None, fields=None, melting_layer=False,
+                   time_step=None):
+        """
+        Returns the QVP as the Dataset write would write, without writing
+        it. The fields are views of the profiles, so nothing is copied or
+        decoded and the Dataset can be handed straight to the quicklooks.
         
+        Optional Parameters
+        -------------------
+        config : str
+            A string of the radar name found from config.py whose metadata
+            is added to the Dataset attributes. None will add no metadata.
+        fields : list
+            List of QVP field names. None will return every field that was
+            profiled.
+        melting_layer : bool
+            True to add the melting_layer_bottom and melting_layer_top
+            heights, as in write.
+        time_step : str or timedelta
+            Places the profiles on a fixed time grid of whole days with
+            this step, as in write.
+        
+        Returns
+        -------
+        ds : Dataset
+            QVP fields, masked values are NaN.
+        
+        """
+        ds, _ = self._dataset(config, self._check_fields(fields, melting_layer),
+                              melting_layer=melting_layer,
+                              time_step=time_step)
+        return ds
+
+    def _check_fields(self, fields, melting_layer=False):
+        """
+        Returns the fields with profiles to write, raising a ValueError for
+        fields that were not profiled.
+
+        """
+        if fields is None:
+            fields = self.fields
+        missing = set(fields) - set(self.fields)
+        if missing:
+            raise ValueError('Fields were not profiled: '
+                             + ', '.join(sorted(missing)))
+        if melting_layer:
+            missing = [field for field in _MELTING_LAYER_FIELDS
+                       if field not in self.fields
+                       or not self._profiles.has_data(field)]
+            if missing:
+                raise ValueError('The melting layer needs the fields: '
+                                 + ', '.join(missing))
+        # Optional fields missing from every radar file are not written.
+        return [field for field in fields if self._profiles.has_data(field)]
+
+    def _write_zarr(self, config, file_directory, fields, settings, append,
+                    region, melting_layer=False, time_step=None):
+        """ Writes, appends or fills a region of the Zarr store. """
+        store = os.path.join(file_directory,
+                             get_metadata(config)['datastream'] + '.zarr')
+        exists = os.path.exists(store)
+        if region is not None and not exists:
+            raise ValueError('A region can only be written to an existing '
+                             'Zarr store: ' + store)
+        rows = slice(None)
+        if exists and append and region is None and time_step is None:
+            # Skip the profiles already in the store.
+            with xarray.open_zarr(store) as stored:
+                last = stored['time'].values[-1]
+            rows = slice(int(np.searchsorted(
+                np.array(self.time, dtype='datetime64[ns]'), last,
+                side='right')), None)
+            if rows.start == len(self.time):
+                return
+
+        ds, encoding = self._dataset(config, fields, rows, settings,
+                                     format='zarr',
+                                     melting_layer=melting_layer,
+                                     time_step=time_step)
+        for name, var in ds.variables.items():
+            # Zarr has no way to turn off the fill value of a variable.
+            if var.attrs.get('_FillValue') is False:
+                del var.attrs['_FillValue']
+                encoding.setdefault(name, {})['_FillValue'] = None
+
+        if not exists or not (append or region is not None):
+            ds.to_zarr(store, mode='w', encoding=encoding)
+            return
+
+        # The store already holds the encoding and the variables without
+        # a time dimension, only the time variables are written.
+        for var in ds.variables.values():
+            var.attrs.pop('_FillValue', None)
+        ds = ds.drop_vars([name for name, var in ds.variables.items()
+                           if 'time' not in var.dims])
+        if 'scan_time' in ds:
+            ds = _rebase_scan_time(store, ds)
+        if region is not None:
+            ds.to_zarr(store, region={'time': region})
+        elif time_step is not None:
+            _merge_zarr_grid(store, ds)
+        else:
+            ds.to_zarr(store, append_dim='time')
+
+    def _append(self, config, file_directory, fields, settings,
+                melting_layer=False, time_step=None):
+        """
+        Appends each profile to its daily file. Only the new rows are
+        written to a file, so the cost of a new scan does not depend on the
+        number of scans already in the file. With time_step the profile
+        fills its row of the time grid of the file instead.
+
+        """
+        datastream = get_metadata(config)['datastream']
+        for i, time in enumerate(self.base_time):
+            filename = (file_directory + '/' + datastream + '.'
+                        + time.strftime('%Y%m%d') + '.000000.nc')
+            if not os.path.exists(filename):
+                ds, encoding = self._dataset(config, fields, slice(i, i + 1),
+                                             settings,
+                                             melting_layer=melting_layer,
+                                             time_step=time_step)
+                ds.to_netcdf(path=filename, encoding=encoding,
+                             unlimited_dims='time')
+                continue
+
+            with netCDF4.Dataset(filename, 'a') as dataset:
+                # Checked first so a scan that does not fit leaves no row.
+                nheight = len(dataset.dimensions['height'])
+                if nheight != len(self.height):
+                    raise ValueError(
+                        '%s has %d heights, the profiles have %d'
+                        % (filename, nheight, len(self.height)))
+                times = dataset.variables['time']
+                ntimes = len(times)
+                scan_time = np.datetime64(self.time[i]).astype(
+                    datetime.datetime)
+                offset = netCDF4.date2num(
+                    scan_time, times.units,
+                    getattr(times, 'calendar', 'standard'))
+                if time_step is not None:
+                    row = _grid_row(dataset, offset)
+                    if row is None:
+                        continue
+                    if not ma.is_masked(dataset.variables['scan_time'][row]):
+                        _clear_row(dataset, row)
+                    dataset.variables['scan_time'][row] = offset
+                else:
+                    if ntimes and offset <= times[ntimes - 1]:
+                        self.skipped.append(self.time[i])
+                        continue
+                    row = ntimes
+                    times[row] = offset
+                    dataset.variables['time_offset'][row] = offset
+                for field in fields:
+                    if field not in dataset.variables:
+                        continue
+                    profile = self._profiles.data(field)[i]
+                    if field in settings['packing']:
+                        profile = np.clip(profile, *settings['packing'][field])
+                    dataset.variables[field][row] = ma.masked_invalid(
+                        profile)
+                if melting_layer:
+                    for name, value in self._melting_layer(
+                            slice(i, i + 1)).items():
+                        if name in dataset.variables:
+                            dataset.variables[name][row] = (
+                                ma.masked_invalid(value))
+                for field in fields:
+                    if (_DEFAULT_FIELD_SCHEMA[field].get('data_valid_range')
+                            and field in dataset.variables):
+                        self._update_valid_range(
+                            dataset.variables[field],
+                            self._profiles.field(field)[i].astype(
+                                self._field_dtype(field)))
+
+    def _field_dtype(self, name):
+        """
+        Returns the dtype field name is written with, from the field schema
+        or else the dtype of its radar field.
+
+        """
+        return (_DEFAULT_FIELD_SCHEMA[name]['dtype']
+                or self._profiles.dtype(name))
+
+    @staticmethod
+    def _update_valid_range(ncvar, profile):
+        """ Widens the valid_min and valid_max of ncvar to cover profile. """
+        if profile.count() == 0:
+            return
+        # A file whose profiles were all masked has no valid range yet.
+        attrs = ncvar.ncattrs()
+        valid_min, valid_max = profile.min(), profile.max()
+        if 'valid_min' in attrs:
+            valid_min = min(ncvar.valid_min, valid_min)
+        if 'valid_max' in attrs:
+            valid_max = max(ncvar.valid_max, valid_max)
+        ncvar.valid_min = valid_min
+        ncvar.valid_max = valid_max
+
+    def _melting_layer(self, rows):
+        """ Returns the melting layer bottom and top of the profiles in rows. """
+        bottom, top = find_melting_layer(
+            *[self._profiles.data(field)[rows]
+              for field in _MELTING_LAYER_FIELDS], height=self.height)
+        return {'melting_layer_bottom': bottom.astype(np.float32),
+                'melting_layer_top': top.astype(np.float32)}
+
+    def _dataset(self, config, fields, rows=slice(None), settings=None,
+                 format='netcdf', melting_layer=False, time_step=None):
+        """
+        Creates the QVP Dataset and the netCDF or Zarr encoding for the
+        profiles in rows, on a time grid of time_step when given. settings
+        are the encoding settings from config.py.
+
+        """
+        if settings is None:
+            settings = get_encoding()
+        time = self.time[rows]
+        base_time = self.base_time[rows]
         attributes = get_metadata(config)
         
         ds = xarray.Dataset()
         ds['base_time'] = xarray.Variable('base_time', ma.array([netCDF4.date2num(
-            self.base_time[0], 'seconds since 1970-1-1 0:00:00 0:00')], dtype=np.int32),
+            base_time[0], 'seconds since 1970-1-1 0:00:00 0:00')], dtype=np.int32),
                                   attrs={'string': datetime.datetime.strftime(
-                                      self.base_time[0], '%d-%b-%Y,%H:%M:%S GMT'),
+                                      base_time[0], '%d-%b-%Y,%H:%M:%S GMT'),
                                          'units': 'seconds since 1970-1-1 0:00:00 0:00',
                                          'long_name': 'Base time in Epoch',
                                          'ancillary_variables': 'time_offset',
                                          'calendar': 'gregorian'})
         ds['time_offset'] = xarray.Variable('time',
-                                            ma.array(self.time, dtype='datetime64[ns]'),
+                                            ma.array(time, dtype='datetime64[ns]'),
                                              attrs={'long_name': 'Time offset from base_time',
                                                     'ancillary_variables': 'base_time'})
         ds['time'] = xarray.Variable(['time'],
-                                     ma.array(self.time, dtype='datetime64[ns]'),
+                                     ma.array(time, dtype='datetime64[ns]'),
                                      attrs={'long_name': 'Time offset from midnight', 
                                             'standard_name': 'time'})
         ds['height'] = xarray.Variable(['height'],
@@ -178,182 +533,27 @@ class qvp():
                                               'units': 'meters',
                                               'long_name': 'Height above ground',
                                               '_FillValue': False})
-        ds['total_power'] = xarray.Variable(['time', 'height'],
-                                            ma.array(self.total_power), 
-                                            attrs={'units': 'dBZ', 
-                                                   'long_name': 'Total power', 
-                                                   'standard_name': 'equivalent_reflectivity_factor',
-                                                   '_FillValue': -9999})
-        ds['reflectivity'] = xarray.Variable(['time', 'height'],
-                                             ma.array(self.reflectivity), 
-                                             attrs={'units': 'dBZ', 
-                                                    'long_name': 'Reflectivity',
-                                                    'standard_name': 'equivalent_reflectivity_factor',
-                                                    '_FillValue': -9999})
-        ds['velocity'] = xarray.Variable(['time', 'height'],
-                                          ma.array(self.velocity), 
-                                         attrs={'units': 'm/s', 
-                                                'long_name': 'Mean doppler velocity', 
-                                                'standard_name': 'radial_velocity_of_scatterers_away_from_instrument',
-                                                '_FillValue': -9999})
-        ds['spectrum_width'] = xarray.Variable(['time', 'height'],
-                                               ma.array(self.spectrum_width),
-                                               attrs={'units': 'm/s', 
-                                                      'long_name': 'Doppler spectrum width',
-                                                      '_FillValue': -9999})
-        ds['differential_reflectivity'] = xarray.Variable(['time', 'height'],
-                                                          ma.array(self.differential_reflectivity), 
-                                                          attrs={'units': 'dB', 
-                                                                 'long_name': 'Differential reflectivity',
-                                                                 '_FillValue': -9999})
-        ds['specific_differential_phase'] = xarray.Variable(['time', 'height'],
-                                                            ma.array(self.specific_differential_phase), 
-                                                            attrs={'units': 'degree/km', 
-                                                                   'long_name': 'Specific differential phase (KDP)',
-                                                                   '_FillValue': -9999})
-        ds['cross_correlation_ratio'] = xarray.Variable(['time', 'height'],
-                                                        ma.array(self.cross_correlation_ratio), 
-                                                        attrs={'units': '1', 
-                                                               'long_name': 'Cross correlation ratio (RHOHV)', 
-                                                               'valid_max': 1.0,
-                                                               'valid_min': 0.0,
-                                                               '_FillValue': -9999})
-        ds['normalized_coherent_power'] = xarray.Variable(['time', 'height'],
-                                                          ma.array(self.normalized_coherent_power),
-                                                          attrs={'units': '1', 
-                                                                 'long_name': 'Normalized coherent power',
-                                                                 'valid_max': 1.0,
-                                                                 'valid_min': 0.0, 
-                                                                 'comment': 'Also known as signal quality index (SQI)',
-                                                                 '_FillValue': -9999})
-        ds['differential_phase'] = xarray.Variable(['time', 'height'],
-                                                   ma.array(self.differential_phase),
-                                                   attrs={'units': 'degree', 
-                                                          'long_name': 'Differential phase (PhiDP)',
-                                                          'valid_max': 180.0,
-                                                          'valid_min': -180.0,
-                                                          '_FillValue': -9999})
-        ds['xsapr_clutter'] = xarray.Variable(['time', 'height'],
-                                              ma.array(self.xsapr_clutter), 
-                                              attrs={'units': '1', 
-                                                     'long_name': 'X-SAPR clutter', 
-                                                     'flag_values': '0,1',
-                                                     'flag_meanings': 'no_clutter, clutter',
-                                                     '_FillValue': -9999})
-        ds['signal_to_noise_ratio'] = xarray.Variable(['time', 'height'],
-                                                      ma.array(self.signal_to_noise_ratio),
-                                                      attrs={'units': 'dB', 
-                                                             'long_name': 'Signal to noise ratio',
-                                                             '_FillValue': -9999})
-        ds['velocity_texture'] = xarray.Variable(['time', 'height'],
-                                                 ma.array(self.velocity_texture),
-                                                 attrs={'units': 'm/s', 
-                                                        'long_name': 'Mean doppler velocity texture',
-                                                        'standard_name': 'radial_velocity_of_scatters_away_from_instrument',
-                                                        '_FillValue': -9999})
-        ds['gate_id'] = xarray.Variable(['time', 'height'],
-                                        ma.array(self.gate_id),
-                                        attrs={'units': '1', 
-                                               'long_name': 'Classification of dominant scatter',
-                                               'flag_values': '0,,1,,2, 3, 4, 5', 
-                                               'flag_meanings': 'multi_trip, rain, snow, no_scatter, melting, clutter',
-                                               'valid_min': 0, 'valid_max': 5,
-                                               '_FillValue': -9999})
-        
-        if self.radar_echo_classification:
-            ds['radar_echo_classification'] = xarray.Variable(['time', 'height'],
-                                                              ma.array(self.radar_echo_classification),
-                                                              attrs={'units': '1',
-                                                                     'long_name': 'Radar echo classification',
-                                                                     'flag_values': '0, 1, 2, 3, 4, 5, 6, 255, 65535',
-                                                                     'flag_meanings': ('no_data_available, non_meteorological_target,'
-                                                                                       + ' rain, wet_snow, snow, graupel, hail,'
-                                                                                       + ' area_not_scanned, area_not_scanned'),
-                                                                     '_FillValue': -9999})
-            
-        ds['corrected_velocity'] = xarray.Variable(['time', 'height'],
-                                                   ma.array(self.corrected_velocity),
-                                                   attrs={'units': 'm/s', 
-                                                          'long_name': 'Corrected mean doppler velocity',
-                                                          'standard_name': 'radial_velocity_of_scatterers_away_from_instrument',
-                                                          'valid_min': ma.array(self.corrected_velocity).min(), 
-                                                          'valid_max': ma.array(self.corrected_velocity).max(),
-                                                          '_FillValue': -9999})
-        ds['unfolded_differential_phase'] = xarray.Variable(['time', 'height'],
-                                                            ma.array(self.unfolded_differential_phase),
-                                                            attrs={'units': 'degree', 
-                                                                   'long_name': 'Unfolded differential phase (PhiDP)',
-                                                                   'valid_max': 180.0,
-                                                                   'valid_min': -180.0,
-                                                                   '_FillValue': -9999})
-        ds['corrected_differential_phase'] = xarray.Variable(['time', 'height'],
-                                                             ma.array(self.corrected_differential_phase),
-                                                             attrs={'units': 'degree', 
-                                                                    'long_name': 'Corrected differential phase (PhiDP)',
-                                                                    'valid_max': 400.0,
-                                                                    'valid_min': 0.0,
-                                                                    '_FillValue': -9999})
-        ds['filtered_corrected_differential_phase'] = xarray.Variable(['time', 'height'],
-                                                                      ma.array(self.filtered_corrected_differential_phase),
-                                                                      attrs={'units': 'degree', 
-                                                                             'long_name': 'Filtered differential phase (PhiDP)',
-                                                                             'valid_max': 400.0,
-                                                                             'valid_min': 0.0,
-                                                                             '_FillValue': -9999})
-        ds['corrected_specific_diff_phase'] = xarray.Variable(['time', 'height'],
-                                                              ma.array(self.corrected_specific_diff_phase),
-                                                              attrs={'units': 'degrees/km', 
-                                                                     'long_name': 'Corrected specific differential phase (KDP)',
-                                                                     '_FillValue': -9999})
-        ds['filtered_corrected_specific_diff_phase'] = xarray.Variable(['time', 'height'],
-                                                                       ma.array(self.filtered_corrected_specific_diff_phase),
-                                                                       attrs={'units': 'degree/km', 
-                                                                              'long_name': 'Filtered specific differential phase (KDP)',
-                                                                              '_FillValue': -9999})
-        ds['corrected_differential_reflectivity'] = xarray.Variable(['time', 'height'],
-                                                                    ma.array(self.corrected_differential_reflectivity),
-                                                                    attrs={'units': 'dB', 
-                                                                           'long_name': 'Corrected differential reflectivity',
-                                                                           '_FillValue': -9999})
-        ds['corrected_reflectivity'] = xarray.Variable(['time', 'height'],
-                                                       ma.array(self.corrected_reflectivity),
-                                                       attrs={'units': 'dBZ', 
-                                                              'long_name': 'Corrected reflectivity',
-                                                              'standard_name': 'equivalent_reflectivity_factor',
-                                                              '_FillValue': -9999})
-        ds['specific_attenuation'] = xarray.Variable(['time', 'height'],
-                                                     ma.array(self.specific_attenuation),
-                                                     attrs={'units': 'dB/km', 
-                                                            'long_name': 'Specific attenuation',
-                                                            'valid_min': 0.0,
-                                                            'valid_max': 1.0,
-                                                            '_FillValue': -9999})
-        ds['path_integrated_attenuation'] = xarray.Variable(['time', 'height'],
-                                                            ma.array(self.path_integrated_attenuation),
-                                                            attrs={'units': 'dB', 
-                                                                   'long_name': 'Path integrated attenuation',
-                                                                   '_FillValue': -9999})
-        ds['specific_differential_attenuation'] = xarray.Variable(['time', 'height'],
-                                                                  ma.array(self.specific_differential_attenuation),
-                                                                  attrs={'units': 'dB/km', 
-                                                                         'long_name': 'Specific differential attenuation',
-                                                                         '_FillValue': -9999})
-        ds['path_integrated_differential_attenuation'] = xarray.Variable(['time', 'height'],
-                                                                         ma.array(self.path_integrated_differential_attenuation),
-                                                                         attrs={'units': 'dB', 
-                                                                                'long_name': 'Path integrated differential attenuation',
-                                                                                '_FillValue': -9999})
-        ds['rain_rate_A'] = xarray.Variable(['time', 'height'],
-                                            ma.array(self.rain_rate_A),
-                                            attrs={'units': 'mm/hr', 
-                                                   'long_name': 'Rainfall rate',
-                                                   'standard_name': 'rainfall_rate', 
-                                                   'valid_min': 0.0,
-                                                   'valid_max': 400.0, 
-                                                   'comment': 'Rain rate calculated from specific_attenuation' + 
-                                                              ' R=51.3*specific_attenuation**0.81, note R=0.0' + 
-                                                              ' where norm coherent power < 0.4 or rhohv < 0.8',
-                                                   '_FillValue': -9999})
+        # The fields are views of the profile buffer, written in the order
+        # of the schema.
+        for name, schema in _DEFAULT_FIELD_SCHEMA.items():
+            if name not in fields:
+                continue
+            dtype = np.dtype(self._field_dtype(name))
+            data = self._profiles.data(name)[rows].astype(dtype, copy=False)
+            attrs = schema['attrs'].copy()
+            if schema.get('data_valid_range'):
+                # Left out when every value is masked, masked min and max
+                # would be written as 0.
+                profile = self._profiles.field(name)[rows]
+                if profile.count():
+                    attrs['valid_min'] = dtype.type(profile.min())
+                    attrs['valid_max'] = dtype.type(profile.max())
+            attrs['_FillValue'] = schema['_FillValue']
+            ds[name] = xarray.Variable(['time', 'height'], data, attrs=attrs)
+        if melting_layer:
+            for name, values in self._melting_layer(rows).items():
+                ds[name] = xarray.Variable(
+                    ['time'], values, attrs=_MELTING_LAYER_ATTRS[name].copy())
         ds['lon'] = xarray.Variable('longitude',
                                     ma.array(self.lon),
                                     attrs={'long_name': 'East longitude', 
@@ -378,17 +578,20 @@ class qvp():
                                            '_FillValue': False})
         
         encoding = {'time_offset': {'units': 'seconds since '
-                                    + str(ma.array(self.time[0], dtype='datetime64[ns]')),
+                                    + str(ma.array(time[0], dtype='datetime64[ns]')),
                                     'calendar': 'gregorian'},
                     'time': {'units': 'seconds since '
-                             + str(ma.array(self.time[0], dtype='datetime64[ns]')),
+                             + str(ma.array(time[0], dtype='datetime64[ns]')),
                              'calendar': 'gregorian'}}
+        for field in fields:
+            encoding[field] = _field_encoding(settings, field,
+                                              len(self.height), format)
+            if field in settings['packing']:
+                ds[field] = ds[field].copy(data=np.clip(
+                    ds[field].data, *settings['packing'][field]))
         
         ds.attrs = attributes
-        date = pd.to_datetime(
-            ma.array(self.time[0], dtype='datetime64[ns]')).strftime('%Y%m%d')
 
-        
         command_line = ''
         for item in sys.argv:
             command_line = command_line + '' + item
@@ -399,9 +602,429 @@ class qvp():
                                    '%Y-%m-%dT%H:%M:%S.%f')
                                + ' using PyART')
         
-        ds.squeeze(dim=None, drop=False).to_netcdf(path= file_directory + '/' + attributes['datastream'] 
-                                                   + '.' + str(date) + '.000000.nc', encoding=encoding,
-                                                   unlimited_dims='time')
-        
-                
-            
+        # Squeeze the single value location dimensions but keep time and
+        # height even when a single profile is written.
+        ds = ds.squeeze(dim=[dim for dim, size in ds.sizes.items()
+                             if size == 1 and dim not in ('time', 'height')])
+        if time_step is not None:
+            ds = _on_time_grid(ds, encoding, time_step)
+        return ds, encoding
+
+
+class _ProfileStore(object):
+    """
+    Profiles of several fields held in a single (field, time, height)
+    buffer. Masked values are stored as NaN so a field can be handed to
+    xarray as a view of the buffer. The buffer grows in chunks when more
+    profiles are appended than were reserved, and is widened to the dtype
+    of a field appended with a wider dtype so no field loses precision.
+
+    """
+    __slots__ = ('fields', '_index', '_buffer', '_filled', '_size',
+                 '_dtypes')
+
+    def __init__(self, fields, dtype=np.float32):
+        self.fields = list(fields)
+        self._index = dict((name, i) for i, name in enumerate(self.fields))
+        self._buffer = np.empty((len(self.fields), 0, 0), dtype=dtype)
+        self._filled = np.zeros(len(self.fields), dtype=bool)
+        self._size = 0
+        self._dtypes = {}
+
+    def __len__(self):
+        return self._size
+
+    def reserve(self, size, height=None):
+        """ Grows the buffer to hold at least size profiles. """
+        nfields, capacity, nheight = self._buffer.shape
+        if height is not None:
+            nheight = height
+        if size <= capacity and nheight == self._buffer.shape[2]:
+            return
+        buffer = np.full((nfields, max(size, capacity), nheight), np.nan,
+                         dtype=self._buffer.dtype)
+        if self._size:
+            buffer[:, :self._size] = self._buffer[:, :self._size]
+        self._buffer = buffer
+
+    def append(self, profiles, nheight=None):
+        """
+        Appends a dictionary of 1-D profiles keyed by field name. nheight
+        is the number of heights of the scan, which sizes the buffer even
+        when the scan has none of the fields. None will take it from the
+        profiles.
+
+        """
+        if nheight is None:
+            nheight = len(next(iter(profiles.values()))) if profiles else 0
+        dtype = np.result_type(self._buffer.dtype,
+                               *[profile.dtype for profile in profiles.values()])
+        if dtype != self._buffer.dtype:
+            self._buffer = self._buffer.astype(dtype)
+        if self._buffer.shape[2] == 0:
+            self.reserve(self._buffer.shape[1], height=nheight)
+        elif nheight and nheight != self._buffer.shape[2]:
+            raise ValueError('Profile has %d gates, expected %d'
+                             % (nheight, self._buffer.shape[2]))
+        if self._size == self._buffer.shape[1]:
+            self.reserve(max(2 * self._size, 64))
+
+        for name, profile in profiles.items():
+            i = self._index[name]
+            self._buffer[i, self._size] = ma.filled(
+                ma.asarray(profile, dtype=self._buffer.dtype), np.nan)
+            self._filled[i] = True
+            self._dtypes[name] = np.result_type(
+                self._dtypes.get(name, profile.dtype), profile.dtype)
+        self._size += 1
+
+    def dtype(self, name):
+        """ Returns the dtype of the profiles appended for field name. """
+        return self._dtypes.get(name, self._buffer.dtype)
+
+    def has_data(self, name):
+        """ True if a profile has been appended for field name. """
+        return bool(self._filled[self._index[name]])
+
+    def data(self, name):
+        """ Returns a (time, height) view of a field with NaN as fill. """
+        return self._buffer[self._index[name], :self._size]
+
+    def field(self, name):
+        """ Returns a (time, height) masked view of a field. """
+        data = self.data(name)
+        return ma.array(data, mask=np.isnan(data), copy=False)
+
+
+def _time_grid(time, time_step):
+    """
+    Returns the times of the whole days of time_step steps covering time,
+    the grid index of each time and the indices of the times kept, the
+    nearest time to each grid time.
+
+    """
+    step = pd.Timedelta(time_step).to_timedelta64().astype('timedelta64[ns]')
+    time = np.asarray(time, dtype='datetime64[ns]')
+    start = time.min().astype('datetime64[D]').astype('datetime64[ns]')
+    end = (time.max().astype('datetime64[D]')
+           + np.timedelta64(1, 'D')).astype('datetime64[ns]')
+    grid = np.arange(start, end, step)
+    # A scan just before midnight goes to the last grid time of its day.
+    index = np.minimum((time - start + step // 2) // step, len(grid) - 1)
+    distance = np.abs(time - grid[index])
+    order = np.lexsort((distance, index))
+    _, first = np.unique(index[order], return_index=True)
+    return grid, index, np.sort(order[first])
+
+
+def _day_rows(time):
+    """
+    Returns a slice of the rows of each day of time. The profiles of a day
+    must be next to each other, as they are for files in time order.
+
+    """
+    days = np.array(time, dtype='datetime64[ns]').astype('datetime64[D]')
+    bounds = np.flatnonzero(days[1:] != days[:-1]) + 1
+    if len(bounds) + 1 != len(np.unique(days)):
+        raise ValueError('The profiles of each day must be in one run to be '
+                         'written on a time grid, sort the files by time')
+    bounds = [0] + bounds.tolist() + [len(days)]
+    return [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _on_time_grid(ds, encoding, time_step):
+    """
+    Places the profiles of a QVP Dataset on a time grid. Grid times without
+    a profile are NaN and scan_time holds the scan time of each grid time
+    in seconds since the start of the grid.
+
+    """
+    time = ds['time'].values
+    grid, index, kept = _time_grid(time, time_step)
+    units = 'seconds since ' + str(grid[0])
+    scan_time = (time - grid[0]) / np.timedelta64(1, 's')
+    ds = ds.isel(time=kept).assign_coords(time=grid[index[kept]])
+    ds['scan_time'] = xarray.Variable(
+        'time', scan_time[kept], attrs={'long_name': 'Start time of the scan',
+                                        'units': units,
+                                        'calendar': 'gregorian'})
+    time_attrs = ds['time'].attrs
+    ds = ds.reindex(time=grid)
+    ds['time'].attrs = time_attrs
+    ds['time_offset'] = xarray.Variable('time', grid,
+                                        attrs=ds['time_offset'].attrs)
+    ds.attrs['time_step'] = '%g seconds' % (
+        pd.Timedelta(time_step).total_seconds())
+    for name in ('time', 'time_offset'):
+        encoding[name]['units'] = units
+    return ds
+
+
+def _grid_row(dataset, offset):
+    """
+    Returns the row of a netCDF time grid nearest to the scan at offset,
+    None when the row already holds a scan as near or nearer to its grid
+    time, as write keeps the nearest scan of each grid time.
+
+    """
+    if 'scan_time' not in dataset.variables:
+        raise ValueError(dataset.filepath() + ' was not written on a time '
+                         'grid, it can not be appended with a time_step')
+    times = dataset.variables['time'][:]
+    row = int(np.abs(times - offset).argmin())
+    scan_time = dataset.variables['scan_time'][row]
+    if (not ma.is_masked(scan_time)
+            and abs(scan_time - times[row]) <= abs(offset - times[row])):
+        return None
+    return row
+
+
+def _clear_row(dataset, row):
+    """
+    Masks the profiles of a row of a netCDF time grid, so a scan replacing
+    the one in the row leaves none of the fields it does not write.
+
+    """
+    for name, variable in dataset.variables.items():
+        if (variable.dimensions[:1] == ('time',)
+                and name not in ('time', 'time_offset', 'scan_time')):
+            variable[row] = ma.masked
+
+
+def _rebase_scan_time(store, ds):
+    """
+    Returns ds with scan_time in the units of the scan_time of the Zarr
+    store. The store keeps the units of its first write, which start on
+    the first day written.
+
+    """
+    with xarray.open_zarr(store, decode_times=False) as stored:
+        if 'scan_time' not in stored:
+            return ds
+        units = stored['scan_time'].attrs['units']
+    shift = (_units_start(ds['scan_time'].attrs['units'])
+             - _units_start(units)) / np.timedelta64(1, 's')
+    ds['scan_time'] = (ds['scan_time'] + shift).assign_attrs(
+        ds['scan_time'].attrs, units=units)
+    return ds
+
+
+def _units_start(units):
+    """ Returns the start of 'seconds since' units as a datetime64. """
+    return np.datetime64(units.split(' since ', 1)[1], 'ns')
+
+
+def _merge_zarr_grid(store, ds):
+    """
+    Writes the time grid of ds to a Zarr store. Days already in the store
+    are merged into their region, keeping the stored scans where ds has
+    none or a farther one from the grid time, and new days are appended.
+
+    """
+    with xarray.open_zarr(store) as stored:
+        stored_time = stored['time'].values
+    # The stored scan times are merged as numbers, like the new ones.
+    with xarray.open_zarr(store, decode_times=False) as stored:
+        index = np.searchsorted(stored_time, ds['time'].values)
+        index = np.minimum(index, len(stored_time) - 1)
+        inside = stored_time[index] == ds['time'].values
+        scans = np.flatnonzero(inside & ds['scan_time'].notnull().values)
+        if len(scans):
+            rows = slice(scans[0], scans[-1] + 1)
+            region = slice(int(index[scans[0]]), int(index[scans[-1]]) + 1)
+            part = ds.isel(time=rows)
+            start = _units_start(stored['scan_time'].attrs['units'])
+            grid = (part['time'].values - start) / np.timedelta64(1, 's')
+            new = part['scan_time'].values
+            old = stored['scan_time'].isel(time=region).values
+            with np.errstate(invalid='ignore'):
+                has_scan = xarray.DataArray(
+                    np.isfinite(new)
+                    & ~(np.abs(old - grid) <= np.abs(new - grid)), dims='time')
+            for name, var in part.data_vars.items():
+                if name != 'time_offset':
+                    old = stored[name].isel(time=region).values
+                    part[name] = var.where(has_scan, old)
+            part.to_zarr(store, region={'time': region})
+    if not inside.all():
+        ds.isel(time=~inside).to_zarr(store, append_dim='time')
+
+
+def _field_encoding(settings, field, nheight, format='netcdf'):
+    """
+    Returns the netCDF or Zarr encoding of a (time, height) field from the
+    encoding settings in config.py.
+
+    """
+    if format == 'zarr':
+        import numcodecs
+        encoding = {'compressor': None}
+        if settings['zlib']:
+            shuffle = (numcodecs.Blosc.SHUFFLE if settings['shuffle']
+                       else numcodecs.Blosc.NOSHUFFLE)
+            encoding['compressor'] = numcodecs.Blosc(
+                cname='zlib', clevel=settings['complevel'], shuffle=shuffle)
+        if settings['time_chunk']:
+            encoding['chunks'] = (settings['time_chunk'], nheight)
+    else:
+        encoding = {'zlib': settings['zlib'], 'shuffle': settings['shuffle']}
+        if settings['zlib']:
+            encoding['complevel'] = settings['complevel']
+        if settings['time_chunk']:
+            encoding['chunksizes'] = (settings['time_chunk'], nheight)
+    if field in settings['packing']:
+        vmin, vmax = settings['packing'][field]
+        # Packed values run from 0 to 32766 so they never equal the
+        # -9999 fill value.
+        encoding.update({'dtype': 'int16', 'add_offset': vmin,
+                         'scale_factor': (vmax - vmin) / 32766.0})
+    return encoding
+
+
+def quasi_vertical_profile(radar, fields=None, desired_angle=None,
+                           gatefilter=None):
+    """
+    Quasi Vertical Profile of several radar fields at once.
+
+    The sweep closest to desired_angle of every field is stacked into one
+    (field, ray, gate) masked array and averaged over azimuth in a single
+    pass. The result matches pyart.retrieve.quasi_vertical_profile.
+
+    Parameters
+    ----------
+    radar : Radar
+        Radar object used.
+    fields : list
+        List of radar fields to profile. None will profile all fields.
+    desired_angle : float
+        Radar tilt angle used for indexing the radar field(s).
+        None will default to 20.0
+
+    Optional Parameter
+    ------------------
+    gatefilter : GateFilter
+        A GateFilter indicating radar gates that should be excluded
+        from the qvp calculation.
+
+    Returns
+    -------
+    qvp : dict
+        Profile of each field along with the range, time and height of
+        the gates.
+
+    """
+    if desired_angle is None:
+        desired_angle = 20.0
+    if fields is None:
+        fields = list(radar.fields)
+    index = abs(radar.fixed_angle['data'] - desired_angle).argmin()
+    rays = radar.get_slice(index)
+
+    qvp = {}
+    if fields:
+        data = ma.stack([radar.fields[field]['data'][rays]
+                         for field in fields])
+        if gatefilter is not None:
+            data = ma.masked_where(np.broadcast_to(
+                gatefilter.gate_excluded[rays], data.shape), data)
+        # Fields stacked with a wider dtype keep the dtype of their own
+        # radar field, as pyart.retrieve.quasi_vertical_profile does.
+        qvp.update((field, profile.astype(
+            radar.fields[field]['data'].dtype, copy=False))
+            for field, profile in zip(fields, data.mean(axis=1)))
+
+    qvp.update({'range': radar.range['data'], 'time': radar.time,
+                'height': _beam_height(radar.range['data'],
+                                       radar.fixed_angle['data'][index])})
+    return qvp
+
+
+# Beam heights keyed by the sweep geometry, the same handful of range
+# and angle combinations are seen in every file of a day.
+_BEAM_HEIGHTS = {}
+
+
+def _beam_height(_range, fixed_angle):
+    """ Returns the beam height above the radar of each gate. """
+    key = (float(fixed_angle), _range.dtype.str, _range.tobytes())
+    if key not in _BEAM_HEIGHTS:
+        if len(_BEAM_HEIGHTS) > 16:
+            _BEAM_HEIGHTS.clear()
+        _, _, z = pyart.core.antenna_to_cartesian(
+            _range / 1000.0, 0.0, fixed_angle)
+        _BEAM_HEIGHTS[key] = z
+    return _BEAM_HEIGHTS[key]
+
+
+def _profile_file(file, desired_angle, gatefilter, fields, sweep_only,
+                  timed=False):
+    """
+    Reads a radar file and returns the azimuthally averaged profiles along
+    with the time and location of the scan. A file that can not be read or
+    profiled returns the file and the reason under 'error' instead.
+
+    Only the 1-D profiles are returned so that the result is cheap to send
+    back from a worker process. Only the radar fields needed for fields
+    are read from the file, and with sweep_only only the rays of the QVP
+    sweep. Fields missing from the file have no profile. With timed the
+    records of the read and profile stages are returned under 'stats'.
+
+    """
+    stats = QVPStats() if timed else None
+    try:
+        result = _read_profiles(file, desired_angle, gatefilter, fields,
+                                sweep_only, stats)
+    except Exception as error:
+        # Truncated or unusual files are reported, not raised, so the
+        # other files of the day are kept.
+        result = {'file': file,
+                  'error': '%s: %s' % (type(error).__name__, error)}
+    if stats is not None:
+        result['stats'] = stats.records
+    return result
+
+
+def _read_profiles(file, desired_angle, gatefilter, fields, sweep_only,
+                   stats):
+    """ Returns the profiles of a radar file, see _profile_file. """
+    field_names = [(name, radar_field) for name, radar_field in _FIELD_NAMES
+                   if name in fields]
+    radar_fields = [radar_field for _, radar_field in field_names]
+
+    radar = None
+    with _stage(stats, 'read', file):
+        # A gatefilter is defined on the whole volume, so the volume is
+        # read when one is given.
+        if sweep_only and gatefilter is None:
+            try:
+                radar, start = _read_qvp_sweep(file, desired_angle,
+                                               radar_fields)
+            except (OSError, KeyError):
+                # Not a CF/Radial file, let Py-ART work out the format.
+                radar = None
+        if radar is None:
+            radar = pyart.io.read(file, include_fields=radar_fields)
+            start = radar.time['data'][0]
+
+    time = netCDF4.num2date(start, radar.time['units'],
+                            only_use_cftime_datetimes=False,
+                            only_use_python_datetimes=True)
+    field_names = [(name, radar_field) for name, radar_field in field_names
+                   if radar_field in radar.fields]
+    with _stage(stats, 'profile', file):
+        qvp = quasi_vertical_profile(
+            radar, fields=[radar_field for _, radar_field in field_names],
+            desired_angle=desired_angle, gatefilter=gatefilter)
+
+    profiles = {}
+    for name, radar_field in field_names:
+        profiles[name] = qvp[radar_field]
+
+    return {'time': datetime.datetime.strftime(time, '%Y-%m-%dT%H:%M:%S'),
+            'base_time': time,
+            'range': qvp['range'],
+            'height': qvp['height'],
+            'alt': radar.altitude['data'],
+            'lon': radar.longitude['data'],
+            'lat': radar.latitude['data'],
+            'profiles': profiles}
@@ -1,22 +1,116 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib
+import matplotlib.dates
+from matplotlib.figure import Figure
 import datetime
 import xarray
 import datetime
 import os
 
 from .config import get_plot_values, get_field_parameters
+from .qvp_stats import _stage
 
-def quicklooks_1panel(file, field, config, image_directory=None, **kwargs):
+# Height range of the quicklooks in km.
+_YLIM = (0, 12)
+
+# Block of time columns the quicklook meshes grow by.
+_MESH_COLUMNS = 64
+
+def open_qvp(file, date=None):
     """
-    Quciklooks, produces a one panel image using a QVP object NetCDF file.
+    Opens a QVP NetCDF file or Zarr store lazily.
     
     Parameters
     ----------
     file : str
-        File path to the QVP NetCDF file
+        File path to the QVP NetCDF file or Zarr store directory.
+    
+    Optional Parameters
+    -------------------
+    date : str or datetime
+        Day to select from the QVP, e.g. '20171005'. None will return
+        every time.
+    
+    """
+    return _select_date(_open(file), date)
+
+def _open(file):
+    if os.path.isdir(file):
+        return xarray.open_zarr(file)
+    return xarray.open_dataset(file)
+
+def _select_date(qvp, date):
+    if date is None:
+        return qvp
+    day = pd.to_datetime(date).normalize()
+    return qvp.sel(time=slice(day, day + pd.Timedelta(days=1)
+                              - pd.Timedelta(1, 'ns')))
+
+def _image_name(save_name, date, tag=None):
+    """ Returns the quicklook image name of a day, date is YYYYMMDD. """
+    if tag is not None:
+        save_name = save_name + '.' + tag
+    return save_name + '.' + date + '.000000.png'
+
+def _panel_groups(panels, fields):
+    """
+    Returns the fields of each image and the tag added to its name. One
+    panel images get a field each, tagged with the field when there are
+    several fields.
+
+    """
+    if panels == 1:
+        return [([field], field if len(fields) > 1 else None)
+                for field in fields]
+    return [(list(fields), None)]
+
+def _qvp_days(file):
+    """
+    Returns the days of the times in a QVP file, Dataset or qvp object as
+    YYYYMMDD.
+
+    """
+    if isinstance(file, str):
+        with _open(file) as qvp:
+            time = qvp.time.data
+    elif isinstance(file, xarray.Dataset):
+        time = file.time.data
+    else:
+        time = np.array(file.time, dtype='datetime64[ns]')
+    days = np.unique(time.astype('datetime64[D]'))
+    return [pd.to_datetime(day).strftime('%Y%m%d') for day in days]
+
+def _read_quicklook(file, fields, date=None, ylim=_YLIM):
+    """
+    Reads only fields, the day and the heights within ylim (km) of a QVP
+    into memory. The file is closed before returning. A Dataset or qvp
+    object is used as it is, without a write and read of the file.
+    
+    """
+    if isinstance(file, str):
+        with _open(file) as qvp:
+            return _read_quicklook(qvp, fields, date, ylim)
+    if not isinstance(file, xarray.Dataset):
+        # A qvp object, whose profiles are already in memory.
+        file = file.to_dataset(fields=fields)
+    qvp = _select_date(file[list(fields)], date)
+    # Keep one height either side of ylim so the mesh fills the plot.
+    height = qvp.height.values
+    start = max(np.searchsorted(height, ylim[0]*1000) - 1, 0)
+    stop = np.searchsorted(height, ylim[1]*1000, side='right') + 1
+    return qvp.isel(height=slice(start, stop)).load()
+
+def quicklooks_1panel(file, field, config, image_directory=None, date=None,
+                      time_step=None, stats=None, **kwargs):
+    """
+    Quciklooks, produces a one panel image using a QVP object NetCDF file.
+    
+    Parameters
+    ----------
+    file : str, Dataset or qvp
+        File path to the QVP NetCDF file or Zarr store, or the QVP itself
+        to plot it without reading a file.
     field : str
         String of the radar field
     config : str
@@ -28,51 +122,36 @@ def quicklooks_1panel(file, field, config, image_directory=None, **kwargs):
     image_directory : str
         File path to the image folder to save the QVP image. If no
         image file path is given, image path deafults to users home directory.
+    date : str or datetime
+        Day to plot from a QVP holding several days. None will plot the
+        day of the first time.
+    time_step : str or timedelta
+        Draws the profiles averaged onto a regular time grid of this step,
+        e.g. '5min', with imshow, which is much faster than pcolormesh for
+        long days. None will draw every profile with pcolormesh.
+    stats : QVPStats
+        Records the wall time, bytes read and peak memory of the read, draw
+        and save of the image. None records nothing.
     
     """
-    if image_directory is None:
-        image_directory = os.path.expanduser('~')
-        
-    plot_values = get_plot_values(config)
-    fld_params = get_field_parameters()
-    qvp = xarray.open_dataset(file)
-    
-    time = qvp.time.data
-    z = qvp.height.data/1000
-    fld = qvp[field].data
-    date = pd.to_datetime(time[0]).strftime('%Y%m%d')
-    ts = datetime.datetime.strptime(date, '%Y%m%d')
-    
-    fig = plt.figure(figsize=[25, 12])
-    font = {'family': 'normal', 'size': 20}
-    matplotlib.rc('font', **font)
-    matplotlib.rcParams.update({'font.size': 20})
-    matplotlib.rcParams.update({'axes.titlesize': 20})
-    
-    img = plt.pcolormesh(time, z, fld.transpose(), cmap=plot_values['cmap'],
-                         vmin=fld_params[field]['vmin'],
-                         vmax=fld_params[field]['vmax'])
-    plt.xlim(ts, (ts + datetime.timedelta(days=1)))
-    plt.xticks(rotation=45)
-    plt.ylim(0,12)
-    plt.ylabel('Height (km)')
-    plt.xlabel('Time (UTC)')
-    plt.title(plot_values['title'] + ' ' + fld_params[field]['fld_title'] + ' '
-              + plot_values['tilt'] + ' ' + str(ts) 
-              + '-' + str(ts + datetime.timedelta(days=1)))
-    cb = plt.colorbar(img, cmap=plot_values['cmap'])
-    cb.set_label(fld_params[field]['clb_title'])
-    plt.savefig(image_directory + '/' + plot_values['save_name']
-                + '.' + str(date) + '.000000.png', bbox_inches='tight')
-
-def quicklooks_4panel(file, fields, config, image_directory=None):
+    renderer = QuicklookRenderer(config, panels=1,
+                                 image_directory=image_directory,
+                                 time_step=time_step, stats=stats)
+    try:
+        renderer.render(file, [field], date=date)
+    finally:
+        renderer.close()
+
+def quicklooks_4panel(file, fields, config, image_directory=None, date=None,
+                      time_step=None, stats=None):
     """
     Quciklooks, produces a four panel image using a QVP object NetCDF file.
     
     Parameters
     ----------
-    file : str
-        File path to the QVP NetCDF file
+    file : str, Dataset or qvp
+        File path to the QVP NetCDF file or Zarr store, or the QVP itself
+        to plot it without reading a file.
     fields : tuple/list
         Tuple or list of strings of radar fields
     config : str
@@ -84,85 +163,372 @@ def quicklooks_4panel(file, fields, config, image_directory=None):
     image_directory : str
         File path to the image folder to save the QVP image. If no
         image file path is given, image path deafults to users home directory.
+    date : str or datetime
+        Day to plot from a QVP holding several days. None will plot the
+        day of the first time.
+    time_step : str or timedelta
+        Draws the profiles averaged onto a regular time grid of this step,
+        e.g. '5min', with imshow, which is much faster than pcolormesh for
+        long days. None will draw every profile with pcolormesh.
+    stats : QVPStats
+        Records the wall time, bytes read and peak memory of the read, draw
+        and save of the image. None records nothing.
     
     """
-    if image_directory is None:
-        image_directory = os.path.expanduser('~')
-    plot_values = get_plot_values(config)
-    fld_params = get_field_parameters()
-    qvp = xarray.open_dataset(file)
-    cmap = plot_values['cmap']
-    
-    time = qvp.time.data
-    z = qvp.height.data/1000
-    date = pd.to_datetime(time[0]).strftime('%Y%m%d')
-    ts = datetime.datetime.strptime(date, '%Y%m%d')
-    fld1 = qvp[fields[0]].data
-    fld2 = qvp[fields[1]].data
-    fld3 = qvp[fields[2]].data
-    fld4 = qvp[fields[3]].data
-    
-    fig, ax = plt.subplots(nrows=4, ncols=1, sharex=True,
-                           sharey=True, figsize=(50,37))
-    font = {'family': 'normal',
-            'size': 30}
-    matplotlib.rc('font', **font)
-    matplotlib.rcParams.update({'font.size': 30})
-    matplotlib.rcParams.update({'axes.titlesize': 30})
-    
-    fig.suptitle(x=0.435, y=0.93, t=plot_values['title'] + ' '
-                 + plot_values['tilt'] + ' ' + str(ts)
-                 + '-' + str(ts + datetime.timedelta(days=1)),
-                 fontsize=40)
-    fig.text(0.435, 0.065, 'Time (UTC)', ha='center', fontsize=30)
-    fig.text(0.09, 0.5, 'Height (km)', va='center',
-             rotation='vertical', fontsize=30)
-    
-    ax = plt.subplot(411)
-    img = plt.pcolormesh(time, z, fld1.transpose(), cmap=cmap,
-                         vmin=fld_params[fields[0]]['vmin'],
-                         vmax=fld_params[fields[0]]['vmax'])
-    plt.ylim(0,12)
-    plt.xlim(ts, (ts + datetime.timedelta(days=1)))
-    plt.xticks([])
-    ax.set_title(fld_params[fields[0]]['fld_title'])
-    cb = plt.colorbar(img, cmap=cmap)
-    cb.set_label(fld_params[fields[0]]['clb_title'])
-    
-    ax = plt.subplot(412)
-    img = plt.pcolormesh(time, z, fld2.transpose(), cmap=cmap,
-                         vmin=fld_params[fields[1]]['vmin'],
-                         vmax=fld_params[fields[1]]['vmax'])
-    plt.ylim(0,12)
-    plt.xlim(ts, (ts + datetime.timedelta(days=1)))
-    plt.xticks([])
-    ax.set_title(fld_params[fields[1]]['fld_title'])
-    cb = plt.colorbar(img, cmap=cmap)
-    cb.set_label(fld_params[fields[1]]['clb_title'])
-    
-    ax = plt.subplot(413)
-    img = plt.pcolormesh(time, z, fld3.transpose(), cmap=cmap,
-                         vmin=fld_params[fields[2]]['vmin'],
-                         vmax=fld_params[fields[2]]['vmax'])
-    plt.ylim(0,12)
-    plt.xlim(ts, (ts + datetime.timedelta(days=1)))
-    plt.xticks([])
-    ax.set_title(fld_params[fields[2]]['fld_title'])
-    cb = plt.colorbar(img, cmap=cmap)
-    cb.set_label(fld_params[fields[2]]['clb_title'])
-    
-    ax = plt.subplot(414)
-    img = plt.pcolormesh(time, z, fld4.transpose(), cmap=cmap,
-                         vmin=fld_params[fields[3]]['vmin'],
-                         vmax=fld_params[fields[3]]['vmax'])
-    plt.ylim(0,12)
-    plt.xlim(ts, (ts + datetime.timedelta(days=1)))
-    plt.xticks(rotation=45)
-    ax.set_title(fld_params[fields[3]]['fld_title'])
-    cb = plt.colorbar(img, cmap=cmap)
-    cb.set_label(fld_params[fields[3]]['clb_title'])
-    
-    plt.savefig(image_directory + '/' + plot_values['save_name']
-                + '.' + str(date) + '.000000.png', bbox_inches='tight')
-    
-    
\ No newline at end of file
+    renderer = QuicklookRenderer(config, panels=4,
+                                 image_directory=image_directory,
+                                 time_step=time_step, stats=stats)
+    try:
+        renderer.render(file, fields[:4], date=date)
+    finally:
+        renderer.close()
+
+class QuicklookRenderer(object):
+    """
+    Renders quicklooks of many QVP files with a single figure.
+
+    The figure, axes, colorbars and labels are created once. Each render
+    only updates the field data, titles and color limits. The mesh of each
+    panel holds a fixed number of time columns whose coordinates and data
+    are replaced for every new day, the columns past the last profile are
+    masked. It is only recreated when a day has more profiles than columns
+    or other heights. The figure is not registered with pyplot, so nothing is left
+    open once the renderer is closed.
+
+    Parameters
+    ----------
+    config : str
+        A string of the radar name found from config.py that contains values
+        for plotting, specific to that radar.
+
+    Optional Parameters
+    -------------------
+    panels : int
+        Number of fields plotted in each image, one above the other.
+    image_directory : str
+        File path to the image folder to save the QVP images. If no
+        image file path is given, image path deafults to users home directory.
+    time_step : str or timedelta
+        Draws the profiles averaged onto a regular time grid of this step,
+        e.g. '5min', with imshow. None will draw every profile with
+        pcolormesh.
+    max_gap : str or timedelta
+        Longest time from a grid step to a profile for an empty step to be
+        filled with that profile. None will default to the median time
+        between profiles.
+    stats : QVPStats
+        Records the wall time, bytes read and peak memory of the read, draw
+        and save of each image. None records nothing.
+
+    """
+
+    def __init__(self, config, panels=1, image_directory=None,
+                 time_step=None, max_gap=None, stats=None):
+        if image_directory is None:
+            image_directory = os.path.expanduser('~')
+        self.config = config
+        self.panels = panels
+        self.image_directory = image_directory
+        self.time_step = time_step
+        self.max_gap = max_gap
+        self.stats = stats
+        self._plot_values = get_plot_values(config)
+        self._fld_params = get_field_parameters()
+        if panels == 1:
+            self._rc = {'font.size': 20, 'axes.titlesize': 20}
+        else:
+            self._rc = {'font.size': 30, 'axes.titlesize': 30}
+
+        with matplotlib.rc_context(self._rc):
+            if panels == 1:
+                self.fig = Figure(figsize=[25, 12])
+                axes = [self.fig.add_subplot(111)]
+                axes[0].set_xlabel('Time (UTC)')
+                axes[0].set_ylabel('Height (km)')
+            else:
+                self.fig = Figure(figsize=(50, 37 * panels / 4))
+                axes = list(self.fig.subplots(nrows=panels, ncols=1,
+                                              sharex=True, sharey=True))
+                self._suptitle = self.fig.suptitle('', x=0.435, y=0.93,
+                                                   fontsize=40)
+                self.fig.text(0.435, 0.065, 'Time (UTC)', ha='center',
+                              fontsize=30)
+                self.fig.text(0.09, 0.5, 'Height (km)', va='center',
+                              rotation='vertical', fontsize=30)
+                for ax in axes[:-1]:
+                    ax.tick_params(labelbottom=False)
+            axes[-1].tick_params(axis='x', labelrotation=45)
+            for ax in axes:
+                ax.set_ylim(*_YLIM)
+                if time_step is not None:
+                    ax.xaxis_date()
+
+            # Colorbars are made once from placeholder meshes and are
+            # pointed at the new mesh whenever one is created.
+            self.axes = axes
+            self._meshes = []
+            self._colorbars = []
+            for ax in axes:
+                mesh = ax.pcolormesh(np.zeros((1, 1)),
+                                     cmap=self._plot_values['cmap'])
+                self._meshes.append(mesh)
+                self._colorbars.append(self.fig.colorbar(mesh, ax=ax))
+        self._coords = [None] * panels
+
+    def render(self, file, fields, date=None, tag=None):
+        """
+        Renders the fields of a QVP file and saves the image.
+
+        Parameters
+        ----------
+        file : str, Dataset or qvp
+            File path to the QVP NetCDF file or Zarr store, or the QVP
+            itself.
+        fields : tuple/list
+            Radar fields to plot, one for each panel.
+
+        Optional Parameters
+        -------------------
+        date : str or datetime
+            Day to plot from a QVP holding several days. None will plot the
+            day of the first time.
+        tag : str
+            Added to the image name before the date.
+
+        Returns
+        -------
+        image : str
+            File path of the saved image.
+
+        """
+        if len(fields) != self.panels:
+            raise ValueError('Expected %d fields, got %d'
+                             % (self.panels, len(fields)))
+        name = file if isinstance(file, str) else None
+        with _stage(self.stats, 'read_quicklook', name):
+            qvp = _read_quicklook(file, fields, date)
+        time = qvp.time.data
+        if not len(time):
+            raise ValueError('No profiles on %s' % date)
+        z = qvp.height.data/1000
+        date = pd.to_datetime(time[0]).strftime('%Y%m%d')
+        ts = datetime.datetime.strptime(date, '%Y%m%d')
+        period = (' ' + str(ts) + '-' + str(ts + datetime.timedelta(days=1)))
+
+        grid = None
+        if self.time_step is not None:
+            grid = _TimeHeightGrid(time, z, ts, self.time_step, self.max_gap)
+
+        with matplotlib.rc_context(self._rc), \
+                _stage(self.stats, 'draw', name):
+            for i, field in enumerate(fields):
+                if grid is None:
+                    self._update_panel(i, time, z, qvp[field].data,
+                                       self._fld_params[field])
+                else:
+                    self._update_image(i, grid, qvp[field].data,
+                                       self._fld_params[field])
+                self.axes[i].set_xlim(ts, ts + datetime.timedelta(days=1))
+            if self.panels == 1:
+                self.axes[0].set_title(
+                    self._plot_values['title'] + ' '
+                    + self._fld_params[fields[0]]['fld_title'] + ' '
+                    + self._plot_values['tilt'] + period)
+            else:
+                self._suptitle.set_text(self._plot_values['title'] + ' '
+                                        + self._plot_values['tilt'] + period)
+
+        image = os.path.join(self.image_directory, _image_name(
+            self._plot_values['save_name'], date, tag))
+        with matplotlib.rc_context(self._rc), \
+                _stage(self.stats, 'savefig', image):
+            self.fig.savefig(image, bbox_inches='tight')
+        return image
+
+    def render_many(self, files, fields):
+        """
+        Renders a quicklook of every day of every QVP file.
+
+        With a one panel renderer each field gets its own image, named with
+        the field when there is more than one field. Otherwise fields are
+        the fields of the panels.
+
+        Parameters
+        ----------
+        files : list
+            File paths to the QVP NetCDF files or Zarr stores, Datasets or
+            qvp objects.
+        fields : tuple/list
+            Radar fields to plot.
+
+        Returns
+        -------
+        images : list
+            File paths of the saved images.
+
+        """
+        groups = _panel_groups(self.panels, fields)
+        images = []
+        for file in files:
+            for day in _qvp_days(file):
+                for group, tag in groups:
+                    images.append(self.render(file, group, date=day,
+                                              tag=tag))
+        return images
+
+    def close(self):
+        """ Releases the figure. """
+        self.fig.clear()
+        self._meshes = []
+        self._colorbars = []
+
+    def _update_panel(self, i, time, z, data, params):
+        """ Updates the mesh, color limits and titles of a panel. """
+        ax = self.axes[i]
+        mesh = self._meshes[i]
+        ntimes = len(time)
+        coords = self._coords[i]
+        if coords is None or coords[0] != len(z) or coords[1] < ntimes:
+            # Columns are added in blocks so days with a few more profiles
+            # still reuse the mesh.
+            ncolumns = -(-ntimes // _MESH_COLUMNS) * _MESH_COLUMNS
+            mesh.remove()
+            mesh = ax.pcolormesh(np.arange(ncolumns + 1.0),
+                                 np.arange(len(z) + 1.0),
+                                 np.zeros((len(z), ncolumns)),
+                                 cmap=self._plot_values['cmap'])
+            self._meshes[i] = mesh
+            self._coords[i] = (len(z), ncolumns)
+        ncolumns = self._coords[i][1]
+
+        x = _mesh_edges(matplotlib.dates.date2num(time))
+        # Columns past the last profile have no width at its right edge.
+        x = np.concatenate([x, np.full(ncolumns - ntimes, x[-1])])
+        coordinates = mesh.get_coordinates()
+        coordinates[..., 0] = x
+        coordinates[..., 1] = _mesh_edges(np.asarray(z, dtype=float))[:, None]
+        mesh.set_paths()
+        values = np.full((len(z), ncolumns), np.nan)
+        values[:, :ntimes] = np.transpose(data)
+        mesh.set_array(np.ma.masked_invalid(values))
+        self._update_labels(i, mesh, params)
+
+    def _update_image(self, i, grid, data, params):
+        """ Updates the image, color limits and titles of a panel. """
+        ax = self.axes[i]
+        image = self._meshes[i]
+        if self._coords[i] != 'image':
+            image.remove()
+            image = ax.imshow(grid.regrid(data).transpose(), origin='lower',
+                              aspect='auto', interpolation='nearest',
+                              extent=grid.extent,
+                              cmap=self._plot_values['cmap'])
+            self._meshes[i] = image
+            self._coords[i] = 'image'
+        else:
+            image.set_data(grid.regrid(data).transpose())
+            image.set_extent(grid.extent)
+        ax.set_ylim(*_YLIM)
+        self._update_labels(i, image, params)
+
+    def _update_labels(self, i, mappable, params):
+        """ Updates the color limits, colorbar and title of a panel. """
+        mappable.norm.vmin = params['vmin']
+        mappable.norm.vmax = params['vmax']
+        mappable.autoscale_None()
+        self._colorbars[i].update_normal(mappable)
+        self.axes[i].set_title(params['fld_title'])
+        self._colorbars[i].set_label(params['clb_title'])
+
+
+def _mesh_edges(centres):
+    """
+    Returns the cell edges half way between centres, as pcolormesh places
+    cells around their centres.
+
+    """
+    if len(centres) < 2:
+        return np.repeat(centres, 2)
+    middle = (centres[1:] + centres[:-1]) / 2
+    return np.concatenate([[2 * centres[0] - middle[0]], middle,
+                           [2 * centres[-1] - middle[-1]]])
+
+
+class _TimeHeightGrid(object):
+    """
+    Regular time and height grid of a day of profiles, used to draw the
+    profiles with imshow.
+
+    Profiles are averaged into time steps of time_step. Empty steps take the
+    nearest profile when it is within max_gap of the middle of the step and
+    are masked otherwise. max_gap defaults to the median time between
+    profiles. Heights are mapped to the nearest of levels, which defaults to
+    as many evenly spaced heights, levels outside of z are masked. A day
+    without profiles raises a ValueError.
+
+    """
+
+    def __init__(self, time, z, day, time_step, max_gap=None, levels=None):
+        step = pd.Timedelta(time_step).to_timedelta64()
+        start = np.datetime64(day, 'ns')
+        nsteps = int(np.timedelta64(1, 'D') // step)
+        time = np.asarray(time, dtype='datetime64[ns]')
+        if max_gap is None:
+            max_gap = (np.median(np.diff(time)) if len(time) > 1 else step)
+        else:
+            max_gap = pd.Timedelta(max_gap).to_timedelta64()
+
+        # Profiles inside the day, grouped by step.
+        steps = (time - start) // step
+        self._profiles = np.flatnonzero((steps >= 0) & (steps < nsteps))
+        if not len(self._profiles):
+            raise ValueError('No profiles on %s' % np.datetime64(day, 'D'))
+        steps = steps[self._profiles]
+        order = np.argsort(steps, kind='stable')
+        self._profiles = self._profiles[order]
+        self._steps, self._starts = np.unique(steps[order], return_index=True)
+
+        # Empty steps filled from the nearest profile.
+        empty = np.ones(nsteps, dtype=bool)
+        empty[self._steps] = False
+        centres = start + (np.arange(nsteps) + 0.5) * step
+        after = np.clip(np.searchsorted(time, centres), 1, len(time) - 1)
+        before = after - 1
+        nearest = np.where(abs(time[after] - centres)
+                           < abs(centres - time[before]), after, before)
+        near = abs(time[nearest] - centres) <= max_gap
+        self._filled = np.flatnonzero(empty & near)
+        self._nearest = nearest[self._filled]
+        self._nsteps = nsteps
+
+        z = np.asarray(z)
+        if levels is None:
+            levels = np.linspace(z[0], z[-1], len(z))
+        levels = np.asarray(levels)
+        above = np.clip(np.searchsorted(z, levels), 1, len(z) - 1)
+        self._heights = np.where(abs(z[above] - levels)
+                                 < abs(levels - z[above - 1]),
+                                 above, above - 1)
+        half = (levels[1] - levels[0]) / 2 if len(levels) > 1 else 0.5
+        self._outside = (levels < z[0] - half) | (levels > z[-1] + half)
+        self.levels = levels
+        self.extent = [matplotlib.dates.date2num(start),
+                       matplotlib.dates.date2num(start + nsteps * step),
+                       levels[0] - half, levels[-1] + half]
+
+    def regrid(self, data):
+        """ Returns data (time, height) on the grid as a masked array. """
+        data = np.asarray(data, dtype=np.float32)[:, self._heights]
+        valid = np.isfinite(data)
+        grid = np.full((self._nsteps, data.shape[1]), np.nan,
+                       dtype=np.float32)
+        if len(self._profiles):
+            sums = np.add.reduceat(np.where(valid, data, 0)[self._profiles],
+                                   self._starts, axis=0)
+            counts = np.add.reduceat(valid[self._profiles], self._starts,
+                                     axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                grid[self._steps] = sums / counts
+        grid[self._filled] = data[self._nearest]
+        grid[:, self._outside] = np.nan
+        return np.ma.masked_invalid(grid)
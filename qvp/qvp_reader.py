@@ -0,0 +1,128 @@
+"""
+qvp.qvp_reader
+==============
+Reads a single sweep from a CF/Radial file.
+
+    read_sweep
+
+"""
+
+import numpy as np
+import netCDF4
+import pyart
+
+
+def read_sweep(filename, desired_angle=None, fields=None):
+    """
+    Reads the sweep closest to desired_angle from a CF/Radial file.
+
+    The file is opened lazily and only the rays of the selected sweep are
+    read from the field variables, so the bytes read and the memory used
+    are a fraction of reading the whole volume.
+
+    Parameters
+    ----------
+    filename : str
+        File path to the CF/Radial file.
+    desired_angle : float
+        Radar tilt angle used to select the sweep.
+        None will default to 20.0
+
+    Optional Parameters
+    -------------------
+    fields : list
+        List of radar fields to read. None will read all fields.
+
+    Returns
+    -------
+    radar : Radar
+        Radar object containing only the selected sweep.
+
+    """
+    with netCDF4.Dataset(filename) as dataset:
+        return _read_sweep(dataset, desired_angle, fields)
+
+
+def _read_qvp_sweep(filename, desired_angle, fields):
+    """
+    Reads the QVP sweep of a CF/Radial file. Returns the single sweep Radar
+    and the time of the first ray of the volume, which is used as the time
+    of the scan.
+
+    """
+    with netCDF4.Dataset(filename) as dataset:
+        radar = _read_sweep(dataset, desired_angle, fields)
+        volume_start = dataset.variables['time'][0]
+    return radar, volume_start
+
+
+def _sweep_index(dataset, desired_angle):
+    """ Returns the index of the sweep closest to desired_angle. """
+    if desired_angle is None:
+        desired_angle = 20.0
+    fixed_angle = dataset.variables['fixed_angle'][:]
+    return abs(fixed_angle - desired_angle).argmin()
+
+
+def _read_sweep(dataset, desired_angle, fields):
+    """ Creates a Radar from a single sweep of an open CF/Radial dataset. """
+    ncvars = dataset.variables
+    index = _sweep_index(dataset, desired_angle)
+    start = int(ncvars['sweep_start_ray_index'][index])
+    end = int(ncvars['sweep_end_ray_index'][index])
+    rays = slice(start, end + 1)
+    nrays = end - start + 1
+
+    if fields is None:
+        fields = [name for name, var in ncvars.items()
+                  if var.dimensions == ('time', 'range')]
+    radar_fields = {}
+    for field in fields:
+        if field in ncvars:
+            radar_fields[field] = _ncvar_to_dict(ncvars[field], rays)
+
+    sweep_mode = _ncvar_to_dict(ncvars['sweep_mode'], slice(index, index + 1))
+    mode = sweep_mode['data'][0]
+    if getattr(mode, 'ndim', 0):
+        mode = netCDF4.chartostring(mode)
+    mode = str(mode).strip()
+    if 'rhi' in mode or mode == 'elevation_surveillance':
+        scan_type = 'rhi'
+    else:
+        scan_type = 'ppi'
+
+    metadata = dict((k, getattr(dataset, k)) for k in dataset.ncattrs())
+    sweep_number = _ncvar_to_dict(ncvars['sweep_number'],
+                                  slice(index, index + 1))
+    sweep_number['data'] = np.array([0], dtype=np.int32)
+    sweep_start_ray_index = _ncvar_to_dict(ncvars['sweep_start_ray_index'],
+                                           slice(index, index + 1))
+    sweep_start_ray_index['data'] = np.array([0], dtype=np.int32)
+    sweep_end_ray_index = _ncvar_to_dict(ncvars['sweep_end_ray_index'],
+                                         slice(index, index + 1))
+    sweep_end_ray_index['data'] = np.array([nrays - 1], dtype=np.int32)
+
+    return pyart.core.Radar(
+        _ncvar_to_dict(ncvars['time'], rays),
+        _ncvar_to_dict(ncvars['range']),
+        radar_fields, metadata, scan_type,
+        _ncvar_to_dict(ncvars['latitude']),
+        _ncvar_to_dict(ncvars['longitude']),
+        _ncvar_to_dict(ncvars['altitude']),
+        sweep_number, sweep_mode,
+        _ncvar_to_dict(ncvars['fixed_angle'], slice(index, index + 1)),
+        sweep_start_ray_index, sweep_end_ray_index,
+        _ncvar_to_dict(ncvars['azimuth'], rays),
+        _ncvar_to_dict(ncvars['elevation'], rays))
+
+
+def _ncvar_to_dict(ncvar, index=slice(None)):
+    """ Converts part of a netCDF variable to a Py-ART dictionary. """
+    d = dict((k, getattr(ncvar, k)) for k in ncvar.ncattrs()
+             if k not in ['scale_factor', 'add_offset'])
+    data = ncvar[index] if ncvar.ndim else ncvar[...]
+    if data is np.ma.masked:
+        ncvar.set_auto_mask(False)
+        data = np.ma.array(ncvar[...], mask=True)
+    d['data'] = np.atleast_1d(data)
+    return d
@@ -0,0 +1,172 @@
+"""
+qvp.qvp_stats
+=============
+Opt-in timing and memory statistics of the QVP stages.
+
+    QVPStats
+
+"""
+
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is not recorded.
+    resource = None
+
+
+class _NoStage(object):
+    """ Stage returned when statistics are off, entering it does nothing. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class QVPStats(object):
+    """
+    Wall time, bytes read and peak memory of each stage of a QVP run.
+
+    A record is kept for each stage of each file: 'read' and 'profile' for
+    every radar file, 'accumulate' for the profiles of a qvp object,
+    'dataset' and 'to_netcdf', 'append' or 'to_zarr' in write, and
+    'read_quicklook', 'draw' and 'savefig' for every quicklook. Stages of
+    files profiled in worker processes are timed in the worker and added
+    once its profiles are returned.
+
+    Optional Parameters
+    -------------------
+    log : str or file
+        File path, or open file, each record is written to as a line of
+        JSON.
+    callback : callable
+        Called with each record dictionary as it is added, e.g. to export
+        the metrics to a scheduler.
+
+    Attributes
+    ----------
+    records : list
+        One dictionary for each stage with the stage and file names, the
+        start time in seconds since the epoch, the wall time in seconds,
+        the bytes read by the process during the stage (None where the
+        platform does not report it) and the peak RSS of the process in
+        bytes at the end of the stage.
+
+    """
+
+    def __init__(self, log=None, callback=None):
+        self.records = []
+        self.log = log
+        self.callback = callback
+
+    def stage(self, name, file=None):
+        """ Returns a context manager that records a stage. """
+        return _Stage(self, name, file)
+
+    def add(self, record):
+        """ Adds a record, writing it to the log and the callback. """
+        self.records.append(record)
+        if self.log is not None:
+            line = json.dumps(record) + '\n'
+            if isinstance(self.log, str):
+                with open(self.log, 'a') as log:
+                    log.write(line)
+            else:
+                self.log.write(line)
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self, by='stage'):
+        """
+        Returns the totals of the records by 'stage' or by 'file': the
+        number of records, the wall time and bytes read summed and the
+        largest peak RSS.
+
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record[by], {
+                'count': 0, 'seconds': 0.0, 'bytes_read': 0,
+                'peak_rss': None})
+            total['count'] += 1
+            total['seconds'] += record['seconds']
+            if record['bytes_read'] is not None:
+                total['bytes_read'] += record['bytes_read']
+            if record['peak_rss'] is not None:
+                total['peak_rss'] = max(total['peak_rss'] or 0,
+                                        record['peak_rss'])
+        return totals
+
+
+class _Stage(object):
+    """ Times a stage and adds its record to the statistics. """
+
+    __slots__ = ('stats', 'name', 'file', '_start', '_clock', '_read')
+
+    def __init__(self, stats, name, file):
+        self.stats = stats
+        self.name = name
+        self.file = file
+
+    def __enter__(self):
+        self._read = _bytes_read()
+        self._start = time.time()
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._clock
+        read = _bytes_read()
+        self.stats.add({
+            'stage': self.name,
+            'file': self.file,
+            'start': self._start,
+            'seconds': seconds,
+            'bytes_read': (None if read is None or self._read is None
+                           else read - self._read),
+            'peak_rss': _peak_rss(),
+            'pid': os.getpid()})
+        return False
+
+
+def _stage(stats, name, file=None):
+    """ Returns the stage of stats, or a stage doing nothing without stats. """
+    if stats is None:
+        return _NO_STAGE
+    return _Stage(stats, name, file)
+
+
+def _bytes_read():
+    """
+    Returns the bytes read by this process so far, None where the platform
+    does not report it.
+
+    """
+    try:
+        with open('/proc/self/io') as io:
+            for line in io:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss():
+    """ Returns the peak resident set size of this process in bytes. """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,302 @@
+"""
+qvp.qvp_tiles
+=============
+Multi-resolution time-height tiles of a QVP field for interactive browsing.
+
+    TilePyramid
+    build_pyramid
+
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .config import get_plot_values, get_field_parameters
+from .qvp_quicklooks import _TimeHeightGrid, _open, _qvp_days, _select_date
+
+# Tiles are indexed by the number of tile widths since the epoch, so the
+# tiles of a day do not depend on which days were added first.
+_EPOCH = np.datetime64('1970-01-01', 'ns')
+
+# Value of a missing gate in uint8 tiles.
+_MISSING = 255
+
+
+class TilePyramid(object):
+    """
+    Time-height tile pyramid of a QVP field.
+
+    Level 0 holds the profiles averaged onto a regular grid of time_step,
+    each higher level halves the time resolution with a mean or max
+    reduction of pairs of columns of the level below. Each level is cut
+    along time into tiles of tile_size columns by all heights, stored as
+    .npy files in directory/field/level/tile.npy. Settings, the heights and
+    the colormap of uint8 tiles are stored in directory/field/pyramid.json.
+
+    uint8 tiles hold the field scaled between vmin and vmax to 0-254 with
+    255 as missing, which is an index into the colormap in pyramid.json.
+    float16 tiles hold the field values with NaN as missing.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the pyramids.
+    field : str
+        QVP field of the pyramid.
+
+    Optional Parameters
+    -------------------
+    config : str
+        A string of the radar name found from config.py, used for the
+        colormap of uint8 tiles. Ignored for an existing pyramid.
+    time_step : str or timedelta
+        Time resolution of level 0. Ignored for an existing pyramid.
+    tile_size : int
+        Number of time columns of a tile. Ignored for an existing pyramid.
+    levels : int
+        Number of levels. None will add levels until a tile spans a month.
+        Ignored for an existing pyramid.
+    reduction : str
+        'mean' or 'max' reduction between levels. Ignored for an existing
+        pyramid.
+    dtype : str
+        'uint8' or 'float16' tiles. Ignored for an existing pyramid.
+    vmin, vmax : float
+        Range scaled to uint8. None will use the field parameters in
+        config.py, then the range of the first day added. Ignored for an
+        existing pyramid.
+
+    """
+
+    def __init__(self, directory, field, config='xsaprqvpI5',
+                 time_step='5min', tile_size=256, levels=None,
+                 reduction='mean', dtype='uint8', vmin=None, vmax=None):
+        if reduction not in ('mean', 'max'):
+            raise ValueError('Unknown reduction: ' + str(reduction))
+        if dtype not in ('uint8', 'float16'):
+            raise ValueError('Unknown tile dtype: ' + str(dtype))
+        self.directory = os.path.join(directory, field)
+        self.field = field
+        self._metadata_path = os.path.join(self.directory, 'pyramid.json')
+        if os.path.exists(self._metadata_path):
+            with open(self._metadata_path) as metadata_file:
+                self.metadata = json.load(metadata_file)
+            return
+
+        step = pd.Timedelta(time_step)
+        if levels is None:
+            levels = 1
+            while step * tile_size * 2**(levels - 1) < pd.Timedelta(days=31):
+                levels += 1
+        params = get_field_parameters().get(field, {})
+        if vmin is None:
+            vmin = params.get('vmin')
+        if vmax is None:
+            vmax = params.get('vmax')
+        self.metadata = {'field': field,
+                         'time_step': step.value,
+                         'tile_size': tile_size,
+                         'levels': levels,
+                         'reduction': reduction,
+                         'dtype': dtype,
+                         'vmin': vmin,
+                         'vmax': vmax,
+                         'heights': None,
+                         'colormap': None,
+                         'sources': {}}
+        if dtype == 'uint8':
+            cmap = get_plot_values(config)['cmap']
+            colors = (cmap(np.linspace(0, 1, _MISSING)) * 255).round()
+            colors = np.vstack([colors, [0, 0, 0, 0]]).astype(np.uint8)
+            self.metadata['colormap'] = colors.tolist()
+
+    def update(self, file):
+        """
+        Adds every day of a QVP file to the pyramid. Only the tiles
+        covering those days are rewritten.
+
+        """
+        for day in _qvp_days(file):
+            with _open(file) as qvp:
+                qvp = _select_date(qvp[[self.field]], day).load()
+            self.add_day(qvp.time.data, qvp.height.data,
+                         qvp[self.field].data, pd.to_datetime(day))
+        self.metadata['sources'][os.path.abspath(file)] = (
+            os.path.getmtime(file))
+        self._save_metadata()
+
+    def add_day(self, time, height, data, day):
+        """
+        Adds a day of (time, height) profiles to the pyramid.
+
+        Parameters
+        ----------
+        time : array
+            Times of the profiles.
+        height : array
+            Heights of the profiles in meters.
+        data : array
+            Field profiles, NaN where missing.
+        day : datetime
+            Midnight of the day.
+
+        """
+        metadata = self.metadata
+        step = np.timedelta64(metadata['time_step'], 'ns')
+        grid = _TimeHeightGrid(time, height, day, step,
+                               levels=metadata['heights'])
+        values = grid.regrid(data).filled(np.nan)
+        if metadata['heights'] is None:
+            metadata['heights'] = grid.levels.tolist()
+        if metadata['dtype'] == 'uint8':
+            if metadata['vmin'] is None:
+                metadata['vmin'] = float(np.nanmin(values))
+            if metadata['vmax'] is None:
+                metadata['vmax'] = float(np.nanmax(values))
+        self._save_metadata()
+
+        start = int((np.datetime64(day, 'ns') - _EPOCH) // step)
+        stop = start + len(values)
+        self._write_columns(0, start, values)
+        for level in range(1, metadata['levels']):
+            start, stop = start // 2, (stop + 1) // 2
+            below = self._read_columns(level - 1, 2 * start, 2 * stop)
+            self._write_columns(level, start, _reduce(
+                below, metadata['reduction']))
+
+    def read_tile(self, level, tile):
+        """
+        Returns a tile as float32 (time, height) values, NaN where missing,
+        None if the tile does not exist.
+
+        """
+        try:
+            return self._decode(np.load(self._tile_path(level, tile)))
+        except OSError:
+            return None
+
+    def tile_times(self, level, tile):
+        """ Returns the start time of each column of a tile. """
+        step = np.timedelta64(self.metadata['time_step'] * 2**level, 'ns')
+        size = self.metadata['tile_size']
+        return _EPOCH + (tile * size + np.arange(size)) * step
+
+    def _tile_path(self, level, tile):
+        return os.path.join(self.directory, str(level), '%d.npy' % tile)
+
+    def _read_columns(self, level, start, stop):
+        """ Returns columns start to stop of a level as float32. """
+        size = self.metadata['tile_size']
+        columns = np.full((stop - start, len(self.metadata['heights'])),
+                          np.nan, dtype=np.float32)
+        for tile in range(start // size, (stop - 1) // size + 1):
+            values = self.read_tile(level, tile)
+            if values is None:
+                continue
+            first = max(start, tile * size)
+            last = min(stop, (tile + 1) * size)
+            columns[first - start:last - start] = (
+                values[first - tile * size:last - tile * size])
+        return columns
+
+    def _write_columns(self, level, start, values):
+        """ Writes values into the tiles of a level from column start. """
+        size = self.metadata['tile_size']
+        stop = start + len(values)
+        os.makedirs(os.path.join(self.directory, str(level)), exist_ok=True)
+        for tile in range(start // size, (stop - 1) // size + 1):
+            current = self.read_tile(level, tile)
+            if current is None:
+                current = np.full((size, values.shape[1]), np.nan,
+                                  dtype=np.float32)
+            first = max(start, tile * size)
+            last = min(stop, (tile + 1) * size)
+            current[first - tile * size:last - tile * size] = (
+                values[first - start:last - start])
+            self._save(self._tile_path(level, tile), self._encode(current))
+
+    def _encode(self, values):
+        if self.metadata['dtype'] == 'float16':
+            return values.astype(np.float16)
+        vmin, vmax = self.metadata['vmin'], self.metadata['vmax']
+        scaled = (values - vmin) / (vmax - vmin) * (_MISSING - 1)
+        with np.errstate(invalid='ignore'):
+            tile = np.clip(np.round(scaled), 0, _MISSING - 1)
+        tile[np.isnan(values)] = _MISSING
+        return tile.astype(np.uint8)
+
+    def _decode(self, tile):
+        if self.metadata['dtype'] == 'float16':
+            return tile.astype(np.float32)
+        vmin, vmax = self.metadata['vmin'], self.metadata['vmax']
+        values = (vmin + tile.astype(np.float32) * (vmax - vmin)
+                  / (_MISSING - 1))
+        values[tile == _MISSING] = np.nan
+        return values
+
+    def _save(self, path, array):
+        """ Writes a tile atomically so readers never see partial tiles. """
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                            suffix='.tmp')
+        with os.fdopen(handle, 'wb') as tmp_file:
+            np.save(tmp_file, array)
+        os.replace(tmp_path, path)
+
+    def _save_metadata(self):
+        os.makedirs(self.directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+        with os.fdopen(handle, 'w') as tmp_file:
+            json.dump(self.metadata, tmp_file)
+        os.replace(tmp_path, self._metadata_path)
+
+
+def build_pyramid(files, directory, field, **kwargs):
+    """
+    Creates or updates the tile pyramid of a field from QVP files.
+
+    Files already added to the pyramid that have not changed since are
+    skipped, so this can be run again as new daily files are written.
+
+    Parameters
+    ----------
+    files : list
+        File paths to the QVP NetCDF files or Zarr stores.
+    directory : str
+        Directory of the pyramids.
+    field : str
+        QVP field of the pyramid.
+
+    Optional Parameters
+    -------------------
+    kwargs
+        Settings of a new pyramid passed to TilePyramid.
+
+    Returns
+    -------
+    pyramid : TilePyramid
+        The updated pyramid.
+
+    """
+    pyramid = TilePyramid(directory, field, **kwargs)
+    sources = pyramid.metadata['sources']
+    for file in sorted(files):
+        if sources.get(os.path.abspath(file)) == os.path.getmtime(file):
+            continue
+        pyramid.update(file)
+    return pyramid
+
+
+def _reduce(columns, reduction):
+    """ Reduces pairs of columns by their mean or max, ignoring NaN. """
+    pairs = columns.reshape(len(columns) // 2, 2, columns.shape[1])
+    if reduction == 'max':
+        return np.fmax(pairs[:, 0], pairs[:, 1])
+    valid = np.isfinite(pairs)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.where(valid, pairs, 0).sum(axis=1)
+                / valid.sum(axis=1)).astype(np.float32)
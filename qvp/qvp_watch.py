@@ -0,0 +1,305 @@
+"""
+qvp.qvp_watch
+=============
+Near real time QVPs of the radar files arriving in a directory.
+
+    DirectoryWatcher
+    watch_main
+
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import time
+
+from .config import get_metadata
+from .qvp_profile import qvp
+from .qvp_quicklooks import QuicklookRenderer, _panel_groups
+
+
+class DirectoryWatcher(object):
+    """
+    Watches a directory for new radar files and appends their profiles to
+    the daily QVP files as they arrive.
+
+    The directory is polled for files of the input datastream of the radar.
+    Each new file is profiled once, appended to its daily file with
+    qvp.write(append=True) and the quicklook of its day is rendered again
+    with a renderer kept open between polls. The files processed, and the
+    files that failed with the reason, are saved to a JSON state file after
+    every poll so a restarted watcher does not process them again. Failed
+    files are not read again until they are removed from the state file.
+    Only files dated, in their name, within the watched days are looked
+    for, and files of older days, or that left the directory, are dropped
+    from the state, so polls and the state do not grow with the archive.
+
+    Parameters
+    ----------
+    config : str
+        A string of the radar name found from config.py.
+    input_directory : str
+        Directory the radar files arrive in, including subdirectories.
+    output_directory : str
+        Directory of the daily QVP files.
+
+    Optional Parameters
+    -------------------
+    fields : list
+        QVP fields to profile and write. None for all fields.
+    image_directory : str
+        Directory of the quicklooks. None will not render quicklooks.
+    quicklook_fields : list
+        Fields plotted in the quicklooks, one panel each. None will plot
+        the first four fields written.
+    panels : int
+        Number of fields in each quicklook. None will plot all quicklook
+        fields in one image.
+    state_file : str
+        JSON file the progress is saved to. None will default to
+        .qvp_watch.json in output_directory.
+    desired_angle : float
+        Radar tilt angle used for the QVP. None will default to 20.0
+    time_step : str or timedelta
+        Writes the daily files on a fixed time grid of this step, see
+        qvp.write. Without it scans arriving after a later scan are not
+        appended and are added to failures.
+    settle : float
+        Seconds a file must be left unchanged before it is read, so files
+        still being copied are not read.
+    days : int
+        Number of days, up to today in UTC, whose radar files are watched.
+
+    """
+
+    def __init__(self, config, input_directory, output_directory,
+                 fields=None, image_directory=None, quicklook_fields=None,
+                 panels=None, state_file=None, desired_angle=None,
+                 time_step=None, settle=5.0, days=2):
+        if state_file is None:
+            state_file = os.path.join(output_directory, '.qvp_watch.json')
+        self.config = config
+        self.input_directory = input_directory
+        self.output_directory = output_directory
+        self.fields = fields
+        self.image_directory = image_directory
+        self.quicklook_fields = quicklook_fields
+        self.panels = panels
+        self.state_file = state_file
+        self.desired_angle = desired_angle
+        self.time_step = time_step
+        self.settle = settle
+        self.days = days
+        self.processed = {}
+        self.failures = {}
+        self._renderer = None
+        if os.path.exists(state_file):
+            with open(state_file) as f:
+                state = json.load(f)
+            self.processed = state['processed']
+            self.failures = state['failures']
+
+    def new_files(self):
+        """
+        Returns the radar files that have not been processed and have been
+        left unchanged for settle seconds, in name order.
+
+        """
+        datastream = get_metadata(self.config)['input_datastream']
+        now = time.time()
+        files = []
+        for day in self._days():
+            pattern = os.path.join(self.input_directory, '**',
+                                   datastream + '.' + day + '.*')
+            for filename in glob.glob(pattern, recursive=True):
+                if filename in self.processed or filename in self.failures:
+                    continue
+                try:
+                    mtime = os.path.getmtime(filename)
+                except OSError:
+                    continue
+                if now - mtime < self.settle:
+                    continue
+                files.append(filename)
+        return sorted(files, key=os.path.basename)
+
+    def poll(self):
+        """
+        Processes the new radar files once. Each file is profiled and
+        appended on its own, so a file that can not be appended, e.g. with
+        other gates than its daily file, is added to failures and the
+        other files are still appended.
+
+        Returns
+        -------
+        files : list
+            Radar files whose profiles were appended.
+
+        """
+        files = self.new_files()
+        appended = []
+        days = set()
+        fields = []
+        for file in files:
+            try:
+                radar_qvp = qvp([file], desired_angle=self.desired_angle,
+                                fields=self.fields)
+                if file in radar_qvp.failures:
+                    self.failures[file] = radar_qvp.failures[file]
+                    continue
+                radar_qvp.write(self.config,
+                                file_directory=self.output_directory,
+                                append=True, time_step=self.time_step)
+            except Exception as error:
+                self.failures[file] = '%s: %s' % (type(error).__name__, error)
+                continue
+            if radar_qvp.skipped:
+                # Left out by the append, the daily file holds later scans.
+                self.failures[file] = (
+                    'Not appended: scan at %s is not later than the last '
+                    'scan of its daily file' % radar_qvp.skipped[0])
+                continue
+            appended.append(file)
+            self.processed[file] = os.path.getmtime(file)
+            days.update(scan.strftime('%Y%m%d')
+                        for scan in radar_qvp.base_time)
+            fields = radar_qvp._check_fields(self.fields)
+        if self._prune() or files:
+            self._save()
+        if days and self.image_directory is not None:
+            try:
+                self._render(sorted(days), fields)
+            except Exception as error:
+                # The profiles are appended, the next scan renders again.
+                print('Quicklooks of %s failed: %s: %s' % (
+                    ', '.join(sorted(days)), type(error).__name__, error),
+                    file=sys.stderr)
+        return appended
+
+    def run(self, interval=10.0, polls=None):
+        """
+        Polls the input directory every interval seconds, polls times or
+        until interrupted.
+
+        """
+        count = 0
+        try:
+            while polls is None or count < polls:
+                start = time.monotonic()
+                self.poll()
+                count += 1
+                if polls is None or count < polls:
+                    time.sleep(max(interval - (time.monotonic() - start), 0))
+        finally:
+            self.close()
+
+    def close(self):
+        """ Releases the quicklook figure. """
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
+
+    def _render(self, days, fields):
+        """ Renders the quicklooks of the daily files of days. """
+        plot_fields = self.quicklook_fields or fields[:4]
+        panels = self.panels or len(plot_fields)
+        if self._renderer is None:
+            self._renderer = QuicklookRenderer(
+                self.config, panels=panels,
+                image_directory=self.image_directory)
+        datastream = get_metadata(self.config)['datastream']
+        for day in days:
+            filename = os.path.join(self.output_directory, datastream + '.'
+                                    + day + '.000000.nc')
+            for group, tag in _panel_groups(panels, plot_fields):
+                self._renderer.render(filename, group, date=day, tag=tag)
+
+    def _days(self):
+        """ Returns the dates, as YYYYMMDD, of the days watched. """
+        today = _today()
+        return [(today - datetime.timedelta(days=day)).strftime('%Y%m%d')
+                for day in range(self.days)]
+
+    def _prune(self):
+        """
+        Drops the files of days no longer watched, or that left the
+        directory, from the state. Returns True if any was dropped.
+
+        """
+        datastream = get_metadata(self.config)['input_datastream']
+        days = set(self._days())
+        pruned = False
+        for state in [self.processed, self.failures]:
+            for filename in list(state):
+                day = os.path.basename(filename)[len(datastream) + 1:][:8]
+                if day not in days or not os.path.exists(filename):
+                    del state[filename]
+                    pruned = True
+        return pruned
+
+    def _save(self):
+        """ Replaces the state file, so a restart never sees it half written. """
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'processed': self.processed,
+                       'failures': self.failures}, f, indent=1,
+                      sort_keys=True)
+        os.replace(tmp_path, self.state_file)
+
+
+def _today():
+    """ Returns the current date in UTC. """
+    return datetime.datetime.utcnow().date()
+
+
+def watch_main(argv=None):
+    """ Command line entry point of qvp-watch. """
+    parser = argparse.ArgumentParser(
+        prog='qvp-watch',
+        description='Append the QVPs of new radar files as they arrive.')
+    parser.add_argument('input_directory', help='Directory of radar files')
+    parser.add_argument('output_directory',
+                        help='Directory for the daily QVP files')
+    parser.add_argument('-c', '--config', required=True,
+                        help='Radar name from config.py')
+    parser.add_argument('-f', '--field', action='append', dest='fields',
+                        help='QVP field to write, may be repeated')
+    parser.add_argument('-o', '--image-directory', default=None,
+                        help='Directory for the quicklooks')
+    parser.add_argument('-q', '--quicklook-field', action='append',
+                        dest='quicklook_fields',
+                        help='Field to plot, may be repeated')
+    parser.add_argument('-p', '--panels', type=int, default=None,
+                        help='Fields in each quicklook, defaults to all')
+    parser.add_argument('-a', '--desired-angle', type=float, default=None,
+                        help='Radar tilt angle, defaults to 20.0')
+    parser.add_argument('-t', '--time-step', default=None,
+                        help='Fixed time step of the daily files, e.g. 5min')
+    parser.add_argument('-i', '--interval', type=float, default=10.0,
+                        help='Seconds between polls of the input directory')
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help='Seconds a file must be unchanged to be read')
+    parser.add_argument('--days', type=int, default=2,
+                        help='Days of radar files watched, up to today')
+    parser.add_argument('--state-file', default=None,
+                        help='JSON file the progress is saved to')
+    parser.add_argument('--once', action='store_true',
+                        help='Poll once and exit')
+    args = parser.parse_args(argv)
+
+    watcher = DirectoryWatcher(
+        args.config, args.input_directory, args.output_directory,
+        fields=args.fields, image_directory=args.image_directory,
+        quicklook_fields=args.quicklook_fields, panels=args.panels,
+        state_file=args.state_file, desired_angle=args.desired_angle,
+        time_step=args.time_step, settle=args.settle, days=args.days)
+    try:
+        watcher.run(args.interval, polls=1 if args.once else None)
+    except KeyboardInterrupt:
+        pass
+    for filename, reason in sorted(watcher.failures.items()):
+        print('%s failed: %s' % (filename, reason), file=sys.stderr)
+    return 0
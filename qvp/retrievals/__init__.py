@@ -0,0 +1,14 @@
+"""
+==============
+QVP Retrievals
+==============
+
+Retrievals from quasi vertical profiles.
+
+    find_melting_layer
+    detect_melting_layer
+
+"""
+
+from .melting_layer import detect_melting_layer, find_melting_layer
+__all__ = [s for s in dir() if not s.startswith('_')]
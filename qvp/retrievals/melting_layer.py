@@ -0,0 +1,166 @@
+"""
+qvp.retrievals.melting_layer
+============================
+Melting layer detection from QVP polarimetric profiles.
+
+    find_melting_layer
+    detect_melting_layer
+
+"""
+
+import numpy as np
+import xarray
+
+from ..qvp_quicklooks import _open
+
+# QVP fields the melting layer is found from by qvp.write.
+_MELTING_LAYER_FIELDS = ('cross_correlation_ratio',
+                         'corrected_differential_reflectivity',
+                         'corrected_reflectivity')
+
+# Attributes of the melting layer variables written with the QVP fields.
+_MELTING_LAYER_ATTRS = {
+    'melting_layer_bottom': {
+        'long_name': 'Melting layer bottom height',
+        'units': 'meters',
+        'comment': 'Lowest height of the melting layer signature in '
+                   'cross_correlation_ratio, corrected_differential_'
+                   'reflectivity and corrected_reflectivity',
+        '_FillValue': -9999},
+    'melting_layer_top': {
+        'long_name': 'Melting layer top height',
+        'units': 'meters',
+        'comment': 'Highest height of the melting layer signature in '
+                   'cross_correlation_ratio, corrected_differential_'
+                   'reflectivity and corrected_reflectivity',
+        '_FillValue': -9999}}
+
+
+def find_melting_layer(rhohv, zdr, zh, height, min_height=500.0,
+                       max_height=6000.0, rhohv_range=(0.85, 0.99),
+                       zdr_range=(0.0, 2.5), zh_range=(15.0, 45.0),
+                       threshold=0.1, fraction=0.5, max_rhohv=0.97):
+    """
+    Finds the bottom and top of the melting layer of every profile.
+
+    The melting layer is where the cross correlation ratio drops while the
+    differential reflectivity and reflectivity increase. Each field is
+    scaled to 0-1 over its range and their product is the melting layer
+    signature. The signature peak of each profile between min_height and
+    max_height is its melting layer when the peak is over threshold and
+    the cross correlation ratio at the peak is below max_rhohv. The bottom
+    and top are the lowest and highest heights of the contiguous gates
+    around the peak where the signature is over fraction of the peak. All
+    profiles are processed at once.
+
+    Parameters
+    ----------
+    rhohv, zdr, zh : array
+        (time, height) cross correlation ratio, differential reflectivity
+        (dB) and reflectivity (dBZ) profiles, NaN or masked where missing.
+    height : array
+        Heights of the profiles in meters.
+
+    Optional Parameters
+    -------------------
+    min_height, max_height : float
+        Heights in meters the melting layer is searched between.
+    rhohv_range, zdr_range, zh_range : tuple
+        Values scaled to 0 and 1 in the signature, the cross correlation
+        ratio is reversed so its first value scales to 1.
+    threshold : float
+        Lowest signature peak of a melting layer.
+    fraction : float
+        Fraction of the peak signature inside the melting layer.
+    max_rhohv : float
+        Highest cross correlation ratio at the peak of a melting layer.
+
+    Returns
+    -------
+    bottom, top : array
+        Melting layer bottom and top heights in meters of each profile,
+        NaN where none was found.
+
+    """
+    rhohv = np.ma.filled(np.ma.asarray(rhohv, dtype=np.float32), np.nan)
+    height = np.asarray(height, dtype=np.float64)
+    signature = (_scale(rhohv, rhohv_range[1], rhohv_range[0])
+                 * _scale(zdr, *zdr_range) * _scale(zh, *zh_range))
+    searched = (height >= min_height) & (height <= max_height)
+    signature[:, ~searched] = 0
+
+    rows = np.arange(len(signature))
+    peak = signature.argmax(axis=1)
+    peak_value = signature[rows, peak]
+    found = (peak_value >= threshold) & (rhohv[rows, peak] < max_rhohv)
+
+    # The layer ends at the first gate on either side of the peak where the
+    # signature falls under fraction of the peak.
+    gates = np.arange(signature.shape[1])
+    outside = signature < fraction * peak_value[:, None]
+    below = outside & (gates < peak[:, None])
+    above = outside & (gates > peak[:, None])
+    last_below = np.where(below.any(axis=1),
+                          gates[-1] - below[:, ::-1].argmax(axis=1), -1)
+    first_above = np.where(above.any(axis=1), above.argmax(axis=1),
+                           len(gates))
+
+    bottom = np.where(found, height[last_below + 1], np.nan)
+    top = np.where(found, height[first_above - 1], np.nan)
+    return bottom, top
+
+
+def detect_melting_layer(source, rhohv_field='cross_correlation_ratio',
+                         zdr_field='corrected_differential_reflectivity',
+                         zh_field='corrected_reflectivity', **kwargs):
+    """
+    Finds the melting layer of a qvp object, a QVP Dataset or a QVP file.
+
+    Parameters
+    ----------
+    source : qvp, Dataset or str
+        Profiles to search, or the file path to a QVP NetCDF file or Zarr
+        store.
+
+    Optional Parameters
+    -------------------
+    rhohv_field, zdr_field, zh_field : str
+        Fields used for the cross correlation ratio, differential
+        reflectivity and reflectivity.
+    kwargs
+        Settings passed to find_melting_layer.
+
+    Returns
+    -------
+    ds : Dataset
+        melting_layer_bottom and melting_layer_top heights along time.
+
+    """
+    names = [rhohv_field, zdr_field, zh_field]
+    if isinstance(source, str):
+        with _open(source) as ds:
+            return detect_melting_layer(ds[names].load(), rhohv_field,
+                                        zdr_field, zh_field, **kwargs)
+    if isinstance(source, xarray.Dataset):
+        time = source['time'].values
+        height = source['height'].values
+        arrays = [source[name].values for name in names]
+    else:
+        time = np.array(source.time, dtype='datetime64[ns]')
+        height = source.height
+        arrays = [source._profiles.data(name) for name in names]
+
+    bottom, top = find_melting_layer(*arrays, height=height, **kwargs)
+    return xarray.Dataset(
+        dict((name, xarray.Variable('time', values.astype(np.float32),
+                                    attrs=dict(_MELTING_LAYER_ATTRS[name])))
+             for name, values in [('melting_layer_bottom', bottom),
+                                  ('melting_layer_top', top)]),
+        coords={'time': time})
+
+
+def _scale(values, low, high):
+    """ Scales values from low-high to 0-1, missing values are 0. """
+    values = np.ma.filled(np.ma.asarray(values, dtype=np.float32), np.nan)
+    scaled = np.clip((values - low) / (high - low), 0, 1)
+    return np.where(np.isnan(scaled), 0, scaled).astype(np.float32)
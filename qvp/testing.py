@@ -0,0 +1,39 @@
+"""
+qvp.testing
+===========
+Synthetic CMAC2.0 style radars shared by the tests and the benchmarks.
+
+    make_radar
+    random_field
+
+"""
+
+import numpy as np
+import pyart
+
+from .qvp_profile import _FIELD_NAMES
+
+FIELDS = [radar_field for _, radar_field in _FIELD_NAMES
+          if radar_field != 'radar_echo_classification']
+
+
+def make_radar(start, seed=0, ngates=40, rays_per_sweep=36,
+               angles=(0.5, 10.0, 20.0)):
+    """ Returns a PPI radar with random CMAC2.0 fields starting at start. """
+    radar = pyart.testing.make_empty_ppi_radar(
+        ngates, rays_per_sweep, len(angles))
+    radar.fixed_angle['data'] = np.array(angles, dtype='float32')
+    radar.elevation['data'] = np.repeat(
+        angles, rays_per_sweep).astype('float32')
+    radar.time['units'] = start.strftime('seconds since %Y-%m-%dT%H:%M:%SZ')
+    rng = np.random.RandomState(seed)
+    for field in FIELDS:
+        radar.add_field(field, {'data': random_field(
+            rng, (radar.nrays, radar.ngates))})
+    return radar
+
+
+def random_field(rng, shape):
+    """ Returns float32 data of shape, uniform in [0, 1) below 0.1 masked. """
+    data = rng.uniform(0, 1, shape).astype('float32')
+    return np.ma.masked_less(data, 0.1)
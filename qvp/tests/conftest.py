@@ -0,0 +1,23 @@
+"""
+Synthetic CMAC2.0 style radar files shared by the qvp tests.
+"""
+
+import datetime
+
+import pyart
+import pytest
+
+from qvp.testing import make_radar
+
+
+@pytest.fixture
+def radar_files(tmp_path):
+    """ Writes four CF/Radial files from the same day. """
+    files = []
+    for i in range(4):
+        start = datetime.datetime(2017, 10, 5, i, 0, 0)
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, make_radar(start, seed=i))
+        files.append(filename)
+    return files
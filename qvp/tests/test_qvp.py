@@ -3,11 +3,17 @@ Unit Test for SAPR_QVP_VAP qvp.quicklooks
 and qvp.qvp modules.
 """
 
+import matplotlib.dates
 import numpy as np
-from numpy.testing import assert_equal
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import pyart
 import qvp
 import glob
 import os
+import datetime
+
+from qvp.testing import make_radar
 
 def test_qvp_profile():
     # Test qvp.qvp
@@ -48,6 +54,196 @@ def test_qvp_4panel():
                           fields=fields)
     
     assert_equal(os.path.exists('sgpxsaprqvpI5.c1.20180831.000000.png'), True)
-    
 
-    
+def test_qvp_workers(radar_files):
+    # Test that a process pool gives the same profiles as the serial path.
+    serial = qvp.qvp(files=radar_files)
+    parallel = qvp.qvp(files=radar_files, workers=2)
+
+    assert_equal(parallel.time, serial.time)
+    assert_equal(np.ma.getdata(np.ma.array(parallel.reflectivity)),
+                 np.ma.getdata(np.ma.array(serial.reflectivity)))
+    assert_equal(np.ma.getmaskarray(np.ma.array(parallel.rain_rate_A)),
+                 np.ma.getmaskarray(np.ma.array(serial.rain_rate_A)))
+
+def test_qvp_fields(radar_files, tmp_path):
+    # Test that only the requested fields are profiled and written.
+    fields = ['corrected_reflectivity', 'cross_correlation_ratio']
+    test_qvp = qvp.qvp(files=radar_files, fields=fields)
+    assert_equal(len(test_qvp.corrected_reflectivity), 4)
+    assert_equal(hasattr(test_qvp, 'reflectivity'), False)
+
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path),
+                   fields=fields[:1])
+    ds = xarray.open_dataset(
+        str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc'))
+    assert_equal('corrected_reflectivity' in ds, True)
+    assert_equal('cross_correlation_ratio' in ds, False)
+    ds.close()
+
+def test_qvp_first_file_missing_field(tmp_path):
+    # Test that a first scan without the field does not lose the others.
+    files = []
+    for i in range(3):
+        start = datetime.datetime(2017, 10, 5, i)
+        radar = make_radar(start, seed=i)
+        if i == 0:
+            del radar.fields['rain_rate_A']
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, radar)
+        files.append(filename)
+    test_qvp = qvp.qvp(files=files, fields=['rain_rate_A'])
+    assert_equal(test_qvp.failures, {})
+    assert_equal(len(test_qvp.time), 3)
+    assert_equal(test_qvp.rain_rate_A.shape, (3, len(test_qvp.height)))
+    assert_equal(test_qvp.rain_rate_A.mask[0].all(), True)
+    assert_equal(test_qvp.rain_rate_A.mask[1:].all(), False)
+
+def test_quasi_vertical_profile():
+    # Test the stacked profile against Py-ART's QVP, field by field.
+    radar = make_radar(datetime.datetime(2017, 10, 5))
+    gatefilter = pyart.filters.GateFilter(radar)
+    gatefilter.exclude_below('corrected_reflectivity', 0.3)
+
+    for gf in (None, gatefilter):
+        profile = qvp.quasi_vertical_profile(radar, desired_angle=20.0,
+                                             gatefilter=gf)
+        for field in radar.fields:
+            expected = pyart.retrieve.quasi_vertical_profile(
+                radar, desired_angle=20.0, fields=field, gatefilter=gf)
+            assert_allclose(profile[field].filled(np.nan),
+                            expected[field].filled(np.nan), rtol=1e-6)
+        assert_allclose(profile['height'], expected['height'])
+
+def test_profile_store():
+    # Test that the buffer grows and keeps masked values.
+    from qvp.qvp_profile import _ProfileStore
+    store = _ProfileStore(['a', 'b'])
+    store.reserve(1)
+    for i in range(3):
+        store.append({'a': np.ma.masked_less(np.arange(5.0) + i, 1),
+                      'b': np.ma.arange(5.0)})
+    assert_equal(len(store), 3)
+    assert_equal(store.field('a').shape, (3, 5))
+    assert_equal(store.field('a').mask[0], [True, False, False, False, False])
+    assert_equal(store.data('b')[2], np.arange(5.0))
+    assert_equal(np.shares_memory(store.data('a'), store._buffer), True)
+
+def test_read_quicklook(radar_files, tmp_path):
+    # Test that only the requested fields and heights are read.
+    from qvp.qvp_quicklooks import _read_quicklook
+    test_qvp = qvp.qvp(files=radar_files,
+                       fields=['reflectivity', 'differential_reflectivity'])
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+
+    ylim = (0, test_qvp.height[10] / 1000)
+    subset = _read_quicklook(filename, ['reflectivity'], ylim=ylim)
+    assert_equal(list(subset.data_vars), ['reflectivity'])
+    assert_allclose(subset.height, test_qvp.height[:12])
+    assert subset['reflectivity'].variable._in_memory
+    assert_allclose(subset['reflectivity'].values,
+                    test_qvp.reflectivity[:, :12].filled(np.nan))
+
+def test_qvp_to_dataset(radar_files, tmp_path):
+    # Test that the Dataset matches the written file and can be plotted
+    # without it.
+    from qvp.qvp_quicklooks import _read_quicklook
+    fields = ['reflectivity', 'differential_reflectivity']
+    test_qvp = qvp.qvp(files=radar_files, fields=fields)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+
+    ds = test_qvp.to_dataset('xsaprqvpI5')
+    assert_equal(np.shares_memory(ds['reflectivity'].values,
+                                  test_qvp._profiles._buffer), True)
+    with xarray.open_dataset(filename) as written:
+        assert_equal(ds.time.values, written.time.values)
+        assert_equal(ds.attrs['datastream'], written.attrs['datastream'])
+        for field in fields:
+            assert_allclose(ds[field].values, written[field].values)
+    for source in [ds, test_qvp]:
+        subset = _read_quicklook(source, ['reflectivity'])
+        assert_equal(list(subset.data_vars), ['reflectivity'])
+        assert_allclose(subset['reflectivity'].values,
+                        _read_quicklook(filename,
+                                        ['reflectivity'])['reflectivity'])
+
+    image_directory = tmp_path / 'images'
+    image_directory.mkdir()
+    qvp.quicklooks_1panel(test_qvp, 'reflectivity', 'xsaprqvpI5',
+                          image_directory=str(image_directory))
+    assert_equal(os.listdir(str(image_directory)),
+                 ['sgpxsaprqvpI5.c1.20171005.000000.png'])
+
+def test_quicklook_renderer(radar_files, tmp_path):
+    # Test that the renderer reuses its mesh and leaves no pyplot figures.
+    import matplotlib.pyplot as plt
+    test_qvp = qvp.qvp(files=radar_files,
+                       fields=['reflectivity', 'velocity'])
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+
+    renderer = qvp.QuicklookRenderer('xsaprqvpI5',
+                                     image_directory=str(tmp_path))
+    images = renderer.render_many([filename], ['reflectivity', 'velocity'])
+    mesh = renderer._meshes[0]
+    assert_equal(renderer.render(filename, ['reflectivity']),
+                 str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.png'))
+    assert renderer._meshes[0] is mesh
+    assert_equal(mesh.norm.vmin, -20)
+
+    # A day with other scan times updates the same mesh in place.
+    files = []
+    for hour in [5, 7]:
+        start = datetime.datetime(2017, 10, 6, hour)
+        files.append(str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc')))
+        pyart.io.write_cfradial(files[-1], make_radar(start, seed=hour))
+    next_day = qvp.qvp(files=files, fields=['reflectivity'])
+    renderer.render(next_day, ['reflectivity'])
+    assert renderer._meshes[0] is mesh
+    x = mesh.get_coordinates()[0, :, 0]
+    assert_equal(np.searchsorted(x, matplotlib.dates.date2num(
+        np.array(next_day.time, dtype='datetime64[ns]'))), [1, 2])
+    assert_equal(mesh.get_array().mask[:, 2:].all(), True)
+    try:
+        renderer.render(filename, ['reflectivity'], date='20171007')
+    except ValueError as error:
+        assert_equal(str(error), 'No profiles on 20171007')
+    else:
+        raise AssertionError('A day without profiles was rendered')
+    renderer.close()
+
+    assert_equal([os.path.basename(image) for image in images],
+                 ['sgpxsaprqvpI5.c1.reflectivity.20171005.000000.png',
+                  'sgpxsaprqvpI5.c1.velocity.20171005.000000.png'])
+    assert all(os.path.exists(image) for image in images)
+    assert_equal(plt.get_fignums(), [])
+
+def test_time_height_grid():
+    # Test the averaging and gap filling of the regular quicklook grid.
+    from qvp.qvp_quicklooks import _TimeHeightGrid
+    day = datetime.datetime(2017, 10, 5)
+    time = np.array(['2017-10-05T00:01', '2017-10-05T00:03',
+                     '2017-10-05T00:11', '2017-10-05T02:00'],
+                    dtype='datetime64[ns]')
+    z = np.array([0.0, 1.0, 2.0])
+    data = np.array([[1, 2, np.nan], [3, 4, 5], [6, 7, 8], [9, 9, 9]])
+    grid = _TimeHeightGrid(time, z, day, '5min', max_gap='10min')
+    regrid = grid.regrid(data)
+    assert_equal(regrid.shape, (288, 3))
+    assert_equal(regrid[0].filled(np.nan), [2, 3, 5])
+    # 00:05-00:10 takes the 00:11 profile, 01:00 is in the gap.
+    assert_equal(regrid[1].filled(np.nan), [6, 7, 8])
+    assert_equal(regrid[12].mask.all(), True)
+    assert_equal(regrid[24].filled(np.nan), [9, 9, 9])
+    for other in [time[:0], time]:
+        try:
+            _TimeHeightGrid(other, z, day + datetime.timedelta(days=1),
+                            '5min')
+        except ValueError as error:
+            assert_equal(str(error), 'No profiles on 2017-10-06')
+        else:
+            raise AssertionError('A day without profiles was gridded')
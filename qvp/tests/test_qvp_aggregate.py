@@ -0,0 +1,91 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_aggregate module.
+"""
+
+import numpy as np
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+
+
+def _dataset():
+    rng = np.random.RandomState(0)
+    time = (np.datetime64('2017-10-05T00:00', 'ns')
+            + np.arange(0, 600, 7).astype('timedelta64[m]'))
+    data = rng.uniform(0, 10, (len(time), 5)).astype(np.float32)
+    data[rng.uniform(size=data.shape) < 0.2] = np.nan
+    return xarray.Dataset(
+        {'reflectivity': (('time', 'height'), data, {'units': 'dBZ'})},
+        coords={'time': time, 'height': np.arange(5) * 100.0})
+
+
+def test_aggregate_time():
+    ds = _dataset()
+    expected = ds.resample(time='30min')
+    for how, reduced in [('mean', expected.mean()),
+                         ('median', expected.median()),
+                         ('count', expected.count())]:
+        # Small chunks split the time steps between chunks, a chunk of
+        # one profile spans many chunks per step.
+        for chunk_size in [7, 1]:
+            result = qvp.aggregate(ds, time_step='30min', how=how,
+                                   chunk_size=chunk_size)
+            assert_equal(result.time.values, reduced.time.values)
+            assert_allclose(result['reflectivity'].values,
+                            reduced['reflectivity'].values, rtol=1e-6)
+    result = qvp.aggregate(ds, time_step='1h', how='percentile',
+                           percentile=90)
+    assert_allclose(result['reflectivity'].values,
+                    ds.resample(time='1h').quantile(0.9)[
+                        'reflectivity'].values, rtol=1e-6)
+    assert_equal(result['reflectivity'].attrs['units'], 'dBZ')
+
+
+def test_aggregate_heights():
+    ds = _dataset()
+    levels = np.array([-50.0, 0.0, 150.0, 375.0, 500.0])
+    result = qvp.aggregate(ds, heights=levels)
+    profile = ds['reflectivity'].values[1]
+    assert_equal(np.isnan(result['reflectivity'].values[:, [0, 4]]).all(),
+                 True)
+    assert_allclose(result['reflectivity'].values[1, 1:4],
+                    np.interp(levels[1:4], ds.height.values, profile))
+
+
+def test_aggregate_sources(radar_files, tmp_path):
+    test_qvp = qvp.qvp(files=radar_files, fields=['reflectivity'])
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+
+    from_qvp = qvp.aggregate(test_qvp, time_step='2h')
+    from_file = qvp.aggregate([filename], time_step='2h')
+    assert_equal(list(from_file.data_vars), ['reflectivity'])
+    assert_equal(from_qvp.sizes['time'], 2)
+    assert_allclose(from_qvp['reflectivity'].values,
+                    from_file['reflectivity'].values)
+    assert_equal(from_qvp['reflectivity'].attrs['units'], 'dBZ')
+
+
+def test_aggregate_source_heights(tmp_path):
+    # Test that sources with other heights are each regridded as read.
+    ds = _dataset()
+    other = ds.assign_coords(height=ds.height.values + 50.0)
+    other = other.assign_coords(time=ds.time.values + np.timedelta64(1, 'D'))
+    files = [str(tmp_path / 'first.nc'), str(tmp_path / 'second.nc')]
+    ds.to_netcdf(files[0])
+    other.to_netcdf(files[1])
+    try:
+        qvp.aggregate(files)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Sources with other heights were joined')
+
+    levels = np.array([100.0, 200.0, 300.0])
+    result = qvp.aggregate(files, heights=levels, chunk_size=10)
+    nprofiles = ds.sizes['time']
+    assert_allclose(result['reflectivity'].values[:nprofiles],
+                    qvp.aggregate(ds, heights=levels)['reflectivity'].values)
+    assert_allclose(result['reflectivity'].values[nprofiles:],
+                    qvp.aggregate(other, heights=levels)[
+                        'reflectivity'].values)
@@ -0,0 +1,67 @@
+"""
+Unit Test for appending the daily files of SAPR_QVP_VAP qvp.qvp.
+"""
+
+import datetime
+
+import numpy as np
+import pyart
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+from qvp.testing import make_radar
+
+
+def test_qvp_write_append(radar_files, tmp_path):
+    # Test that appending scan by scan gives the same file as one write.
+    fields = ['corrected_reflectivity', 'corrected_velocity']
+    full_dir = tmp_path / 'full'
+    append_dir = tmp_path / 'append'
+    full_dir.mkdir()
+    append_dir.mkdir()
+    qvp.qvp(files=radar_files, fields=fields).write(
+        config='xsaprqvpI5', file_directory=str(full_dir))
+    for filename in radar_files + radar_files[:2]:
+        qvp.qvp(files=[filename], fields=fields).write(
+            config='xsaprqvpI5', file_directory=str(append_dir), append=True)
+
+    name = 'sgpxsaprqvpI5.c1.20171005.000000.nc'
+    with xarray.open_dataset(str(full_dir / name)) as full, \
+            xarray.open_dataset(str(append_dir / name)) as appended:
+        assert_equal(appended.time.values, full.time.values)
+        assert_allclose(appended.corrected_reflectivity.values,
+                        full.corrected_reflectivity.values)
+        assert_allclose(appended.corrected_velocity.attrs['valid_max'],
+                        full.corrected_velocity.attrs['valid_max'])
+
+
+def test_qvp_write_append_masked(tmp_path):
+    # Test that a first scan with every value masked leaves no valid range
+    # for the appended scans to be widened from.
+    files = []
+    for i in range(2):
+        start = datetime.datetime(2017, 10, 5, i)
+        radar = make_radar(start, seed=i)
+        if i == 0:
+            radar.fields['corrected_velocity']['data'][:] = np.ma.masked
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, radar)
+        files.append(filename)
+    fields = ['corrected_velocity']
+    full_dir = tmp_path / 'full'
+    append_dir = tmp_path / 'append'
+    full_dir.mkdir()
+    append_dir.mkdir()
+    qvp.qvp(files=files, fields=fields).write(
+        config='xsaprqvpI5', file_directory=str(full_dir))
+    for filename in files:
+        qvp.qvp(files=[filename], fields=fields).write(
+            config='xsaprqvpI5', file_directory=str(append_dir), append=True)
+
+    name = 'sgpxsaprqvpI5.c1.20171005.000000.nc'
+    with xarray.open_dataset(str(full_dir / name)) as full, \
+            xarray.open_dataset(str(append_dir / name)) as appended:
+        for attr in ['valid_min', 'valid_max']:
+            assert_allclose(appended.corrected_velocity.attrs[attr],
+                            full.corrected_velocity.attrs[attr])
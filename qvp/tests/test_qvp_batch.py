@@ -0,0 +1,138 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_batch module.
+"""
+
+import datetime
+import json
+import os
+
+import numpy as np
+import pyart
+from numpy.testing import assert_equal
+import qvp
+from qvp.qvp_batch import find_files, main, quicklooks_main
+from qvp.testing import make_radar
+
+
+def test_find_files(radar_files, tmp_path):
+    day = datetime.date(2017, 10, 5)
+    days = find_files('xsaprqvpI5', str(tmp_path), day, day)
+    assert_equal(days, {day: sorted(radar_files)})
+    assert_equal(find_files('xsaprqvpI4', str(tmp_path), day, day), {})
+    assert_equal(find_files('xsaprqvpI5', str(tmp_path),
+                            datetime.date(2017, 10, 6),
+                            datetime.date(2017, 10, 7)), {})
+
+
+def test_run_batch(radar_files, tmp_path):
+    day = datetime.date(2017, 10, 5)
+    output_directory = tmp_path / 'out'
+    output_directory.mkdir()
+    results = qvp.run_batch(day, day, ['xsaprqvpI5'], str(tmp_path),
+                            str(output_directory), workers=2,
+                            fields=['corrected_reflectivity'])
+    filename = str(output_directory / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+    assert_equal(results, {('xsaprqvpI5', day): filename})
+    assert_equal(os.path.exists(filename), True)
+
+
+def test_batch_main_failure(tmp_path):
+    # A day without readable files is reported as failed.
+    filename = tmp_path / 'sgpadicmac2I5.c1.20171005.000000.nc'
+    filename.write_bytes(b'not a radar file')
+    status = main(['20171005', '20171005', str(tmp_path), str(tmp_path),
+                   '-c', 'xsaprqvpI5', '-r', '0'])
+    assert_equal(status, 1)
+
+
+def test_batch_manifest(radar_files, tmp_path):
+    # A truncated file is left out of its day and recorded in the manifest,
+    # a file without a field gets a masked profile.
+    day = datetime.date(2017, 10, 5)
+    with open(radar_files[1], 'rb') as f:
+        head = f.read(1000)
+    with open(radar_files[1], 'wb') as f:
+        f.write(head)
+    start = datetime.datetime(2017, 10, 5, 5)
+    radar = make_radar(start, seed=5)
+    radar.fields.pop('mean_doppler_velocity')
+    no_velocity = str(tmp_path / start.strftime(
+        'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+    pyart.io.write_cfradial(no_velocity, radar)
+    output_directory = tmp_path / 'out'
+    output_directory.mkdir()
+    manifest = str(tmp_path / 'manifest.json')
+    cache = str(tmp_path / 'cache')
+    options = {'fields': ['reflectivity', 'velocity'], 'cache': cache,
+               'manifest': manifest}
+
+    results = qvp.run_batch(day, day, ['xsaprqvpI5'], str(tmp_path),
+                            str(output_directory), **options)
+    filename = str(output_directory / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+    assert_equal(results, {('xsaprqvpI5', day): filename})
+    with open(manifest) as f:
+        entry = json.load(f)['xsaprqvpI5.20171005']
+    assert_equal(list(entry['failures']), [radar_files[1]])
+    assert entry['failures'][radar_files[1]].startswith('OSError')
+    assert_equal(entry['missing_fields'], {no_velocity: ['velocity']})
+    test_qvp = qvp.qvp(files=radar_files + [no_velocity],
+                       fields=['reflectivity', 'velocity'])
+    assert_equal(len(test_qvp.time), 4)
+    assert_equal(test_qvp.velocity.mask[-1].all(), True)
+
+    # The rerun only reads the failed file again.
+    pyart.io.write_cfradial(radar_files[1], make_radar(
+        datetime.datetime(2017, 10, 5, 1), seed=1))
+    read = []
+    profile_file = qvp.qvp_profile._profile_file
+
+    def counted(file, *args):
+        read.append(file)
+        return profile_file(file, *args)
+    qvp.qvp_profile._profile_file = counted
+    try:
+        qvp.run_batch(day, day, ['xsaprqvpI5'], str(tmp_path),
+                      str(output_directory), rerun=True, **options)
+    finally:
+        qvp.qvp_profile._profile_file = profile_file
+    assert_equal(read, [radar_files[1]])
+    with open(manifest) as f:
+        assert_equal(list(json.load(f)['xsaprqvpI5.20171005']),
+                     ['config', 'day', 'missing_fields'])
+    with qvp.open_qvp(filename) as written:
+        assert_equal(written.sizes['time'], 5)
+        assert_equal(np.isnan(written.velocity.values[-1]).all(), True)
+    results = qvp.run_batch(day, day, ['xsaprqvpI5'], str(tmp_path),
+                            str(output_directory), rerun=True, **options)
+    assert_equal(results, {})
+
+
+def test_run_quicklooks(radar_files, tmp_path):
+    test_qvp = qvp.qvp(files=radar_files,
+                       fields=['reflectivity', 'velocity'])
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+    image_directory = tmp_path / 'images'
+    image_directory.mkdir()
+
+    results = qvp.run_quicklooks([filename], 'xsaprqvpI5',
+                                 ['reflectivity', 'velocity'],
+                                 str(image_directory), panels=1, workers=2)
+    image = str(image_directory
+                / 'sgpxsaprqvpI5.c1.velocity.20171005.000000.png')
+    assert_equal(len(results), 2)
+    assert_equal(results[filename, '20171005', 'velocity'], image)
+
+    # Images newer than the QVP file are skipped.
+    status = quicklooks_main([filename, '-c', 'xsaprqvpI5', '-f', 'velocity',
+                              '-f', 'reflectivity', '-p', '1',
+                              '-o', str(image_directory)])
+    assert_equal(status, 0)
+    results = qvp.run_quicklooks([filename], 'xsaprqvpI5', ['velocity'],
+                                 str(image_directory), panels=1)
+    assert_equal(results, {(filename, '20171005', None): str(
+        image_directory / 'sgpxsaprqvpI5.c1.20171005.000000.png')})
+    results = qvp.run_quicklooks([filename], 'xsaprqvpI5',
+                                 ['reflectivity', 'velocity'],
+                                 str(image_directory), panels=1)
+    assert_equal(set(results.values()), {None})
@@ -0,0 +1,88 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_cache module.
+"""
+
+import os
+
+import numpy as np
+from numpy.testing import assert_equal, assert_array_equal
+import qvp
+import qvp.qvp_profile
+
+
+def test_qvp_cache(radar_files, tmp_path, monkeypatch):
+    # Test that a second run takes every profile from the cache.
+    cache = qvp.ProfileCache(str(tmp_path / 'cache'))
+    fields = ['corrected_reflectivity', 'rain_rate_A']
+    first = qvp.qvp(files=radar_files, fields=fields, cache=cache)
+    assert_equal(len(os.listdir(cache.directory)), 4)
+
+    def fail(*args):
+        raise AssertionError('cached file was read')
+
+    monkeypatch.setattr(qvp.qvp_profile, '_profile_file', fail)
+    second = qvp.qvp(files=radar_files, fields=fields, cache=cache)
+
+    assert_equal(second.time, first.time)
+    assert_equal(second.base_time, first.base_time)
+    assert_array_equal(second.height, first.height)
+    assert_array_equal(second.rain_rate_A.filled(np.nan),
+                       first.rain_rate_A.filled(np.nan))
+
+
+def test_qvp_cache_key(radar_files, tmp_path):
+    cache = qvp.ProfileCache(str(tmp_path / 'cache'))
+    key = cache.key(radar_files[0], None, ['reflectivity'])
+    assert_equal(key, cache.key(radar_files[0], 20.0, ['reflectivity']))
+    assert_equal(key == cache.key(radar_files[0], 10.0, ['reflectivity']),
+                 False)
+    assert_equal(key == cache.key(radar_files[0], None, ['reflectivity'],
+                                  sweep_only=False), False)
+    os.utime(radar_files[0], (0, 0))
+    assert_equal(key == cache.key(radar_files[0], None, ['reflectivity']),
+                 False)
+
+
+def test_qvp_cache_put_error(radar_files, tmp_path, monkeypatch):
+    # Test that a failed write leaves no file in the cache.
+    cache = qvp.ProfileCache(str(tmp_path / 'cache'))
+    qvp.qvp(files=radar_files[:1], fields=['reflectivity'], cache=cache)
+    key = cache.key(radar_files[0], None, ['reflectivity'])
+    result = cache.get(key)
+    cache.clear()
+
+    def fail(*args, **kwargs):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(np, 'savez', fail)
+    try:
+        cache.put(key, result)
+    except OSError:
+        pass
+    else:
+        raise AssertionError('The write error was not raised')
+    assert_equal(os.listdir(cache.directory), [])
+
+
+def test_qvp_cache_eviction(radar_files, tmp_path, monkeypatch):
+    # Test that the least recently used entry is evicted first.
+    cache = qvp.ProfileCache(str(tmp_path / 'cache'))
+    fields = ['reflectivity']
+    qvp.qvp(files=radar_files[:3], fields=fields, cache=cache)
+    keys = [cache.key(file, None, fields) for file in radar_files]
+    for i, key in enumerate(keys[:3]):
+        os.utime(cache._path(key), (100 * (i + 1), 100 * (i + 1)))
+    cache.get(keys[0])
+    cache.max_size = sum(os.path.getsize(cache._path(key))
+                         for key in keys[:3])
+    qvp.qvp(files=radar_files[3:], fields=fields, cache=cache)
+    assert_equal([os.path.exists(cache._path(key)) for key in keys],
+                 [True, False, True, True])
+
+    # Entries removed by another process sharing the cache are skipped.
+    entries = cache._entries()
+    os.remove(cache._path(keys[2]))
+    monkeypatch.setattr(cache, '_entries', lambda: entries)
+    cache.max_size = 1
+    cache._evict()
+    assert_equal(os.listdir(cache.directory), [])
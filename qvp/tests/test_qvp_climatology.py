@@ -0,0 +1,59 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_climatology module.
+"""
+
+import numpy as np
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+
+
+def _day(day, seed):
+    rng = np.random.RandomState(seed)
+    time = (np.datetime64(day, 'ns')
+            + np.arange(0, 1440, 10).astype('timedelta64[m]'))
+    data = rng.normal(30, 10, (len(time), 4)).astype(np.float32)
+    data[rng.uniform(size=data.shape) < 0.1] = np.nan
+    return xarray.Dataset(
+        {'reflectivity': (('time', 'height'), data, {'units': 'dBZ'})},
+        coords={'time': time, 'height': np.arange(4) * 100.0})
+
+
+def test_climatology():
+    days = [_day('2017-10-%02d' % (i + 1), i) for i in range(3)]
+    clim = qvp.Climatology(['reflectivity'],
+                           bins={'reflectivity': np.linspace(-20, 80, 201)})
+    for ds in days:
+        # Small chunks check that the running statistics combine.
+        clim.update(ds, chunk_size=5)
+    summary = clim.to_dataset()
+
+    combined = xarray.concat(days, dim='time')['reflectivity']
+    hourly = combined.groupby('time.hour')
+    assert_equal(summary['reflectivity_count'].values,
+                 hourly.count().values)
+    assert_allclose(summary['reflectivity_mean'].values,
+                    hourly.mean().values, rtol=1e-5)
+    assert_allclose(summary['reflectivity_std'].values,
+                    hourly.std(ddof=1).values, rtol=1e-4)
+    assert_allclose(summary['reflectivity_max'].values, hourly.max().values)
+    # Histogram quantiles are within a bin width of the exact quantiles.
+    assert_allclose(summary['reflectivity_quantile'].sel(quantile=0.5),
+                    hourly.median().values, atol=2.0)
+    assert_equal(summary['reflectivity_histogram'].shape, (24, 4, 200))
+    histogram = summary['reflectivity_histogram']
+    assert_equal(int(histogram.sum()) + histogram.attrs['below_range']
+                 + histogram.attrs['above_range'],
+                 int(combined.count()))
+
+def test_climatology_files(tmp_path):
+    files = []
+    for i in range(2):
+        filename = str(tmp_path / ('day%d.nc' % i))
+        _day('2017-10-%02d' % (i + 1), i).to_netcdf(filename)
+        files.append(filename)
+    clim = qvp.climatology(files, ['reflectivity'], heights=[50.0, 150.0])
+    clim.write(str(tmp_path / 'climatology.nc'))
+    with xarray.open_dataset(str(tmp_path / 'climatology.nc')) as summary:
+        assert_equal(summary['reflectivity_mean'].shape, (24, 2))
+        assert_equal(summary['reflectivity_histogram'].shape, (24, 2, 100))
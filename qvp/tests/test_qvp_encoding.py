@@ -0,0 +1,73 @@
+"""
+Unit Test for the netCDF encoding and dtypes of SAPR_QVP_VAP qvp.qvp.
+"""
+
+import datetime
+
+import netCDF4
+import numpy as np
+import pyart
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+from qvp.testing import make_radar
+
+
+def test_qvp_write_encoding(radar_files, tmp_path):
+    # Test that packed and compressed fields round trip within precision.
+    fields = ['corrected_reflectivity', 'rain_rate_A']
+    test_qvp = qvp.qvp(files=radar_files, fields=fields)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path),
+                   encoding='packed')
+
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+    with netCDF4.Dataset(filename) as dataset:
+        reflectivity = dataset.variables['corrected_reflectivity']
+        assert_equal(reflectivity.dtype, np.int16)
+        assert_equal(reflectivity.filters()['zlib'], True)
+        assert_equal(reflectivity.chunking(), [64, len(test_qvp.height)])
+        assert_equal(dataset.variables['rain_rate_A'].dtype, np.float32)
+        assert_allclose(reflectivity[:].filled(np.nan),
+                        test_qvp.corrected_reflectivity.filled(np.nan),
+                        atol=reflectivity.scale_factor)
+
+
+def test_qvp_write_schema(radar_files, tmp_path):
+    # Test that the written fields follow the order and attributes of the
+    # field schema.
+    schema = qvp.get_field_schema()
+    fields = ['corrected_velocity', 'reflectivity', 'rain_rate_A']
+    test_qvp = qvp.qvp(files=radar_files, fields=fields)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+    with xarray.open_dataset(filename) as dataset:
+        written = [name for name in dataset.data_vars if name in schema]
+        assert_equal(written, [name for name in schema if name in fields])
+        for name in fields:
+            for key, value in schema[name]['attrs'].items():
+                assert_equal(dataset[name].attrs[key], value)
+        assert_allclose(dataset['corrected_velocity'].attrs['valid_max'],
+                        test_qvp.corrected_velocity.max())
+
+
+def test_qvp_write_dtype(tmp_path):
+    # Test that fields are written with the dtype of their radar field.
+    start = datetime.datetime(2017, 10, 5)
+    radar = make_radar(start)
+    velocity = radar.fields['corrected_velocity']
+    velocity['data'] = velocity['data'].astype(np.float64)
+    filename = str(tmp_path / 'sgpadicmac2I5.c1.20171005.000000.nc')
+    pyart.io.write_cfradial(filename, radar)
+    fields = ['corrected_velocity', 'corrected_reflectivity']
+    test_qvp = qvp.qvp(files=[filename], fields=fields)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+
+    with netCDF4.Dataset(str(
+            tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')) as dataset:
+        assert_equal(dataset.variables['corrected_velocity'].dtype,
+                     np.float64)
+        assert_equal(dataset.variables['corrected_velocity'].valid_min.dtype,
+                     np.float64)
+        assert_equal(dataset.variables['corrected_reflectivity'].dtype,
+                     np.float32)
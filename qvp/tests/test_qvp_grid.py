@@ -0,0 +1,94 @@
+"""
+Unit Test for the time grid output of SAPR_QVP_VAP qvp.qvp.
+"""
+
+import datetime
+
+import numpy as np
+import pyart
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+from qvp.testing import make_radar
+
+
+def test_qvp_write_time_grid(radar_files, tmp_path):
+    # Test that profiles go to the nearest grid time of a whole day, and
+    # that appending scans in any order fills the same grid.
+    full_dir = tmp_path / 'full'
+    append_dir = tmp_path / 'append'
+    full_dir.mkdir()
+    append_dir.mkdir()
+    fields = ['corrected_reflectivity']
+    test_qvp = qvp.qvp(files=radar_files, fields=fields)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(full_dir),
+                   time_step='7min')
+    for filename in radar_files[::-1] + radar_files[:1]:
+        qvp.qvp(files=[filename], fields=fields).write(
+            config='xsaprqvpI5', file_directory=str(append_dir),
+            append=True, time_step='7min')
+
+    name = 'sgpxsaprqvpI5.c1.20171005.000000.nc'
+    with xarray.open_dataset(str(full_dir / name)) as full, \
+            xarray.open_dataset(str(append_dir / name)) as appended:
+        assert_equal(full.sizes['time'], 206)
+        assert_equal(full.time.values[1] - full.time.values[0],
+                     np.timedelta64(7, 'm'))
+        # Scans on the hour go to the grid times 0, 9, 17 and 26.
+        rows = [0, 9, 17, 26]
+        assert_equal(np.flatnonzero(full.scan_time.notnull().values), rows)
+        assert_equal(full.scan_time.values[rows],
+                     np.array(test_qvp.time, dtype='datetime64[ns]'))
+        assert_allclose(full.corrected_reflectivity.values[rows],
+                        test_qvp.corrected_reflectivity.filled(np.nan))
+        assert_equal(np.isnan(full.corrected_reflectivity.values[1]).all(),
+                     True)
+        assert_equal(appended.time.values, full.time.values)
+        assert_equal(appended.scan_time.values[rows],
+                     full.scan_time.values[rows])
+        assert_allclose(appended.corrected_reflectivity.values,
+                        full.corrected_reflectivity.values)
+
+    # A later scan nearer to a grid time replaces the scan of its row, as
+    # in a full write, a farther one is skipped.
+    late = []
+    for minute in [64, 61]:
+        start = datetime.datetime(2017, 10, 5) + datetime.timedelta(
+            minutes=minute)
+        late.append(str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc')))
+        pyart.io.write_cfradial(late[-1], make_radar(start, seed=minute))
+        qvp.qvp(files=late[-1:], fields=fields).write(
+            config='xsaprqvpI5', file_directory=str(append_dir),
+            append=True, time_step='7min')
+    qvp.qvp(files=radar_files + late, fields=fields).write(
+        config='xsaprqvpI5', file_directory=str(full_dir), time_step='7min')
+    with xarray.open_dataset(str(full_dir / name)) as full, \
+            xarray.open_dataset(str(append_dir / name)) as appended:
+        assert_equal(full.scan_time.values[9],
+                     np.datetime64('2017-10-05T01:04', 'ns'))
+        assert_equal(appended.scan_time.values, full.scan_time.values)
+        assert_allclose(appended.corrected_reflectivity.values,
+                        full.corrected_reflectivity.values)
+
+
+def test_qvp_write_time_grid_days(tmp_path):
+    # Test that scans over midnight are written to a grid file per day.
+    files = []
+    for i, start in enumerate([datetime.datetime(2017, 10, 5, 20),
+                               datetime.datetime(2017, 10, 5, 23, 54),
+                               datetime.datetime(2017, 10, 6, 1)]):
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, make_radar(start, seed=i))
+        files.append(filename)
+    qvp.qvp(files=files, fields=['corrected_reflectivity']).write(
+        config='xsaprqvpI5', file_directory=str(tmp_path), time_step='5min')
+
+    for day, scans in [('20171005', 2), ('20171006', 1)]:
+        name = 'sgpxsaprqvpI5.c1.' + day + '.000000.nc'
+        with xarray.open_dataset(str(tmp_path / name)) as ds:
+            assert_equal(ds.sizes['time'], 288)
+            assert_equal(str(ds.time.values[0])[:10],
+                         day[:4] + '-' + day[4:6] + '-' + day[6:])
+            assert_equal(int(ds.scan_time.notnull().sum()), scans)
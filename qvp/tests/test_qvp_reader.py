@@ -0,0 +1,38 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_reader module.
+"""
+
+import numpy as np
+from numpy.testing import assert_equal, assert_array_equal
+import pyart
+import qvp
+
+
+def test_read_sweep(radar_files):
+    # Test that the sweep matches the same sweep from the whole volume.
+    radar = qvp.read_sweep(radar_files[0], desired_angle=20.0)
+    volume = pyart.io.read(radar_files[0]).extract_sweeps([2])
+
+    assert_equal(radar.nsweeps, 1)
+    assert_equal(radar.nrays, volume.nrays)
+    assert_array_equal(radar.fixed_angle['data'], [20.0])
+    assert_array_equal(radar.azimuth['data'], volume.azimuth['data'])
+    for field in volume.fields:
+        assert_array_equal(radar.fields[field]['data'].filled(np.nan),
+                           volume.fields[field]['data'].filled(np.nan))
+
+
+def test_read_sweep_fields(radar_files):
+    radar = qvp.read_sweep(radar_files[0], fields=['corrected_reflectivity'])
+    assert_equal(list(radar.fields), ['corrected_reflectivity'])
+
+
+def test_qvp_sweep_only(radar_files):
+    # Test that reading only the sweep gives the same QVP as the volume.
+    sweep = qvp.qvp(files=radar_files)
+    volume = qvp.qvp(files=radar_files, sweep_only=False)
+
+    assert_equal(sweep.time, volume.time)
+    assert_array_equal(sweep.height, volume.height)
+    assert_array_equal(np.ma.array(sweep.corrected_reflectivity).filled(np.nan),
+                       np.ma.array(volume.corrected_reflectivity).filled(np.nan))
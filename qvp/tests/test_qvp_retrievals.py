@@ -0,0 +1,74 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.retrievals module.
+"""
+
+import netCDF4
+import numpy as np
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+from qvp.retrievals import detect_melting_layer, find_melting_layer
+
+
+def _bright_band(ntimes=4, bottom=2000.0, top=2400.0):
+    """ Returns rain below, a melting layer and snow above. """
+    height = np.arange(0, 5000, 100.0)
+    inside = (height >= bottom) & (height <= top)
+    shape = (ntimes, len(height))
+    rhohv = np.where(inside, 0.9, 0.995) * np.ones(shape)
+    zdr = np.where(inside, 2.0, 0.3) * np.ones(shape)
+    zh = np.where(inside, 40.0, 25.0) * np.ones(shape)
+    return rhohv, zdr, zh, height
+
+
+def test_find_melting_layer():
+    rhohv, zdr, zh, height = _bright_band()
+    # No melting layer in the last profile, missing data in the third.
+    rhohv[-1] = 0.995
+    zh[2, 10:] = np.nan
+    bottom, top = find_melting_layer(rhohv, zdr, zh, height)
+    assert_allclose(bottom[:2], 2000.0)
+    assert_allclose(top[:2], 2400.0)
+    assert_equal(np.isnan(bottom[2:]).all(), True)
+    assert_equal(np.isnan(top[2:]).all(), True)
+
+    # Layers outside of the searched heights are not found.
+    bottom, top = find_melting_layer(rhohv, zdr, zh, height,
+                                     max_height=1500.0)
+    assert_equal(np.isnan(bottom).all(), True)
+
+
+def test_melting_layer_write(radar_files, tmp_path):
+    fields = ['cross_correlation_ratio', 'corrected_differential_reflectivity',
+              'corrected_reflectivity']
+    test_qvp = qvp.qvp(files=radar_files, fields=fields)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path),
+                   melting_layer=True)
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+
+    expected = detect_melting_layer(test_qvp)
+    with netCDF4.Dataset(filename) as dataset:
+        for name in ['melting_layer_bottom', 'melting_layer_top']:
+            var = dataset.variables[name]
+            assert_equal(var.dimensions, ('time',))
+            assert_equal(var.units, 'meters')
+            assert_allclose(var[:].filled(np.nan), expected[name].values)
+    assert_allclose(detect_melting_layer(filename)['melting_layer_top'].values,
+                    expected['melting_layer_top'].values)
+
+    only_reflectivity = qvp.qvp(files=radar_files, fields=['reflectivity'])
+    try:
+        only_reflectivity.write(config='xsaprqvpI5',
+                                file_directory=str(tmp_path / 'other'),
+                                melting_layer=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('A melting layer without its fields was written')
+
+
+def test_melting_layer_module():
+    # The function must not hide the module of the same stage path.
+    import types
+    import qvp.retrievals.melting_layer as module
+    assert_equal(isinstance(module, types.ModuleType), True)
+    assert_equal(module.detect_melting_layer, detect_melting_layer)
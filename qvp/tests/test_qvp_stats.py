@@ -0,0 +1,46 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_stats module.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from numpy.testing import assert_equal
+import qvp
+
+
+def test_qvp_stats(radar_files, tmp_path):
+    log = str(tmp_path / 'stats.jsonl')
+    exported = []
+    stats = qvp.QVPStats(log=log, callback=exported.append)
+    with ThreadPoolExecutor(2) as executor:
+        test_qvp = qvp.qvp(files=radar_files, fields=['reflectivity'],
+                           executor=executor, stats=stats)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    qvp.quicklooks_1panel(test_qvp, 'reflectivity', 'xsaprqvpI5',
+                          image_directory=str(tmp_path), stats=stats)
+
+    stages = [record['stage'] for record in stats.records]
+    assert_equal(stages, ['read', 'profile'] * 4 + [
+        'accumulate', 'dataset', 'to_netcdf', 'read_quicklook', 'draw',
+        'savefig'])
+    assert_equal([record['file'] for record in stats.records[:8:2]],
+                 radar_files)
+    assert all(record['seconds'] >= 0 for record in stats.records)
+    assert stats.records[0]['bytes_read'] > 0
+    assert stats.records[0]['peak_rss'] > 0
+
+    with open(log) as f:
+        assert_equal([json.loads(line) for line in f], stats.records)
+    assert_equal(exported, stats.records)
+    summary = stats.summary()
+    assert_equal(summary['read']['count'], 4)
+    assert_equal(stats.summary(by='file')[radar_files[0]]['count'], 2)
+
+
+def test_qvp_stats_disabled(radar_files):
+    test_qvp = qvp.qvp(files=radar_files[:1], fields=['reflectivity'])
+    assert_equal(test_qvp.stats, None)
+    from qvp.qvp_profile import _profile_file
+    result = _profile_file(radar_files[0], None, None, ['reflectivity'], True)
+    assert 'stats' not in result
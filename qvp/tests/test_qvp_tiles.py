@@ -0,0 +1,70 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_tiles module.
+"""
+
+import datetime
+import os
+
+import numpy as np
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+
+
+def _day_of_profiles(day, value):
+    time = np.datetime64(day, 'ns') + np.arange(0, 1440, 5).astype(
+        'timedelta64[m]')
+    data = np.full((len(time), 3), value, dtype=np.float32)
+    data[:12, 2] = np.nan
+    return time, np.array([0.0, 100.0, 200.0]), data
+
+
+def test_tile_pyramid(tmp_path):
+    pyramid = qvp.TilePyramid(str(tmp_path), 'reflectivity', levels=3,
+                              tile_size=64, dtype='float16')
+    day = datetime.datetime(2017, 10, 5)
+    pyramid.add_day(*_day_of_profiles(day, 10.0), day=day)
+
+    # A day of 5 minute steps spans 288 columns starting at column
+    # 17444 * 288 of level 0.
+    first = 17444 * 288 // 64
+    assert_equal(sorted(os.listdir(str(tmp_path / 'reflectivity' / '0'))),
+                 ['%d.npy' % tile for tile in range(first, first + 5)])
+    tile = pyramid.read_tile(0, first)
+    assert_equal(tile.shape, (64, 3))
+    assert_equal(pyramid.tile_times(0, first)[0], np.datetime64(day, 'ns'))
+    assert_allclose(tile[:12, :2], 10.0)
+    assert_equal(np.isnan(tile[:12, 2]).all(), True)
+
+    # The next day only changes the tiles it covers, the column shared by
+    # both days at level 2 is their mean.
+    next_day = day + datetime.timedelta(days=1)
+    pyramid.add_day(*_day_of_profiles(next_day, 20.0), day=next_day)
+    column = (17445 * 288) // 4
+    level2 = pyramid.read_tile(2, column // 64)
+    assert_allclose(level2[column % 64 - 1, 0], 10.0)
+    assert_allclose(level2[column % 64, 0], 20.0)
+    assert_equal(pyramid.read_tile(2, column // 64 + 100), None)
+
+
+def test_build_pyramid(radar_files, tmp_path):
+    test_qvp = qvp.qvp(files=radar_files, fields=['reflectivity'])
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path))
+    filename = str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.nc')
+    directory = str(tmp_path / 'tiles')
+
+    pyramid = qvp.build_pyramid([filename], directory, 'reflectivity')
+    assert_equal(pyramid.metadata['dtype'], 'uint8')
+    assert_equal(len(pyramid.metadata['colormap']), 256)
+    tile_path = pyramid._tile_path(0, 17444 * 288 // 256)
+    tile = np.load(tile_path)
+    assert_equal(tile.dtype, np.uint8)
+    values = pyramid.read_tile(0, 17444 * 288 // 256)
+    column = 17444 * 288 % 256
+    profile = test_qvp.reflectivity[0, :3].filled(np.nan)
+    scale = (pyramid.metadata['vmax'] - pyramid.metadata['vmin']) / 254
+    assert_allclose(values[column, :3], profile, atol=scale)
+
+    # An unchanged file is not added again.
+    mtime = os.path.getmtime(tile_path)
+    pyramid = qvp.build_pyramid([filename], directory, 'reflectivity')
+    assert_equal(os.path.getmtime(tile_path), mtime)
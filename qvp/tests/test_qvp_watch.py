@@ -0,0 +1,145 @@
+"""
+Unit Test for SAPR_QVP_VAP qvp.qvp_watch module.
+"""
+
+import datetime
+import os
+
+import numpy as np
+import pyart
+import xarray
+from numpy.testing import assert_equal, assert_allclose
+import qvp
+from qvp import qvp_watch
+from qvp.qvp_watch import watch_main
+from qvp.testing import make_radar
+
+
+def _watch_day(monkeypatch, day):
+    # The watched days end on day instead of today.
+    monkeypatch.setattr(qvp_watch, '_today', lambda: day)
+
+
+def test_directory_watcher(radar_files, tmp_path, monkeypatch):
+    # Files are appended as they arrive, the poll stands in for the clock.
+    _watch_day(monkeypatch, datetime.date(2017, 10, 5))
+    input_directory = tmp_path / 'in'
+    output_directory = tmp_path / 'out'
+    image_directory = tmp_path / 'images'
+    for directory in [input_directory, output_directory, image_directory]:
+        directory.mkdir()
+    arrived = [str(input_directory / os.path.basename(filename))
+               for filename in radar_files]
+    for filename in radar_files[:2]:
+        os.rename(filename, str(input_directory / os.path.basename(filename)))
+    bad = str(input_directory / 'sgpadicmac2I5.c1.20171005.010500.nc')
+    with open(bad, 'wb') as f:
+        f.write(b'truncated')
+    fields = ['reflectivity', 'velocity']
+
+    watcher = qvp.DirectoryWatcher(
+        'xsaprqvpI5', str(input_directory), str(output_directory),
+        fields=fields, image_directory=str(image_directory), settle=0)
+    assert_equal(watcher.poll(), arrived[:2])
+    assert_equal(list(watcher.failures), [bad])
+    for filename in radar_files[2:]:
+        os.rename(filename, str(input_directory / os.path.basename(filename)))
+    assert_equal(watcher.poll(), arrived[2:])
+    assert_equal(watcher.poll(), [])
+    watcher.close()
+
+    name = 'sgpxsaprqvpI5.c1.20171005.000000.nc'
+    expected = qvp.qvp(files=arrived, fields=fields)
+    with xarray.open_dataset(str(output_directory / name)) as ds:
+        assert_equal(ds.time.size, 4)
+        assert_allclose(ds.velocity.values, expected.velocity.filled(np.nan))
+    assert_equal(os.listdir(str(image_directory)),
+                 ['sgpxsaprqvpI5.c1.20171005.000000.png'])
+
+    # A restarted watcher only reads the new file.
+    start = datetime.datetime(2017, 10, 5, 6)
+    late = str(input_directory / start.strftime(
+        'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+    pyart.io.write_cfradial(late, make_radar(start, seed=6))
+    restarted = qvp.DirectoryWatcher(
+        'xsaprqvpI5', str(input_directory), str(output_directory), settle=0)
+    assert_equal(restarted.new_files(), [late])
+    status = watch_main([str(input_directory), str(output_directory), '-c',
+                         'xsaprqvpI5', '-f', 'reflectivity', '-f',
+                         'velocity', '--settle', '0', '--once'])
+    assert_equal(status, 0)
+    with xarray.open_dataset(str(output_directory / name)) as ds:
+        assert_equal(ds.time.size, 5)
+
+
+def test_directory_watcher_append_error(tmp_path, monkeypatch):
+    # Test that a scan that can not be appended to its daily file is
+    # recorded and saved, and that the watcher keeps running.
+    _watch_day(monkeypatch, datetime.date(2017, 10, 5))
+    input_directory = tmp_path / 'in'
+    output_directory = tmp_path / 'out'
+    input_directory.mkdir()
+    output_directory.mkdir()
+    files = []
+    for hour, ngates in [(0, 40), (1, 50), (2, 40)]:
+        start = datetime.datetime(2017, 10, 5, hour)
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, make_radar(start, ngates=ngates))
+        files.append(str(input_directory / os.path.basename(filename)))
+
+    watcher = qvp.DirectoryWatcher(
+        'xsaprqvpI5', str(input_directory), str(output_directory),
+        fields=['reflectivity'], settle=0)
+    os.rename(str(tmp_path / os.path.basename(files[0])), files[0])
+    assert_equal(watcher.poll(), files[:1])
+    for filename in files[1:]:
+        os.rename(str(tmp_path / os.path.basename(filename)), filename)
+    watcher.run(interval=0, polls=1)
+    assert_equal(list(watcher.failures), [files[1]])
+    assert watcher.failures[files[1]].startswith('ValueError')
+
+    restarted = qvp.DirectoryWatcher(
+        'xsaprqvpI5', str(input_directory), str(output_directory), settle=0)
+    assert_equal(restarted.new_files(), [])
+    with xarray.open_dataset(str(
+            output_directory / 'sgpxsaprqvpI5.c1.20171005.000000.nc')) as ds:
+        assert_equal(ds.time.size, 2)
+
+
+def test_directory_watcher_days(tmp_path, monkeypatch):
+    # Test that a scan arriving after a later scan is a failure, that only
+    # the watched days are read and that older files leave the state.
+    input_directory = tmp_path / 'in'
+    output_directory = tmp_path / 'out'
+    input_directory.mkdir()
+    output_directory.mkdir()
+    files = []
+    for start in [datetime.datetime(2017, 10, 3, 12),
+                  datetime.datetime(2017, 10, 4, 12),
+                  datetime.datetime(2017, 10, 5, 2),
+                  datetime.datetime(2017, 10, 5, 1)]:
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, make_radar(start))
+        files.append(str(input_directory / os.path.basename(filename)))
+    for filename in files[:3]:
+        os.rename(str(tmp_path / os.path.basename(filename)), filename)
+
+    _watch_day(monkeypatch, datetime.date(2017, 10, 5))
+    watcher = qvp.DirectoryWatcher(
+        'xsaprqvpI5', str(input_directory), str(output_directory),
+        fields=['reflectivity'], settle=0)
+    assert_equal(watcher.poll(), files[1:3])
+    os.rename(str(tmp_path / os.path.basename(files[3])), files[3])
+    assert_equal(watcher.poll(), [])
+    assert_equal(list(watcher.failures), [files[3]])
+    assert watcher.failures[files[3]].startswith('Not appended')
+
+    os.remove(files[2])
+    _watch_day(monkeypatch, datetime.date(2017, 10, 6))
+    assert_equal(watcher.poll(), [])
+    restarted = qvp.DirectoryWatcher(
+        'xsaprqvpI5', str(input_directory), str(output_directory), settle=0)
+    assert_equal(restarted.processed, {})
+    assert_equal(list(restarted.failures), [files[3]])
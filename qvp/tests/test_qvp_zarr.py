@@ -0,0 +1,117 @@
+"""
+Unit Test for the Zarr output of SAPR_QVP_VAP qvp.qvp.
+"""
+
+import datetime
+import os
+
+import numpy as np
+from numpy.testing import assert_equal, assert_allclose
+import pyart
+import pytest
+import qvp
+from qvp.testing import make_radar
+
+pytest.importorskip('zarr')
+
+FIELDS = ['corrected_reflectivity', 'cross_correlation_ratio']
+
+
+def test_qvp_write_zarr_append(radar_files, tmp_path):
+    # Test that appending along time skips profiles already stored.
+    qvp.qvp(files=radar_files[:2], fields=FIELDS).write(
+        config='xsaprqvpI5', file_directory=str(tmp_path), format='zarr',
+        append=True)
+    test_qvp = qvp.qvp(files=radar_files, fields=FIELDS)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path),
+                   format='zarr', append=True)
+
+    store = str(tmp_path / 'sgpxsaprqvpI5.c1.zarr')
+    with qvp.open_qvp(store, date='20171005') as ds:
+        assert_equal(ds.time.size, 4)
+        assert_allclose(ds.height.values, test_qvp.height)
+        assert_allclose(ds.corrected_reflectivity.values,
+                        test_qvp.corrected_reflectivity.filled(np.nan))
+    with qvp.open_qvp(store, date='20171006') as ds:
+        assert_equal(ds.time.size, 0)
+
+
+def test_qvp_write_zarr_time_grid(radar_files, tmp_path):
+    # Test that scans of a stored day are merged into its grid, and that
+    # the scan times of a day appended later are kept.
+    next_day = []
+    for hour in [1, 0]:
+        start = datetime.datetime(2017, 10, 6, hour)
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, make_radar(start, seed=hour))
+        next_day.append(filename)
+    for files in [radar_files[2:], radar_files[:2], next_day[:1],
+                  next_day[1:]]:
+        qvp.qvp(files=files, fields=FIELDS).write(
+            config='xsaprqvpI5', file_directory=str(tmp_path),
+            format='zarr', append=True, time_step='1h')
+    test_qvp = qvp.qvp(files=radar_files, fields=FIELDS)
+    next_qvp = qvp.qvp(files=next_day[::-1], fields=FIELDS)
+
+    with qvp.open_qvp(str(tmp_path / 'sgpxsaprqvpI5.c1.zarr')) as ds:
+        assert_equal(ds.time.size, 48)
+        assert_equal(ds.scan_time.values[:4],
+                     np.array(test_qvp.time, dtype='datetime64[ns]'))
+        assert_allclose(ds.corrected_reflectivity.values[:4],
+                        test_qvp.corrected_reflectivity.filled(np.nan))
+        assert_equal(np.isnan(ds.corrected_reflectivity.values[4:24]).all(),
+                     True)
+        assert_equal(ds.scan_time.values[24:26],
+                     np.array(next_qvp.time, dtype='datetime64[ns]'))
+        assert_allclose(ds.corrected_reflectivity.values[24:26],
+                        next_qvp.corrected_reflectivity.filled(np.nan))
+
+    # A scan nearer to a grid time replaces the stored scan of its row, a
+    # farther one is skipped.
+    late = []
+    for minutes in [320, 310, 20]:
+        start = datetime.datetime(2017, 10, 6) + datetime.timedelta(
+            minutes=minutes)
+        filename = str(tmp_path / start.strftime(
+            'sgpadicmac2I5.c1.%Y%m%d.%H%M%S.nc'))
+        pyart.io.write_cfradial(filename, make_radar(start, seed=minutes))
+        late.append(qvp.qvp(files=[filename], fields=FIELDS))
+        late[-1].write(config='xsaprqvpI5', file_directory=str(tmp_path),
+                       format='zarr', append=True, time_step='1h')
+    with qvp.open_qvp(str(tmp_path / 'sgpxsaprqvpI5.c1.zarr')) as ds:
+        assert_equal(ds.scan_time.values[[24, 29]],
+                     np.array([next_qvp.time[0], late[1].time[0]],
+                              dtype='datetime64[ns]'))
+        assert_allclose(ds.corrected_reflectivity.values[29],
+                        late[1].corrected_reflectivity[0].filled(np.nan))
+        assert_allclose(ds.corrected_reflectivity.values[24],
+                        next_qvp.corrected_reflectivity[0].filled(np.nan))
+
+
+def test_qvp_write_zarr_region(radar_files, tmp_path):
+    # Test that a worker can fill a region of an existing store.
+    test_qvp = qvp.qvp(files=radar_files, fields=FIELDS)
+    test_qvp.write(config='xsaprqvpI5', file_directory=str(tmp_path),
+                   format='zarr')
+    last = qvp.qvp(files=radar_files[:1], fields=FIELDS)
+    last.write(config='xsaprqvpI5', file_directory=str(tmp_path),
+               format='zarr', region=slice(3, 4))
+
+    store = str(tmp_path / 'sgpxsaprqvpI5.c1.zarr')
+    with qvp.open_qvp(store) as ds:
+        assert_allclose(ds.corrected_reflectivity.values[3],
+                        last.corrected_reflectivity[0].filled(np.nan))
+        assert_allclose(ds.corrected_reflectivity.values[:3],
+                        test_qvp.corrected_reflectivity[:3].filled(np.nan))
+
+
+def test_qvp_1panel_zarr(radar_files, tmp_path):
+    qvp.qvp(files=radar_files, fields=FIELDS).write(
+        config='xsaprqvpI5', file_directory=str(tmp_path), format='zarr')
+    qvp.quicklooks_1panel(file=str(tmp_path / 'sgpxsaprqvpI5.c1.zarr'),
+                          field='corrected_reflectivity',
+                          config='xsaprqvpI5',
+                          image_directory=str(tmp_path), date='20171005')
+    assert_equal(os.path.exists(
+        str(tmp_path / 'sgpxsaprqvpI5.c1.20171005.000000.png')), True)
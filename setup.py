@@ -115,4 +115,9 @@ setup(
     maintainer_email=MAINTAINER_EMAIL,
     license=LICENSE,
     classifiers=CLASSIFIERS,
-    packages=find_packages())
+    packages=find_packages(),
+    entry_points={
+        'console_scripts': [
+            'qvp-batch = qvp.qvp_batch:main',
+            'qvp-quicklooks = qvp.qvp_batch:quicklooks_main',
+            'qvp-watch = qvp.qvp_watch:watch_main']})